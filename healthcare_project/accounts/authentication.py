@@ -0,0 +1,68 @@
+# accounts/authentication.py
+
+import copy
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .cache import LRUCache
+from .models import PROFILE_RELATIONS
+
+# Per-process cache of token key -> Token with its user and role profile
+# joined. Signals drop entries when the token, user or profile changes in
+# this process; the short TTL bounds staleness for other worker processes.
+_tokens = LRUCache(
+    maxsize=getattr(settings, 'API_TOKEN_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'API_TOKEN_CACHE_TTL', 60),
+)
+
+def _copy_user(user):
+    """A copy of a cached user whose joined profile is copied too, and points back at the copy"""
+    user = copy.copy(user)
+    # copy.copy gives the user its own fields_cache dict, but the profile
+    # instances in it are still the cached ones
+    fields_cache = user._state.fields_cache
+    for relation, profile in fields_cache.items():
+        if profile is not None:
+            profile = copy.copy(profile)
+            profile.user = user
+            fields_cache[relation] = profile
+    return user
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token and user lookups for recently seen keys."""
+
+    def authenticate_credentials(self, key):
+        token = _tokens.get(key)
+        if token is None:
+            try:
+                token = Token.objects.select_related(
+                    'user', *(f'user__{relation}' for relation in PROFILE_RELATIONS.values())
+                ).get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed("Invalid token.")
+            if not token.user.is_active:
+                raise AuthenticationFailed("User inactive or deleted.")
+            _tokens.set(key, token)
+
+        # Each request gets its own instances, so nothing set on request.user
+        # leaks into the cached entry
+        token = copy.copy(token)
+        token.user = _copy_user(token.user)
+        return (token.user, token)
+
+# Entries are dropped once the change is committed; dropping them earlier
+# lets a concurrent request cache the old rows again
+
+def invalidate_token(key):
+    transaction.on_commit(partial(_tokens.delete, key))
+
+def invalidate_user(user_id):
+    transaction.on_commit(partial(_tokens.delete_where, lambda token: token.user_id == user_id))
+
+def clear():
+    _tokens.clear()
@@ -0,0 +1,15 @@
+# accounts/backends.py
+
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+class ProfileModelBackend(ModelBackend):
+    """Model backend that loads the user and their role profile in one query."""
+
+    def get_user(self, user_id):
+        try:
+            user = User.objects.with_profiles().get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,112 @@
+# accounts/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class LRUCache:
+    """Small thread-safe, per-process LRU cache with an optional TTL (seconds)."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key`` and mark it as recently used."""
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting the least recently used entries."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose value matches ``predicate``."""
+        with self._lock:
+            stale = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in stale:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class VersionedCache:
+    """
+    Namespaced entries on a Django cache backend, invalidated by version bumps.
+
+    Each key has a version counter stored in the cache itself; entries are
+    read and written under the current version, so invalidating a key is one
+    atomic ``incr`` and old entries simply age out. Works across processes
+    whenever the backend is shared (Redis, Memcached, database).
+    """
+
+    def __init__(self, namespace, timeout=300, alias='default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _version_key(self, key):
+        return f"{self.namespace}:version:{key}"
+
+    def version(self, key):
+        version = self.cache.get(self._version_key(key))
+        if version is None:
+            self.cache.add(self._version_key(key), 1, timeout=None)
+            version = self.cache.get(self._version_key(key), 1)
+        return version
+
+    def get(self, key, default=None):
+        return self.cache.get(self._key(key), default, version=self.version(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.timeout, version=self.version(key))
+
+    def get_or_set(self, key, builder):
+        """Return the cached value for ``key``, building and caching it on a miss."""
+        version = self.version(key)
+        value = self.cache.get(self._key(key), version=version)
+        if value is None:
+            value = builder()
+            self.cache.set(self._key(key), value, self.timeout, version=version)
+        return value
+
+    def invalidate(self, key):
+        try:
+            self.cache.incr(self._version_key(key))
+        except ValueError:
+            # No version stored yet, so nothing can be cached under it
+            pass
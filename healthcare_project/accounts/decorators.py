@@ -0,0 +1,88 @@
+# accounts/decorators.py
+
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view runs more queries than its declared budget."""
+
+class _QueryCounter:
+    """``connection.execute_wrapper`` that records the SQL of every query it lets through"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+def query_budget(max_queries):
+    """
+    Cap the number of queries a view may run when rendering a page.
+
+    The budget is independent of how many rows the page shows, so a view
+    that starts issuing one query per row fails loudly instead of slowing
+    down. It is checked for GET/HEAD requests while ``settings.DEBUG`` (or
+    ``settings.QUERY_BUDGET_ENFORCE``) is on and costs nothing otherwise.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            enforce = getattr(settings, 'QUERY_BUDGET_ENFORCE', settings.DEBUG)
+            if not enforce or request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            # Counted without forcing debug cursors, so production settings are unchanged
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view_func(request, *args, **kwargs)
+
+            queries = counter.queries
+            if len(queries) > max_queries:
+                raise QueryBudgetExceeded(
+                    f"{view_func.__module__}.{view_func.__name__} ran {len(queries)} queries, "
+                    f"budget is {max_queries}:\n" + "\n".join(queries)
+                )
+            return response
+        return _wrapped_view
+    return decorator
+
+def conditional_detail(last_modified_func):
+    """
+    Answer GET/HEAD requests for an unchanged detail page with a 304.
+
+    ``last_modified_func(request, *args, **kwargs)`` returns when the shown
+    object last changed, with one single-column query scoped to what the
+    user may see, or None to let the view handle the request (usually with
+    a 404). Writes to rows shown on the page must touch that timestamp. The
+    ETag includes the user, since the same object renders differently for
+    different viewers.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            last_modified = last_modified_func(request, *args, **kwargs)
+            if last_modified is None:
+                return view_func(request, *args, **kwargs)
+
+            # Microseconds in the ETag catch edits within the same second
+            etag = f'"{request.user.pk}-{last_modified.timestamp()}"'
+            timestamp = int(last_modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(timestamp)
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        return _wrapped_view
+    return decorator
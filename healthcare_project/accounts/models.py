@@ -1,14 +1,41 @@
 # accounts/models.py
 
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils.translation import gettext_lazy as _
 
+# Reverse one-to-one accessor of the role-specific profile for each user type
+PROFILE_RELATIONS = {
+    'PATIENT': 'patient_profile',
+    'DOCTOR': 'doctor_profile',
+    'NURSE': 'nurse_profile',
+    'PHARMACIST': 'pharmacist_profile',
+    'LAB_TECH': 'lab_tech_profile',
+}
+
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
 
     use_in_migrations = True
 
+    def with_profiles(self, user_type=None):
+        """
+        Return users with their role-specific profile joined in the same query.
+
+        When ``user_type`` is given only users of that type are returned and
+        only their profile table is joined.
+        """
+        queryset = self.get_queryset()
+        if user_type is None:
+            return queryset.select_related(*PROFILE_RELATIONS.values())
+        queryset = queryset.filter(user_type=user_type)
+        if user_type in PROFILE_RELATIONS:
+            queryset = queryset.select_related(PROFILE_RELATIONS[user_type])
+        return queryset
+
     def _create_user(self, email, password, **extra_fields):
         """Create and save a User with the given email and password."""
         if not email:
@@ -71,17 +98,13 @@ class User(AbstractUser):
     
     def get_role_specific_profile(self):
         """Return the role-specific profile for this user."""
-        if self.user_type == 'PATIENT':
-            return hasattr(self, 'patient_profile') and self.patient_profile or None
-        elif self.user_type == 'DOCTOR':
-            return hasattr(self, 'doctor_profile') and self.doctor_profile or None
-        elif self.user_type == 'NURSE':
-            return hasattr(self, 'nurse_profile') and self.nurse_profile or None
-        elif self.user_type == 'PHARMACIST':
-            return hasattr(self, 'pharmacist_profile') and self.pharmacist_profile or None
-        elif self.user_type == 'LAB_TECH':
-            return hasattr(self, 'lab_tech_profile') and self.lab_tech_profile or None
-        return None
+        relation = PROFILE_RELATIONS.get(self.user_type)
+        if relation is None:
+            return None
+        try:
+            return getattr(self, relation)
+        except ObjectDoesNotExist:
+            return None
 
 class PatientProfile(models.Model):
     """Extended profile for Patient users."""
@@ -141,4 +164,21 @@ class LabTechnicianProfile(models.Model):
     years_of_experience = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"Lab Technician: {self.user.get_full_name()}"
\ No newline at end of file
+        return f"Lab Technician: {self.user.get_full_name()}"
+
+def generate_calendar_token():
+    return secrets.token_urlsafe(32)
+
+class CalendarToken(models.Model):
+    """Secret that authenticates a user's read-only appointment calendar feed."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_token')
+    token = models.CharField(max_length=64, unique=True, default=generate_calendar_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendar token for {self.user.email}"
+
+    def regenerate(self):
+        """Replace the token, invalidating previously shared feed URLs."""
+        self.token = generate_calendar_token()
+        self.save(update_fields=['token'])
@@ -0,0 +1,128 @@
+# accounts/pagination.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+class CursorPage:
+    """One page of a CursorPaginator, iterable like a Django Page"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.total = None
+        self.total_is_exact = True
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], reverse=False)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+
+class CursorPaginator:
+    """
+    Keyset paginator for large, stably ordered querysets.
+
+    Pages are addressed by opaque cursors holding the sort key of the row at
+    the page boundary, so every page is one indexed range read: no OFFSET and
+    no COUNT(*). ``ordering`` must end with a unique field (normally ``-id``)
+    and only name non-null local fields. Pass ``count_limit`` to attach an
+    approximate total that stops counting at that many rows.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_limit=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_limit = count_limit
+        opts = queryset.model._meta
+        self.fields = [
+            (opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in ordering
+        ]
+
+    def encode_cursor(self, obj, reverse):
+        position = [field.value_to_string(obj) for field, _ in self.fields]
+        payload = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(position, reverse)`` for a cursor, or ``(None, False)`` if it is invalid."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position = [field.to_python(value) for (field, _), value in zip(self.fields, payload['p'])]
+            if len(position) != len(self.fields) or None in position:
+                return None, False
+            return position, bool(payload['r'])
+        except (TypeError, ValueError, KeyError, AttributeError, ValidationError):
+            return None, False
+
+    def _after(self, position, reverse):
+        """Filter selecting the rows that sort after ``position`` (before it when ``reverse``)."""
+        keyset = Q()
+        equal = {}
+        for (field, descending), value in zip(self.fields, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset |= Q(**equal, **{f'{field.attname}__{lookup}': value})
+            equal[field.attname] = value
+        # A redundant bound on the leading column lets the database seek the index
+        field, descending = self.fields[0]
+        bound = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{field.attname}__{bound}': position[0]}) & keyset
+
+    def approximate_count(self):
+        """Count matching rows, stopping at ``count_limit``; returns ``(count, is_exact)``."""
+        count = self.queryset.order_by()[:self.count_limit + 1].count()
+        if count > self.count_limit:
+            return self.count_limit, False
+        return count, True
+
+    def page(self, cursor=None):
+        position, reverse = self.decode_cursor(cursor) if cursor else (None, False)
+        queryset = self.queryset.reverse() if reverse else self.queryset
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        # Neighbouring pages are linked from the rows fetched: a stale or
+        # crafted cursor may land on an empty range with nothing to link from
+        if reverse:
+            rows.reverse()
+            page = CursorPage(rows, self, has_next=bool(rows), has_previous=has_more)
+        else:
+            page = CursorPage(rows, self, has_next=has_more, has_previous=position is not None and bool(rows))
+
+        if self.count_limit:
+            page.total, page.total_is_exact = self.approximate_count()
+        return page
@@ -0,0 +1,22 @@
+# accounts/previews.py
+
+from django.conf import settings
+from django.db.models.functions import Substr
+
+# Characters of free text shown per field on list pages
+PREVIEW_LENGTH = getattr(settings, 'LIST_PREVIEW_LENGTH', 120)
+
+def with_previews(queryset, *fields, length=None):
+    """
+    Defer the text ``fields`` and annotate ``<field>_preview`` instead.
+
+    The database returns only the first ``length`` + 1 characters of each
+    field, so list rows stay small however long the notes are, and
+    ``{{ row.<field>_preview|truncatechars:length }}`` still knows whether to
+    add an ellipsis. Reading a deferred field costs one query per object, so
+    the full text belongs on detail pages only.
+    """
+    length = length or PREVIEW_LENGTH
+    return queryset.defer(*fields).annotate(**{
+        f'{field}_preview': Substr(field, 1, length + 1) for field in fields
+    })
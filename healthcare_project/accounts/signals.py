@@ -0,0 +1,25 @@
+# accounts/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+from .models import User, PatientProfile, DoctorProfile, NurseProfile, PharmacistProfile, LabTechnicianProfile
+
+@receiver([post_save, post_delete], sender=Token)
+def token_changed(sender, instance, **kwargs):
+    authentication.invalidate_token(instance.key)
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Deactivation, role changes and deletes all take effect on the next API request"""
+    authentication.invalidate_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=PatientProfile)
+@receiver([post_save, post_delete], sender=DoctorProfile)
+@receiver([post_save, post_delete], sender=NurseProfile)
+@receiver([post_save, post_delete], sender=PharmacistProfile)
+@receiver([post_save, post_delete], sender=LabTechnicianProfile)
+def profile_changed(sender, instance, **kwargs):
+    authentication.invalidate_user(instance.user_id)
@@ -1,3 +1,161 @@
-from django.test import TestCase
+# accounts/tests.py
 
-# Create your tests here.
+import base64
+import json
+
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+
+from .backends import ProfileModelBackend
+from .decorators import query_budget, QueryBudgetExceeded
+from .pagination import CursorPaginator
+from .models import (
+    User, PatientProfile, DoctorProfile, NurseProfile, PharmacistProfile, LabTechnicianProfile, PROFILE_RELATIONS
+)
+
+@query_budget(1)
+def two_query_view(request):
+    list(User.objects.all())
+    list(User.objects.all())
+    return HttpResponse()
+
+@query_budget(2)
+def per_row_template_view(request):
+    # The template reads a relation per row, which the view never queried
+    template = Template("{% for user in users %}{{ user.doctor_profile.specialization }}{% endfor %}")
+    return HttpResponse(template.render(Context({'users': User.objects.all()})))
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryBudgetTests(TestCase):
+    """query_budget enforces its cap on page renders only"""
+
+    def test_get_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            two_query_view(RequestFactory().get('/'))
+
+    def test_queries_run_while_rendering_count(self):
+        for i in range(2):
+            User.objects.create(email=f'user{i}@example.com', user_type='PATIENT')
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            per_row_template_view(RequestFactory().get('/'))
+        self.assertIn('ran 3 queries', str(raised.exception))
+
+    def test_page_renders_within_its_budget(self):
+        self.client.force_login(User.objects.create(email='admin@example.com', user_type='ADMIN'))
+        # Session and user lookups, then the view's queries; the template adds none
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('admin_panel:dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_queries_are_not_logged(self):
+        logged = len(connection.queries_log)
+        with self.assertRaises(QueryBudgetExceeded):
+            two_query_view(RequestFactory().get('/'))
+        self.assertEqual(len(connection.queries_log), logged)
+
+    def test_post_is_not_counted(self):
+        response = two_query_view(RequestFactory().post('/'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False)
+    def test_disabled(self):
+        response = two_query_view(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+
+class ProfileLoadingTests(TestCase):
+    """Users come with their role profile in the same query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = {
+            'PATIENT': PatientProfile.objects.create(user=User.objects.create(email='patient@example.com', user_type='PATIENT')),
+            'DOCTOR': DoctorProfile.objects.create(
+                user=User.objects.create(email='doctor@example.com', user_type='DOCTOR'),
+                specialization='Cardiology', qualification='MD', license_number='D1'
+            ),
+            'NURSE': NurseProfile.objects.create(
+                user=User.objects.create(email='nurse@example.com', user_type='NURSE'),
+                qualification='RN', license_number='N1', department='Cardiology'
+            ),
+            'PHARMACIST': PharmacistProfile.objects.create(
+                user=User.objects.create(email='pharmacist@example.com', user_type='PHARMACIST'),
+                qualification='PharmD', license_number='P1'
+            ),
+            'LAB_TECH': LabTechnicianProfile.objects.create(
+                user=User.objects.create(email='lab@example.com', user_type='LAB_TECH'),
+                qualification='BSc', specialization='Hematology', license_number='L1'
+            ),
+        }
+        cls.admin = User.objects.create(email='admin@example.com', user_type='ADMIN')
+
+    def test_backend_resolves_every_role_in_one_query(self):
+        backend = ProfileModelBackend()
+        for user_type, profile in self.profiles.items():
+            with self.subTest(user_type=user_type), self.assertNumQueries(1):
+                user = backend.get_user(profile.user_id)
+                self.assertEqual(user.get_role_specific_profile(), profile)
+        with self.assertNumQueries(1):
+            self.assertIsNone(backend.get_user(self.admin.pk).get_role_specific_profile())
+
+    def test_backend_refuses_unknown_and_inactive_users(self):
+        backend = ProfileModelBackend()
+        self.assertIsNone(backend.get_user(0))
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        self.assertIsNone(backend.get_user(self.admin.pk))
+
+    def test_with_profiles(self):
+        with self.assertNumQueries(1):
+            users = list(User.objects.with_profiles())
+            found = {user.user_type: user.get_role_specific_profile() for user in users}
+        self.assertEqual(found, {**self.profiles, 'ADMIN': None})
+
+        with self.assertNumQueries(1):
+            doctors = list(User.objects.with_profiles('DOCTOR'))
+            self.assertEqual([user.get_role_specific_profile() for user in doctors], [self.profiles['DOCTOR']])
+        # Only the requested role's table is joined
+        sql = str(User.objects.with_profiles('DOCTOR').query)
+        for relation in PROFILE_RELATIONS.values():
+            table = User._meta.get_field(relation).related_model._meta.db_table
+            self.assertEqual(table in sql, relation == 'doctor_profile')
+
+class CursorPaginatorTests(TestCase):
+    """CursorPaginator walks a mixed-direction ordering forwards and backwards"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            User.objects.create(email=f'user{i}@example.com', last_name='AB'[i % 2], user_type='PATIENT')
+        cls.expected = list(User.objects.order_by('last_name', '-id'))
+
+    def test_pages_forward_and_back(self):
+        paginator = CursorPaginator(User.objects.all(), 3, ordering=('last_name', '-id'))
+
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertEqual(list(paginator.page(back.previous_cursor)), list(first))
+        self.assertFalse(paginator.page(back.previous_cursor).has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = CursorPaginator(User.objects.all(), 3, ordering=('last_name', '-id'))
+        self.assertEqual(list(paginator.page('not-a-cursor')), self.expected[:3])
+        # Well-formed cursors with values the fields reject
+        for position in (['A', 'x'], ['A', None]):
+            payload = json.dumps({'p': position, 'r': False}).encode()
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            self.assertEqual(list(paginator.page(cursor)), self.expected[:3])
+
+    def test_approximate_count(self):
+        page = CursorPaginator(User.objects.all(), 3, ordering=('-id',), count_limit=5).page()
+        self.assertEqual((page.total, page.total_is_exact), (5, False))
+        page = CursorPaginator(User.objects.all(), 3, ordering=('-id',), count_limit=50).page()
+        self.assertEqual((page.total, page.total_is_exact), (7, True))
@@ -11,4 +11,5 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_view, name='profile'),
+    path('profile/calendar/', views.calendar_feed_view, name='calendar_feed'),
 ]
\ No newline at end of file
@@ -12,7 +12,10 @@ from .forms import (
     PatientProfileForm, DoctorProfileForm, NurseProfileForm,
     PharmacistProfileForm, LabTechnicianProfileForm
 )
-from .models import User, PatientProfile, DoctorProfile, NurseProfile, PharmacistProfile, LabTechnicianProfile
+from .models import (
+    User, PatientProfile, DoctorProfile, NurseProfile, PharmacistProfile, LabTechnicianProfile,
+    CalendarToken
+)
 
 def home(request):
     """Home page view."""
@@ -195,4 +198,24 @@ def profile_view(request):
         'user': user,
         'profile': profile,
     }
-    return render(request, 'accounts/profile.html', context)
\ No newline at end of file
+    return render(request, 'accounts/profile.html', context)
+
+@login_required
+def calendar_feed_view(request):
+    """Show the user's appointment calendar feed URL; POST issues a new one."""
+    if request.user.user_type not in ('DOCTOR', 'PATIENT'):
+        messages.error(request, "Calendar feeds are available to doctors and patients only.")
+        return redirect('accounts:home')
+    
+    calendar_token, _ = CalendarToken.objects.get_or_create(user=request.user)
+    
+    if request.method == 'POST':
+        calendar_token.regenerate()
+        messages.success(request, "A new calendar link was created. The old link no longer works.")
+        return redirect('accounts:calendar_feed')
+    
+    feed_url = request.build_absolute_uri(
+        reverse('patient:appointment_calendar', args=[calendar_token.token])
+    )
+    
+    return render(request, 'accounts/calendar_feed.html', {'feed_url': feed_url})
@@ -0,0 +1,16 @@
+# admin_panel/management/commands/refresh_metrics.py
+
+from django.core.management.base import BaseCommand
+
+from admin_panel import rollups
+
+class Command(BaseCommand):
+    help = "Recompute the daily operational metrics of days changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild every day instead of only the changed ones")
+
+    def handle(self, *args, **options):
+        days, rows = rollups.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {days} days ({rows} doctor-day rows)"))
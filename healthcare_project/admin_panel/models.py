@@ -1,3 +1,62 @@
+# admin_panel/models.py
+
 from django.db import models
+from accounts.models import DoctorProfile
+
+class DailyDoctorMetrics(models.Model):
+    """
+    Operational counters for one doctor on one day, maintained by
+    ``admin_panel.rollups``. Bills that belong to neither an appointment nor a
+    prescription are counted on a row without a doctor.
+    """
+    date = models.DateField()
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='daily_metrics', null=True, blank=True)
+    appointments_scheduled = models.PositiveIntegerField(default=0)
+    appointments_completed = models.PositiveIntegerField(default=0)
+    appointments_cancelled = models.PositiveIntegerField(default=0)
+    appointments_no_show = models.PositiveIntegerField(default=0)
+    records_created = models.PositiveIntegerField(default=0)
+    bills_issued = models.PositiveIntegerField(default=0)
+    amount_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bills_collected = models.PositiveIntegerField(default=0)
+    amount_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def appointments_total(self):
+        return (self.appointments_scheduled + self.appointments_completed
+                + self.appointments_cancelled + self.appointments_no_show)
+
+    @property
+    def no_show_rate(self):
+        """Share of attended-or-missed appointments that were missed, or None"""
+        seen = self.appointments_completed + self.appointments_no_show
+        return self.appointments_no_show / seen if seen else None
+
+    def __str__(self):
+        return f"{self.date} - doctor {self.doctor_id}"
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date'], name='metrics_date_idx'),
+            models.Index(fields=['doctor', 'date'], name='metrics_doctor_date_idx'),
+        ]
+
+class RollupState(models.Model):
+    """How far an incremental rollup has read its source tables"""
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} up to {self.watermark}"
+
+class RollupDirtyDay(models.Model):
+    """
+    A day whose rollup must be recomputed although no row changed after the
+    watermark: a deleted row, or an appointment moved away from that date.
+    """
+    date = models.DateField(unique=True)
 
-# Create your models here.
+    def __str__(self):
+        return str(self.date)
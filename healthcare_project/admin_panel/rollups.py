@@ -0,0 +1,146 @@
+# admin_panel/rollups.py
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from patient.models import Appointment, MedicalRecord, Bill
+from .models import DailyDoctorMetrics, RollupState, RollupDirtyDay
+
+ROLLUP_NAME = 'daily_doctor_metrics'
+# Rows committed by transactions still open at the previous run carry an
+# ``updated_at`` older than its watermark; rescanning this far back catches them
+WATERMARK_OVERLAP = timedelta(seconds=getattr(settings, 'ROLLUP_WATERMARK_OVERLAP', 300))
+DAYS_PER_BATCH = 31
+
+APPOINTMENT_COUNTERS = {
+    'appointments_scheduled': 'SCHEDULED',
+    'appointments_completed': 'COMPLETED',
+    'appointments_cancelled': 'CANCELLED',
+    'appointments_no_show': 'NO_SHOW',
+}
+
+def mark_dirty(dates):
+    """Queue days for the next refresh, for writes the watermark cannot see."""
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(date=day) for day in set(dates) if day is not None], ignore_conflicts=True
+    )
+
+def changed_days(since):
+    """Days touched by appointments, records or bills updated after ``since``."""
+    days = set(Appointment.objects.filter(updated_at__gt=since).order_by().values_list(
+        'appointment_date', flat=True
+    ).distinct())
+    days.update(MedicalRecord.objects.filter(date_updated__gt=since).order_by().annotate(
+        day=TruncDate('date_created')
+    ).values_list('day', flat=True).distinct())
+    bills = Bill.objects.filter(updated_at__gt=since).order_by()
+    days.update(bills.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct())
+    days.update(bills.annotate(day=TruncDate('payment_date')).values_list('day', flat=True).distinct())
+    days.discard(None)
+    return days
+
+def _day_range(days):
+    start = timezone.make_aware(datetime.combine(min(days), time.min))
+    end = timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), time.min))
+    return start, end
+
+def compute_days(days):
+    """Build (unsaved) metrics rows for ``days`` with one grouped query per source."""
+    days = set(days)
+    start, end = _day_range(days)
+    rows = {}
+
+    def row(day, doctor_id):
+        if (day, doctor_id) not in rows:
+            rows[day, doctor_id] = DailyDoctorMetrics(date=day, doctor_id=doctor_id)
+        return rows[day, doctor_id]
+
+    appointments = Appointment.objects.filter(appointment_date__in=days).order_by().values(
+        'appointment_date', 'doctor_id'
+    ).annotate(**{
+        counter: Count('id', filter=Q(status=status)) for counter, status in APPOINTMENT_COUNTERS.items()
+    })
+    for group in appointments:
+        metrics = row(group['appointment_date'], group['doctor_id'])
+        for counter in APPOINTMENT_COUNTERS:
+            setattr(metrics, counter, group[counter])
+
+    records = MedicalRecord.objects.filter(date_created__gte=start, date_created__lt=end).order_by().values(
+        'doctor_id', day=TruncDate('date_created')
+    ).annotate(count=Count('id'))
+    for group in records:
+        if group['day'] in days:
+            row(group['day'], group['doctor_id']).records_created = group['count']
+
+    bill_doctor = Coalesce('appointment__doctor_id', 'prescription__doctor_id')
+    issued = Bill.objects.filter(created_at__gte=start, created_at__lt=end).order_by().values(
+        day=TruncDate('created_at'), bill_doctor=bill_doctor
+    ).annotate(count=Count('id'), amount=Sum('total_amount'))
+    for group in issued:
+        if group['day'] in days:
+            metrics = row(group['day'], group['bill_doctor'])
+            metrics.bills_issued, metrics.amount_billed = group['count'], group['amount']
+
+    collected = Bill.objects.filter(status='PAID', payment_date__gte=start, payment_date__lt=end).order_by().values(
+        day=TruncDate('payment_date'), bill_doctor=bill_doctor
+    ).annotate(count=Count('id'), amount=Sum('total_amount'))
+    for group in collected:
+        if group['day'] in days:
+            metrics = row(group['day'], group['bill_doctor'])
+            metrics.bills_collected, metrics.amount_collected = group['count'], group['amount']
+
+    return list(rows.values())
+
+def refresh_days(days):
+    """Replace the rollup rows of ``days``; returns the number of rows written."""
+    days = sorted(set(days))
+    written = 0
+    for i in range(0, len(days), DAYS_PER_BATCH):
+        batch = days[i:i + DAYS_PER_BATCH]
+        rows = compute_days(batch)
+        with transaction.atomic():
+            DailyDoctorMetrics.objects.filter(date__in=batch).delete()
+            DailyDoctorMetrics.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+def all_days():
+    days = set(Appointment.objects.order_by().values_list('appointment_date', flat=True).distinct())
+    days.update(MedicalRecord.objects.order_by().annotate(day=TruncDate('date_created')).values_list('day', flat=True).distinct())
+    days.update(Bill.objects.order_by().annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct())
+    days.update(Bill.objects.order_by().annotate(day=TruncDate('payment_date')).values_list('day', flat=True).distinct())
+    days.discard(None)
+    return days
+
+def refresh(full=False, now=None):
+    """
+    Bring the rollups up to date and return ``(days, rows)`` refreshed.
+
+    Only days with a source row updated since the stored watermark, or queued
+    by ``mark_dirty``, are recomputed; the first run (or ``full=True``)
+    rebuilds every day.
+    """
+    now = now or timezone.now()
+    state, _ = RollupState.objects.get_or_create(name=ROLLUP_NAME)
+    dirty = list(RollupDirtyDay.objects.values_list('pk', 'date'))
+
+    if full or state.watermark is None:
+        # One transaction, so readers keep the old rows until the new ones are in
+        with transaction.atomic():
+            days = all_days()
+            days.update(date for _, date in dirty)
+            DailyDoctorMetrics.objects.all().delete()
+            rows = refresh_days(days)
+    else:
+        days = changed_days(state.watermark - WATERMARK_OVERLAP)
+        days.update(date for _, date in dirty)
+        rows = refresh_days(days) if days else 0
+    RollupDirtyDay.objects.filter(pk__in=[pk for pk, _ in dirty]).delete()
+    state.watermark = now
+    state.save(update_fields=['watermark'])
+    return len(days), rows
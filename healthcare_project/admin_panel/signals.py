@@ -0,0 +1,46 @@
+# admin_panel/signals.py
+
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from patient.models import Appointment, MedicalRecord, Bill
+from . import rollups
+
+def _day(value):
+    return timezone.localtime(value).date() if value else None
+
+# Updates are found through ``updated_at`` watermarks; only the days those
+# cannot reveal (deleted rows, dates moved away from) are queued here
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    instance._loaded_appointment_date = instance.appointment_date
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance._loaded_appointment_date not in (None, instance.appointment_date):
+        rollups.mark_dirty([instance._loaded_appointment_date])
+    instance._loaded_appointment_date = instance.appointment_date
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    rollups.mark_dirty([instance.appointment_date])
+
+@receiver(post_delete, sender=MedicalRecord)
+def medical_record_deleted(sender, instance, **kwargs):
+    rollups.mark_dirty([_day(instance.date_created)])
+
+@receiver(post_init, sender=Bill)
+def bill_loaded(sender, instance, **kwargs):
+    instance._loaded_payment_date = instance.payment_date
+
+@receiver(post_save, sender=Bill)
+def bill_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance._loaded_payment_date not in (None, instance.payment_date):
+        rollups.mark_dirty([_day(instance._loaded_payment_date)])
+    instance._loaded_payment_date = instance.payment_date
+
+@receiver(post_delete, sender=Bill)
+def bill_deleted(sender, instance, **kwargs):
+    rollups.mark_dirty([_day(instance.created_at), _day(instance.payment_date)])
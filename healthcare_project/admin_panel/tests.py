@@ -1,3 +1,117 @@
-from django.test import TestCase
+# admin_panel/tests.py
 
-# Create your tests here.
+from datetime import time, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, DoctorProfile, PatientProfile
+from patient.models import Appointment, MedicalRecord, Bill
+from . import rollups, views
+from .models import DailyDoctorMetrics, RollupDirtyDay
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create(email=f'doc{i}@example.com', first_name='Doc', last_name=str(i), user_type='DOCTOR'),
+                specialization='Cardiology', qualification='MD', license_number=f'D{i}'
+            )
+            for i in range(2)
+        ]
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create(email='patient@example.com', user_type='PATIENT')
+        )
+        for day, status in [(-2, 'COMPLETED'), (-2, 'NO_SHOW'), (-1, 'COMPLETED'), (1, 'SCHEDULED')]:
+            for doctor in cls.doctors:
+                Appointment.objects.create(
+                    patient=cls.patient, doctor=doctor, appointment_date=cls.today + timedelta(days=day),
+                    appointment_time=time(9 if status != 'NO_SHOW' else 10), reason='Checkup', status=status,
+                )
+        appointment = Appointment.objects.filter(doctor=cls.doctors[0]).first()
+        Bill.objects.create(patient=cls.patient, appointment=appointment, amount=80, total_amount=80,
+                            due_date=cls.today, status='PAID', payment_date=timezone.now())
+        MedicalRecord.objects.create(patient=cls.patient, doctor=cls.doctors[1], diagnosis='Flu', symptoms='', treatment='')
+
+    def metrics(self, day, doctor):
+        return DailyDoctorMetrics.objects.get(date=day, doctor=doctor)
+
+    def test_first_refresh_builds_every_day(self):
+        days, rows = rollups.refresh()
+        self.assertEqual(days, 4)
+        self.assertEqual(rows, 8)
+        metrics = self.metrics(self.today - timedelta(days=2), self.doctors[0])
+        self.assertEqual(metrics.appointments_completed, 1)
+        self.assertEqual(metrics.no_show_rate, 0.5)
+        today = self.metrics(self.today, self.doctors[0])
+        self.assertEqual((today.bills_issued, today.bills_collected, today.amount_collected), (1, 1, 80))
+        self.assertEqual(self.metrics(self.today, self.doctors[1]).records_created, 1)
+
+    def test_refresh_only_touches_changed_days(self):
+        earlier = timezone.now() - timedelta(hours=1)
+        Appointment.objects.update(updated_at=earlier)
+        Bill.objects.update(updated_at=earlier)
+        MedicalRecord.objects.update(date_updated=earlier)
+        rollups.refresh()
+        appointment = Appointment.objects.get(doctor=self.doctors[1], status='SCHEDULED')
+        appointment.status = 'CANCELLED'
+        appointment.save()
+
+        days, rows = rollups.refresh()
+        self.assertEqual(days, 1)
+        metrics = self.metrics(appointment.appointment_date, self.doctors[1])
+        self.assertEqual((metrics.appointments_scheduled, metrics.appointments_cancelled), (0, 1))
+
+    def test_deleted_and_moved_rows_mark_their_days(self):
+        rollups.refresh()
+        old_day = self.today - timedelta(days=1)
+        Appointment.objects.get(doctor=self.doctors[0], appointment_date=old_day).delete()
+        moved = Appointment.objects.get(doctor=self.doctors[1], appointment_date=old_day)
+        moved.appointment_date = self.today + timedelta(days=3)
+        moved.save()
+        self.assertTrue(RollupDirtyDay.objects.filter(date=old_day).exists())
+
+        rollups.refresh()
+        self.assertFalse(DailyDoctorMetrics.objects.filter(date=old_day).exists())
+        self.assertEqual(self.metrics(moved.appointment_date, self.doctors[1]).appointments_completed, 1)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_dashboard_reads_only_rollups(self):
+        rollups.refresh()
+        request = RequestFactory().get('/')
+        request.user = User.objects.create(email='admin@example.com', user_type='ADMIN')
+        with mock.patch.object(views, 'render', return_value=HttpResponse()) as render:
+            with CaptureQueriesContext(connection) as queries:
+                views.dashboard(request)
+        for query in queries.captured_queries:
+            self.assertNotIn('patient_', query['sql'])
+        context = render.call_args.args[2]
+        self.assertEqual(context['totals']['appointments_completed'], 4)
+        self.assertEqual(context['totals']['no_show_rate'], 2 / 6)
+        self.assertEqual(len(context['doctor_rows']), 2)
+
+    def test_pages_render(self):
+        rollups.refresh()
+        self.client.force_login(User.objects.create(email='admin@example.com', user_type='ADMIN'))
+        response = self.client.get(reverse('admin_panel:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dr. Doc 0')
+        self.assertContains(response, '33%')
+        response = self.client.get(reverse('admin_panel:doctor_metrics', args=[self.doctors[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '$80.00', count=4)
+
+    def test_full_rebuild_is_atomic(self):
+        rollups.refresh()
+        before = DailyDoctorMetrics.objects.count()
+        with mock.patch.object(rollups, 'compute_days', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rollups.refresh(full=True)
+        self.assertEqual(DailyDoctorMetrics.objects.count(), before)
@@ -0,0 +1,12 @@
+# admin_panel/urls.py
+
+from django.urls import path
+from . import views
+
+app_name = 'admin_panel'
+
+urlpatterns = [
+    # Operational metrics
+    path('', views.dashboard, name='dashboard'),
+    path('metrics/doctors/<int:doctor_id>/', views.doctor_metrics, name='doctor_metrics'),
+]
@@ -1,3 +1,109 @@
-from django.shortcuts import render
+# admin_panel/views.py
 
-# Create your views here.
+from datetime import date, timedelta
+
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.decorators import query_budget
+from accounts.models import DoctorProfile
+from . import rollups
+from .models import DailyDoctorMetrics, RollupState
+
+# Default reporting window, in days up to and including today
+DEFAULT_METRICS_DAYS = 30
+
+METRIC_FIELDS = (
+    'appointments_scheduled', 'appointments_completed', 'appointments_cancelled', 'appointments_no_show',
+    'records_created', 'bills_issued', 'amount_billed', 'bills_collected', 'amount_collected',
+)
+
+def _sums():
+    return {field: Sum(field) for field in METRIC_FIELDS}
+
+def _with_rates(totals):
+    """Fill missing sums with 0 and add the no-show rate (None when nothing was attended or missed)"""
+    totals = {key: value or 0 for key, value in totals.items()}
+    seen = totals['appointments_completed'] + totals['appointments_no_show']
+    totals['no_show_rate'] = totals['appointments_no_show'] / seen if seen else None
+    return totals
+
+def _date_range(request):
+    """Reporting window from ``start``/``end`` GET parameters, or the last DEFAULT_METRICS_DAYS days"""
+    end = timezone.localdate()
+    start = end - timedelta(days=DEFAULT_METRICS_DAYS - 1)
+    try:
+        if request.GET.get('end'):
+            end = date.fromisoformat(request.GET['end'])
+        if request.GET.get('start'):
+            start = date.fromisoformat(request.GET['start'])
+    except ValueError:
+        messages.error(request, "Invalid date range; showing the default period.")
+        end = timezone.localdate()
+        start = end - timedelta(days=DEFAULT_METRICS_DAYS - 1)
+    return start, end
+
+def _last_refreshed():
+    return RollupState.objects.filter(name=rollups.ROLLUP_NAME).values_list('watermark', flat=True).first()
+
+@login_required
+@query_budget(5)
+def dashboard(request):
+    """Clinic operational metrics, read from the daily rollups only"""
+    if request.user.user_type != 'ADMIN':
+        messages.error(request, "Access denied. Administrator access only.")
+        return redirect('accounts:home')
+    
+    start_date, end_date = _date_range(request)
+    metrics = DailyDoctorMetrics.objects.filter(date__gte=start_date, date__lte=end_date).order_by()
+    
+    totals = _with_rates(metrics.aggregate(**_sums()))
+    daily = [_with_rates(row) for row in metrics.values('date').annotate(**_sums()).order_by('date')]
+    
+    per_doctor = list(metrics.filter(doctor__isnull=False).values('doctor').annotate(**_sums()))
+    doctors = DoctorProfile.objects.select_related('user').in_bulk([row['doctor'] for row in per_doctor])
+    doctor_rows = []
+    for row in per_doctor:
+        row = _with_rates(row)
+        row['doctor'] = doctors[row['doctor']]
+        doctor_rows.append(row)
+    doctor_rows.sort(key=lambda row: row['doctor'].user.get_full_name())
+    
+    context = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'totals': totals,
+        'daily': daily,
+        'doctor_rows': doctor_rows,
+        'last_refreshed': _last_refreshed(),
+    }
+    
+    return render(request, 'admin_panel/dashboard.html', context)
+
+@login_required
+@query_budget(4)
+def doctor_metrics(request, doctor_id):
+    """Day by day metrics of one doctor, read from the daily rollups only"""
+    if request.user.user_type != 'ADMIN':
+        messages.error(request, "Access denied. Administrator access only.")
+        return redirect('accounts:home')
+    
+    doctor = get_object_or_404(DoctorProfile.objects.select_related('user'), pk=doctor_id)
+    start_date, end_date = _date_range(request)
+    days = list(DailyDoctorMetrics.objects.filter(
+        doctor=doctor, date__gte=start_date, date__lte=end_date
+    ).order_by('date'))
+    
+    context = {
+        'doctor': doctor,
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': days,
+        'totals': _with_rates({field: sum(getattr(day, field) for day in days) for field in METRIC_FIELDS}),
+        'last_refreshed': _last_refreshed(),
+    }
+    
+    return render(request, 'admin_panel/doctor_metrics.html', context)
@@ -0,0 +1,116 @@
+# api/encoders.py
+
+import datetime
+import decimal
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import fields, relations
+from rest_framework.settings import ISO_8601, api_settings
+
+# Serializing a row through rest_framework resolves every field's source and
+# re-checks its options per value. A representation plan does that once per
+# serializer: a plain attribute getter and a type-specialised encoder for
+# each model column, giving the same output as the field's own
+# ``to_representation``. Anything else keeps the stock path.
+
+def _identity(value):
+    return value
+
+def _exact(kind, encode, field):
+    """``encode`` values of exactly ``kind``; any other value goes through the field"""
+    to_representation = field.to_representation
+
+    def encoder(value):
+        if type(value) is kind:
+            return encode(value)
+        return to_representation(value)
+    return encoder
+
+def _is_iso(field, default):
+    output_format = getattr(field, 'format', default)
+    return output_format is not None and output_format.lower() == ISO_8601
+
+def _choice(field):
+    choices = field.choice_strings_to_values
+    return _exact(str, lambda value: choices.get(value, value), field)
+
+def _decimal(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    return _exact(
+        decimal.Decimal, lambda value: f'{value.quantize(exponent, rounding=rounding, context=context):f}', field
+    )
+
+def _date(field):
+    if not _is_iso(field, api_settings.DATE_FORMAT):
+        return None
+    return _exact(datetime.date, datetime.date.isoformat, field)
+
+def _time(field):
+    if not _is_iso(field, api_settings.TIME_FORMAT):
+        return None
+    return _exact(datetime.time, datetime.time.isoformat, field)
+
+def _datetime(field):
+    if not _is_iso(field, api_settings.DATETIME_FORMAT):
+        return None
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return None
+
+    def encode(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return _exact(datetime.datetime, encode, field)
+
+# Exact field class -> encoder builder (None when the field's options need the stock path)
+BUILDERS = {
+    fields.IntegerField: lambda field: _exact(int, _identity, field),
+    fields.CharField: lambda field: _exact(str, _identity, field),
+    fields.EmailField: lambda field: _exact(str, _identity, field),
+    fields.BooleanField: lambda field: _exact(bool, _identity, field),
+    fields.ChoiceField: _choice,
+    fields.DecimalField: _decimal,
+    fields.DateField: _date,
+    fields.TimeField: _time,
+    fields.DateTimeField: _datetime,
+}
+
+def _compile(field, model):
+    """``(getter, encoder)`` for a field read straight off a model column, else None"""
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+
+    if type(field) is relations.PrimaryKeyRelatedField:
+        if field.pk_field is None and model_field.many_to_one:
+            # The foreign key column is the primary key the field would output
+            return attrgetter(model_field.attname), _identity
+        return None
+    if not model_field.concrete or model_field.is_relation:
+        return None
+    builder = BUILDERS.get(type(field))
+    encoder = builder(field) if builder else None
+    return (attrgetter(model_field.attname), encoder) if encoder else None
+
+def representation_plan(serializer):
+    """``(name, field, getter, encoder)`` per readable field; getter and encoder are None for the stock path"""
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    plan = []
+    for field in serializer._readable_fields:
+        compiled = _compile(field, model) or (None, None)
+        plan.append((field.field_name, field, *compiled))
+    return plan
@@ -0,0 +1,87 @@
+# api/management/commands/benchmark_json.py
+
+import json
+import time as clock
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User, DoctorProfile, PatientProfile
+from api import renderers
+from api.serializers import AppointmentSerializer, BillSerializer
+from patient.models import Appointment, Bill
+
+def _stock(serializer_class):
+    """The same serializer through rest_framework's own ``to_representation``"""
+    return type(f'Stock{serializer_class.__name__}', (serializer_class,), {
+        'to_representation': serializers.ModelSerializer.to_representation,
+    })
+
+def _rows(kind, count):
+    # Unsaved instances: the benchmark measures serialization, not the database
+    patient = PatientProfile(id=1, user=User(id=1, first_name='Patient', last_name='One'))
+    doctor = DoctorProfile(id=2, user=User(id=2, first_name='Ann', last_name='Lee'), specialization='Cardiology')
+    now = timezone.now()
+    start = date(2024, 1, 1)
+    if kind == 'appointments':
+        return [
+            Appointment(id=i, patient=patient, doctor=doctor, appointment_date=start + timedelta(days=i % 365),
+                        appointment_time=time(9 + i % 8, 30), reason='Follow-up visit', status='COMPLETED',
+                        notes='', created_at=now, updated_at=now)
+            for i in range(1, count + 1)
+        ]
+    return [
+        Bill(id=i, patient=patient, appointment_id=i, amount=Decimal('120.50'), tax=Decimal('12.05'),
+             discount=Decimal('0'), total_amount=Decimal('132.55'), status='PAID', payment_method='CARD',
+             payment_date=now, due_date=start + timedelta(days=i % 365), description='Consultation',
+             created_at=now, updated_at=now)
+        for i in range(1, count + 1)
+    ]
+
+def _best(repeat, func):
+    best, result = None, None
+    for _ in range(repeat):
+        started = clock.perf_counter()
+        result = func()
+        elapsed = clock.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+class Command(BaseCommand):
+    help = (
+        "Compare the API's serializers and JSON renderer with rest_framework's stock ones "
+        "on in-memory appointment and bill payloads. Touches no database rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Rows per payload")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the best is reported")
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+        backend = 'orjson' if renderers.orjson is not None else 'json (orjson not installed)'
+        self.stdout.write(f"Renderer backend: {backend}")
+
+        for kind, serializer_class in (('appointments', AppointmentSerializer), ('bills', BillSerializer)):
+            rows = _rows(kind, options['rows'])
+            stock_serialize, stock_data = _best(
+                options['repeat'], lambda: _stock(serializer_class)(rows, many=True).data
+            )
+            fast_serialize, fast_data = _best(options['repeat'], lambda: serializer_class(rows, many=True).data)
+            stock_render, stock_body = _best(options['repeat'], lambda: JSONRenderer().render(stock_data))
+            fast_render, fast_body = _best(options['repeat'], lambda: renderers.FastJSONRenderer().render(fast_data))
+            if json.loads(stock_body) != json.loads(fast_body):
+                raise CommandError(f"{kind}: fast output differs from the stock output")
+
+            self.stdout.write(
+                f"{kind} ({len(rows)} rows): "
+                f"serialize {stock_serialize * 1000:.1f} ms -> {fast_serialize * 1000:.1f} ms, "
+                f"render {stock_render * 1000:.1f} ms -> {fast_render * 1000:.1f} ms, "
+                f"total x{(stock_serialize + stock_render) / (fast_serialize + fast_render):.1f}, "
+                f"{len(stock_body)} -> {len(fast_body)} bytes"
+            )
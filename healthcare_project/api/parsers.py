@@ -0,0 +1,22 @@
+# api/parsers.py
+
+import codecs
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser, get_encoding
+
+from . import renderers
+
+class FastJSONParser(JSONParser):
+    """JSON request bodies through orjson when it is installed (UTF-8 only), the stock parser otherwise"""
+    renderer_class = renderers.FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = get_encoding(parser_context or {})
+        if renderers.orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # orjson already rejects NaN and Infinity, as STRICT_JSON asks
+            return renderers.orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,23 @@
+# api/permissions.py
+
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+class RolePermission(BasePermission):
+    """
+    Allow reads to the view's ``read_roles``, creation to its
+    ``create_roles`` (default ``write_roles``) and other writes to its
+    ``write_roles``, all lists of ``User.user_type`` values. Which rows a
+    role sees is decided by the view's queryset, not here.
+    """
+    message = "Your role does not have access to this resource."
+
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+        if request.method in SAFE_METHODS:
+            roles = view.read_roles
+        elif getattr(view, 'action', None) == 'create':
+            roles = getattr(view, 'create_roles', view.write_roles)
+        else:
+            roles = view.write_roles
+        return request.user.user_type in roles
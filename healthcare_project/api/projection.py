@@ -0,0 +1,85 @@
+# api/projection.py
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+def _split(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+def _with_parents(path):
+    """``a__b__c`` -> ``a``, ``a__b``, ``a__b__c``; ``only()`` must keep each foreign key it traverses"""
+    parts = path.split('__')
+    return ['__'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+class Projection:
+    """
+    The fields a request asked for with ``?fields=`` and ``?expand=``, and
+    the columns, joins and prefetches needed to serialize them.
+
+    Serializers describe fields that are not plain model columns in
+    ``Meta.paths`` (field name -> ORM paths, or a ``Prefetch``) and the
+    relations a client may ask to have inlined in ``Meta.expandable``
+    (field name -> serializer with its own ``paths``).
+    """
+
+    def __init__(self, serializer_class, fields=None, expand=()):
+        self.serializer_class = serializer_class
+        meta = serializer_class.Meta
+        self.expandable = getattr(meta, 'expandable', {})
+        self.expand = list(dict.fromkeys(expand))
+        unknown = [name for name in self.expand if name not in self.expandable]
+        if unknown:
+            raise ValidationError({'expand': [f"Cannot expand: {', '.join(unknown)}."]})
+
+        if fields is None:
+            self.fields = list(meta.fields)
+        else:
+            unknown = [name for name in fields if name not in meta.fields]
+            if unknown:
+                raise ValidationError({'fields': [f"Unknown fields: {', '.join(unknown)}."]})
+            # Expanding a relation also selects it
+            self.fields = list(dict.fromkeys(['id', *fields, *self.expand]))
+
+    @classmethod
+    def from_request(cls, serializer_class, request):
+        fields = request.query_params.get('fields')
+        return cls(
+            serializer_class,
+            fields=_split(fields) if fields is not None else None,
+            expand=_split(request.query_params.get('expand', '')),
+        )
+
+    def _paths(self, name):
+        if name in self.expand:
+            nested = self.expandable[name]
+            return [name, *(f'{name}__{path}' for paths in nested.paths.values() for path in paths)]
+        return getattr(self.serializer_class.Meta, 'paths', {}).get(name, (name,))
+
+    def apply(self, queryset, keep=(), defer=True):
+        """
+        Restrict ``queryset`` to the columns behind the selected fields and
+        join only the relations they read. ``keep`` lists extra columns
+        (e.g. the cursor ordering); ``defer=False`` keeps every column and
+        only adds the joins, for rows that are about to be saved.
+        """
+        columns, joins, prefetches = set(), set(), []
+        for name in self.fields:
+            paths = self._paths(name)
+            if isinstance(paths, Prefetch):
+                prefetches.append(paths)
+                continue
+            for path in paths:
+                columns.update(_with_parents(path))
+                if '__' in path:
+                    joins.add(path.rsplit('__', 1)[0])
+        for path in keep:
+            columns.add(path.lstrip('-'))
+
+        # A join on a longer path already covers its prefixes
+        joins = [path for path in joins if not any(other.startswith(f'{path}__') for other in joins)]
+        queryset = queryset.select_related(*sorted(joins)) if joins else queryset.select_related(None)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if defer:
+            queryset = queryset.only(*sorted(columns))
+        return queryset
@@ -0,0 +1,74 @@
+# api/renderers.py
+
+import datetime
+import decimal
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _datetime(value):
+    # Same ISO format as rest_framework's encoder
+    representation = value.isoformat()
+    if representation.endswith('+00:00'):
+        representation = representation[:-6] + 'Z'
+    return representation
+
+# Exact type -> encoder, looked up before falling back to rest_framework's
+# isinstance chain (lazy strings, times, timedeltas, querysets, ...)
+ENCODERS = {
+    decimal.Decimal: float,
+    datetime.datetime: _datetime,
+    datetime.date: datetime.date.isoformat,
+}
+
+_fallback = JSONEncoder().default
+
+def encode_default(value):
+    encoder = ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    return _fallback(value)
+
+if orjson is not None:
+    # Dates go through ``encode_default`` too, so both backends write the same text
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(data):
+        return orjson.dumps(data, default=encode_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(
+        default=encode_default, ensure_ascii=False, check_circular=False, allow_nan=False, separators=(',', ':'),
+    )
+
+    def dumps(data):
+        return _encoder.encode(data).encode()
+
+    loads = json.loads
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSON through orjson when it is installed, the standard library
+    otherwise. Indented output (the browsable API) is left to the stock
+    renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = dumps(data)
+        # Keep the output safe to embed in <script>, like the stock renderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,239 @@
+# api/serializers.py
+
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from accounts.models import DoctorProfile, PatientProfile
+from doctor.models import DoctorPatient
+from patient.booking import book_appointment, SlotTaken
+from patient.forms import AppointmentForm
+from patient.models import Appointment, MedicalRecord, Prescription, PrescriptionItem, Bill
+from patient.signals import touch_prescription
+from .encoders import representation_plan
+
+# Every serializer declares the ORM paths behind its computed fields in
+# ``Meta.paths``; ``projection.Projection`` turns the fields a request asks
+# for into ``only()`` columns and joins, so a page serializes with a fixed
+# number of queries
+NAME_PATHS = {
+    'patient_name': ('patient__user__first_name', 'patient__user__last_name'),
+    'doctor_name': ('doctor__user__first_name', 'doctor__user__last_name'),
+}
+
+class PatientFieldMixin:
+    """Limit the writable ``patient`` to patients the acting doctor has seen"""
+
+    def validate_patient(self, patient):
+        doctor = self.context['doctor']
+        if not DoctorPatient.objects.filter(doctor=doctor, patient=patient).exists():
+            raise serializers.ValidationError("You have no appointments with this patient.")
+        return patient
+
+class PatientBriefSerializer(serializers.Serializer):
+    """``?expand=patient``"""
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='user.get_full_name', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+
+    paths = {'id': ('id',), 'name': ('user__first_name', 'user__last_name'), 'email': ('user__email',)}
+
+class DoctorBriefSerializer(serializers.Serializer):
+    """``?expand=doctor``"""
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='user.get_full_name', read_only=True)
+    specialization = serializers.CharField(read_only=True)
+
+    paths = {'id': ('id',), 'name': ('user__first_name', 'user__last_name'), 'specialization': ('specialization',)}
+
+class ProjectionMixin:
+    """Serialize only the fields of the view's ``projection``, with expanded relations inlined"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        projection = self.context.get('projection')
+        if projection is None or not isinstance(self, projection.serializer_class):
+            return fields
+        for name in projection.expand:
+            fields[name] = projection.expandable[name](read_only=True)
+        return {name: fields[name] for name in projection.fields}
+
+class FastRepresentationMixin:
+    """Serialize rows through a representation plan built once per serializer instance"""
+
+    def to_representation(self, instance):
+        plan = getattr(self, '_representation_plan', None)
+        if plan is None:
+            plan = self._representation_plan = representation_plan(self)
+        ret = {}
+        for name, field, getter, encode in plan:
+            if getter is None:
+                try:
+                    attribute = field.get_attribute(instance)
+                except serializers.SkipField:
+                    continue
+                check_for_none = attribute.pk if isinstance(attribute, serializers.PKOnlyObject) else attribute
+                ret[name] = None if check_for_none is None else field.to_representation(attribute)
+            else:
+                value = getter(instance)
+                ret[name] = None if value is None else encode(value)
+        return ret
+
+class AppointmentSerializer(ProjectionMixin, FastRepresentationMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    doctor = serializers.PrimaryKeyRelatedField(queryset=DoctorProfile.objects.all())
+
+    class Meta:
+        model = Appointment
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'appointment_date', 'appointment_time',
+            'reason', 'status', 'notes', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['patient', 'status', 'notes', 'created_at', 'updated_at']
+        paths = NAME_PATHS
+        expandable = {'patient': PatientBriefSerializer, 'doctor': DoctorBriefSerializer}
+
+    def validate(self, attrs):
+        # Same leave, working hours and free slot checks as the booking page
+        form = AppointmentForm(data={
+            'doctor': attrs['doctor'].pk,
+            'appointment_date': attrs['appointment_date'],
+            'appointment_time': attrs['appointment_time'],
+            'reason': attrs['reason'],
+        })
+        if not form.is_valid():
+            raise serializers.ValidationError(form.errors.get_json_data(escape_html=False))
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return book_appointment(self.context['patient'], **validated_data)
+        except SlotTaken as e:
+            raise serializers.ValidationError({'appointment_time': [str(e)]})
+
+class AppointmentUpdateSerializer(AppointmentSerializer):
+    """What the treating doctor or nurse may change on an existing appointment"""
+
+    class Meta(AppointmentSerializer.Meta):
+        read_only_fields = [
+            'patient', 'doctor', 'appointment_date', 'appointment_time', 'reason', 'created_at', 'updated_at',
+        ]
+
+    def validate(self, attrs):
+        return attrs
+
+class MedicalRecordSerializer(ProjectionMixin, FastRepresentationMixin, PatientFieldMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    patient = serializers.PrimaryKeyRelatedField(queryset=PatientProfile.objects.all())
+
+    class Meta:
+        model = MedicalRecord
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'diagnosis', 'symptoms', 'treatment',
+            'notes', 'date_created', 'date_updated',
+        ]
+        read_only_fields = ['doctor', 'date_created', 'date_updated']
+        paths = NAME_PATHS
+        expandable = {'patient': PatientBriefSerializer, 'doctor': DoctorBriefSerializer}
+
+class PrescriptionItemSerializer(FastRepresentationMixin, serializers.ModelSerializer):
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+
+    class Meta:
+        model = PrescriptionItem
+        fields = ['id', 'medicine', 'medicine_name', 'dosage', 'duration', 'quantity', 'instructions']
+
+    def validate(self, attrs):
+        # Same stock check as the prescription pages (PrescriptionItemForm.clean_quantity)
+        medicine, quantity = attrs.get('medicine'), attrs.get('quantity')
+        if medicine is not None and quantity is not None and quantity > medicine.stock_quantity:
+            raise serializers.ValidationError({'quantity': [f"Not enough stock. Available: {medicine.stock_quantity}"]})
+        return attrs
+
+class PrescriptionSerializer(ProjectionMixin, FastRepresentationMixin, PatientFieldMixin,
+                             serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    patient = serializers.PrimaryKeyRelatedField(queryset=PatientProfile.objects.all())
+    items = PrescriptionItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = Prescription
+        fields = [
+            'id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'medical_record', 'date_prescribed',
+            'expiry_date', 'notes', 'is_active', 'items', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['doctor', 'date_prescribed', 'created_at', 'updated_at']
+        paths = {
+            **NAME_PATHS,
+            'items': Prefetch('items', queryset=PrescriptionItem.objects.select_related('medicine')),
+        }
+        expandable = {'patient': PatientBriefSerializer, 'doctor': DoctorBriefSerializer}
+
+    def validate(self, attrs):
+        record = attrs.get('medical_record')
+        patient = attrs.get('patient', getattr(self.instance, 'patient', None))
+        if record is not None and (record.doctor_id != self.context['doctor'].pk or record.patient_id != patient.pk):
+            raise serializers.ValidationError({'medical_record': ["Not one of your records for this patient."]})
+        return attrs
+
+    def validate_items(self, items):
+        # A PATCH makes the nested items partial too, skipping their required
+        # fields; the list always replaces every item, so check it as a full write
+        if not self.partial:
+            return items
+        full = PrescriptionItemSerializer(data=self.initial_data['items'], many=True, context=self.context)
+        full.is_valid(raise_exception=True)
+        return full.validated_data
+
+    def _save_items(self, prescription, items):
+        PrescriptionItem.objects.bulk_create(
+            [PrescriptionItem(prescription=prescription, **item) for item in items]
+        )
+        # bulk_create sends no signals
+        touch_prescription(prescription.pk)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        prescription = super().create(validated_data)
+        self._save_items(prescription, items)
+        return prescription
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        prescription = super().update(instance, validated_data)
+        if items is not None:
+            # A list of items replaces the prescription's items
+            prescription.items.all().delete()
+            self._save_items(prescription, items)
+        return prescription
+
+class BillSerializer(ProjectionMixin, FastRepresentationMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+
+    class Meta:
+        model = Bill
+        fields = [
+            'id', 'patient', 'patient_name', 'appointment', 'prescription', 'amount', 'tax', 'discount',
+            'total_amount', 'status', 'payment_method', 'payment_date', 'due_date', 'description',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = ['total_amount', 'created_at', 'updated_at']
+        paths = {'patient_name': NAME_PATHS['patient_name']}
+        expandable = {'patient': PatientBriefSerializer}
+
+    def validate(self, attrs):
+        doctor = self.context['doctor']
+        appointment = attrs.get('appointment', getattr(self.instance, 'appointment', None))
+        prescription = attrs.get('prescription', getattr(self.instance, 'prescription', None))
+        patient = attrs.get('patient', getattr(self.instance, 'patient', None))
+        if appointment is None and prescription is None:
+            raise serializers.ValidationError("A bill belongs to an appointment or a prescription.")
+        for source in (appointment, prescription):
+            if source is not None and (source.doctor_id != doctor.pk or source.patient_id != patient.pk):
+                raise serializers.ValidationError("Bills can only be issued for your own patients' visits.")
+        return attrs
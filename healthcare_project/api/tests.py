@@ -1,3 +1,310 @@
+# api/tests.py
+
+import base64
+import io
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts import authentication
+
+from accounts.models import User, DoctorProfile, PatientProfile
+from accounts.pagination import CursorPaginator
+from patient.models import Appointment, MedicalRecord, Medicine, Prescription, Bill
+from .management.commands.benchmark_json import _stock
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import AppointmentSerializer, BillSerializer
+from .views import AppointmentViewSet
+
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', first_name='Ann', last_name='Lee', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patients = [
+            PatientProfile.objects.create(user=User.objects.create(
+                email=f'patient{i}@example.com', first_name='Patient', last_name=str(i), user_type='PATIENT'
+            ))
+            for i in range(2)
+        ]
+        cls.medicine = Medicine.objects.create(
+            name='Paracetamol', description='', manufacturer='Acme', unit_price=2, stock_quantity=10
+        )
+        today = timezone.localdate()
+        for day in range(1, 26):
+            Appointment.objects.create(
+                patient=cls.patients[0], doctor=cls.doctor, appointment_date=today - timedelta(days=day),
+                appointment_time=time(9), reason='Checkup', status='COMPLETED',
+            )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def next_weekday(self, weekday=2):
+        day = timezone.localdate() + timedelta(days=1)
+        while day.weekday() != weekday:
+            day += timedelta(days=1)
+        return day
+
+class AppointmentApiTests(ApiTestCase):
+    def test_pages_run_a_fixed_number_of_queries(self):
+        client = self.client_for(self.patients[0].user)
+        counts = []
+        for page_size in (5, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/appointments/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        seen = []
+        url = '/api/appointments/?page_size=10'
+        while url:
+            response = client.get(url)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(response.data['results'][0]['doctor_name'], 'Ann Lee')
+
+    def test_tampered_cursor_starts_over(self):
+        cursor = base64.urlsafe_b64encode(b'{"p":["x","y","z"],"r":false}').decode()
+        response = self.client_for(self.patients[0].user).get('/api/appointments/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_cursor_past_the_first_row_is_an_empty_page(self):
+        client = self.client_for(self.patients[0].user)
+        first = Appointment.objects.filter(patient=self.patients[0]).order_by(*AppointmentViewSet.cursor_ordering)[0]
+        paginator = CursorPaginator(Appointment.objects.all(), 20, AppointmentViewSet.cursor_ordering)
+        response = client.get('/api/appointments/', {'cursor': paginator.encode_cursor(first, reverse=True)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['results'], response.data['next'], response.data['previous']), ([], None, None))
+
+    def test_anonymous_requests_are_refused(self):
+        for url in ('/api/appointments/', '/api/medical-records/', '/api/prescriptions/', '/api/bills/'):
+            self.assertEqual(APIClient().get(url).status_code, 403)
+
+    def test_patients_only_see_their_own(self):
+        response = self.client_for(self.patients[1].user).get('/api/appointments/')
+        self.assertEqual(response.data['results'], [])
+        appointment = Appointment.objects.first()
+        response = self.client_for(self.patients[1].user).get(f'/api/appointments/{appointment.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_patient_books_through_the_availability_checks(self):
+        client = self.client_for(self.patients[1].user)
+        data = {
+            'doctor': self.doctor.pk, 'appointment_date': self.next_weekday().isoformat(),
+            'appointment_time': '10:00', 'reason': 'Chest pain',
+        }
+        response = client.post('/api/appointments/', data)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['status'], 'SCHEDULED')
+        self.assertEqual(response.data['patient'], self.patients[1].pk)
+
+        response = self.client_for(self.patients[0].user).post('/api/appointments/', data)
+        self.assertEqual(response.status_code, 400)
+
+    def test_doctor_updates_status_but_not_the_slot(self):
+        appointment = Appointment.objects.first()
+        response = self.client_for(self.doctor.user).patch(
+            f'/api/appointments/{appointment.pk}/', {'status': 'NO_SHOW', 'appointment_time': '15:00'}
+        )
+        self.assertEqual(response.status_code, 200)
+        appointment.refresh_from_db()
+        self.assertEqual((appointment.status, appointment.appointment_time), ('NO_SHOW', time(9)))
+
+class ProjectionApiTests(ApiTestCase):
+    def test_fields_limit_the_payload_and_the_columns(self):
+        client = self.client_for(self.patients[0].user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/appointments/', {'fields': 'appointment_date,status', 'page_size': 5})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'appointment_date', 'status'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"reason"', sql)
+        self.assertNotIn('JOIN', sql)
+
+        # Keyset paging still works on the projected rows
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_expand_inlines_relations_with_their_joins(self):
+        client = self.client_for(self.patients[0].user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/appointments/', {'fields': 'status', 'expand': 'doctor'})
+        row = response.data['results'][0]
+        self.assertEqual(row['doctor'], {'id': self.doctor.pk, 'name': 'Ann Lee', 'specialization': 'Cardiology'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"specialization"', sql)
+        self.assertNotIn('"qualification"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        client = self.client_for(self.patients[0].user)
+        self.assertEqual(client.get('/api/appointments/', {'fields': 'password'}).status_code, 400)
+        self.assertEqual(client.get('/api/bills/', {'expand': 'doctor'}).status_code, 400)
+
+class PrescriptionApiTests(ApiTestCase):
+    def test_doctor_writes_nested_items_and_patient_reads_them(self):
+        record = MedicalRecord.objects.create(
+            patient=self.patients[0], doctor=self.doctor, diagnosis='Flu', symptoms='Fever', treatment='Rest'
+        )
+        item = {'medicine': self.medicine.pk, 'dosage': '1 tablet', 'duration': '3 days', 'quantity': 6,
+                'instructions': 'After meals'}
+        response = self.client_for(self.doctor.user).post('/api/prescriptions/', {
+            'patient': self.patients[0].pk, 'medical_record': record.pk, 'items': [item, item],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['items']), 2)
+
+        for _ in range(3):
+            Prescription.objects.create(patient=self.patients[0], doctor=self.doctor)
+        with self.assertNumQueries(2):
+            response = self.client_for(self.patients[0].user).get('/api/prescriptions/')
+        self.assertEqual(len(response.data['results']), 4)
+        items = [item for row in response.data['results'] for item in row['items']]
+        self.assertEqual([item['medicine_name'] for item in items], ['Paracetamol', 'Paracetamol'])
+
+    def test_doctor_edits_items_in_one_batch(self):
+        prescription = Prescription.objects.create(patient=self.patients[0], doctor=self.doctor)
+        item = {'medicine': self.medicine.pk, 'dosage': '1 tablet', 'duration': '3 days', 'quantity': 6,
+                'instructions': 'After meals'}
+        client = self.client_for(self.doctor.user)
+        url = f'/api/prescriptions/{prescription.pk}/items/batch/'
+        response = client.post(url, {'add': [item, item]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        first, second = [row['id'] for row in response.data['items']]
+
+        response = client.post(url, {'update': [{'id': first, 'quantity': 20}], 'delete': [second]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {'update': [{'id': first, 'quantity': 3}], 'delete': [second]}, format='json')
+        self.assertEqual([(row['id'], row['quantity']) for row in response.data['items']], [(first, 3)])
+
+    def test_nested_items_are_checked_against_stock(self):
+        prescription = Prescription.objects.create(patient=self.patients[0], doctor=self.doctor)
+        item = {'medicine': self.medicine.pk, 'dosage': '1 tablet', 'duration': '3 days', 'quantity': 999,
+                'instructions': 'After meals'}
+        response = self.client_for(self.doctor.user).patch(
+            f'/api/prescriptions/{prescription.pk}/', {'items': [item]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data['items'][0])
+        self.assertFalse(prescription.items.exists())
+
+    def test_patched_items_are_validated_in_full(self):
+        prescription = Prescription.objects.create(patient=self.patients[0], doctor=self.doctor)
+        client = self.client_for(self.doctor.user)
+        for item, missing in (({'dosage': 'x', 'quantity': 1}, 'medicine'),
+                              ({'medicine': self.medicine.pk, 'quantity': 1}, 'dosage')):
+            response = client.patch(f'/api/prescriptions/{prescription.pk}/', {'items': [item]}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(missing, response.data['items'][0])
+        self.assertFalse(prescription.items.exists())
+
+        item = {'medicine': self.medicine.pk, 'dosage': '1 tablet', 'duration': '3 days', 'quantity': 1,
+                'instructions': 'After meals'}
+        response = client.patch(f'/api/prescriptions/{prescription.pk}/', {'items': [item]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(prescription.items.get().dosage, '1 tablet')
+
+    def test_doctor_cannot_prescribe_for_unknown_patients(self):
+        response = self.client_for(self.doctor.user).post(
+            '/api/prescriptions/', {'patient': self.patients[1].pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('patient', response.data)
+
+    def test_patients_cannot_write_records(self):
+        response = self.client_for(self.patients[0].user).post('/api/medical-records/', {
+            'patient': self.patients[0].pk, 'diagnosis': 'Self-diagnosed', 'symptoms': '', 'treatment': '',
+        })
+        self.assertEqual(response.status_code, 403)
+
+class CachedTokenAuthenticationTests(ApiTestCase):
+    def setUp(self):
+        authentication.clear()
+        self.token = Token.objects.create(user=self.patients[0].user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def authenticate(self):
+        return authentication.CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+            self.assertEqual(user.get_role_specific_profile(), self.patients[0])
+        self.assertEqual(self.client.get('/api/appointments/').status_code, 200)
+
+    def test_requests_do_not_share_the_profile(self):
+        first, _ = self.authenticate()
+        first.get_role_specific_profile().blood_group = 'AB-'
+        second, _ = self.authenticate()
+        profile = second.get_role_specific_profile()
+        self.assertNotEqual(profile.blood_group, 'AB-')
+        self.assertIs(profile.user, second)
+
+    def test_deleted_tokens_and_inactive_users_are_refused(self):
+        self.authenticate()
+        user = self.patients[0].user
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get('/api/appointments/').status_code, 403)
+
+    def test_profile_changes_reload_the_user(self):
+        self.authenticate()
+        profile = self.patients[0]
+        profile.blood_group = 'O+'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        user, _ = self.authenticate()
+        self.assertEqual(user.get_role_specific_profile().blood_group, 'O+')
+
+class FastJSONTests(ApiTestCase):
+    def test_serializers_match_the_stock_representation(self):
+        appointment = Appointment.objects.select_related('patient__user', 'doctor__user').first()
+        bill = Bill.objects.create(patient=self.patients[0], appointment=appointment, amount=Decimal('10.5'),
+                                   total_amount=Decimal('10.5'), due_date=timezone.localdate(), status='PAID',
+                                   payment_date=timezone.now())
+        for serializer_class, row in ((AppointmentSerializer, appointment), (BillSerializer, bill)):
+            self.assertEqual(serializer_class(row).data, _stock(serializer_class)(row).data)
+        self.assertEqual(BillSerializer(bill).data['amount'], '10.50')
+
+    def test_renderer_writes_what_the_stock_renderer_writes(self):
+        data = {
+            'amount': Decimal('1.25'), 'at': timezone.now(), 'day': timezone.localdate(), 'time': time(9, 30),
+            'note': 'caf\u00e9 \u2028', 'detail': serializers.ErrorDetail('Invalid.', code='invalid'), 'rows': [1, None],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
 
-# Create your tests here.
+    def test_parser_accepts_json_and_rejects_garbage(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": NaN}'))
@@ -0,0 +1,17 @@
+# api/urls.py
+
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('appointments', views.AppointmentViewSet, basename='appointment')
+router.register('medical-records', views.MedicalRecordViewSet, basename='medical-record')
+router.register('prescriptions', views.PrescriptionViewSet, basename='prescription')
+router.register('bills', views.BillViewSet, basename='bill')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -1,3 +1,126 @@
-from django.shortcuts import render
+# api/views.py
 
-# Create your views here.
+from django.db.models import Q
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
+
+from doctor.context import get_acting_context
+from doctor.prescriptions import ItemBatchError, apply_item_batch
+from patient.models import Appointment, MedicalRecord, Prescription, Bill
+from .permissions import RolePermission
+from .projection import Projection
+from .serializers import (
+    AppointmentSerializer, AppointmentUpdateSerializer, MedicalRecordSerializer,
+    PrescriptionSerializer, BillSerializer,
+)
+
+class ScopedViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin,
+                    mixins.UpdateModelMixin, viewsets.GenericViewSet):
+    """
+    List, read, create and update (no delete). Rows are scoped to the requesting user: patients see their own, doctors
+    and nurses those of the doctor they act for (``doctor_lookups``), and
+    administrators everything.
+
+    Reads accept ``?fields=`` and ``?expand=``; only the columns and joins
+    behind the selected fields are queried.
+    """
+    permission_classes = [IsAuthenticated, RolePermission]
+    read_roles = ['PATIENT', 'DOCTOR', 'NURSE', 'ADMIN']
+    write_roles = ['DOCTOR']
+    doctor_lookups = ('doctor',)
+    cursor_ordering = ('-id',)
+
+    def get_acting_doctor(self):
+        return get_acting_context(self.request.user).doctor_profile
+
+    def scope(self, queryset):
+        user = self.request.user
+        if user.user_type == 'ADMIN':
+            return queryset
+        if user.user_type == 'PATIENT':
+            return queryset.filter(patient=user.get_role_specific_profile())
+        doctor = self.get_acting_doctor()
+        if doctor is None:
+            return queryset.none()
+        condition = Q()
+        for lookup in self.doctor_lookups:
+            condition |= Q(**{lookup: doctor})
+        return queryset.filter(condition)
+
+    def get_projection(self):
+        if not hasattr(self, '_projection'):
+            if self.request.method in SAFE_METHODS:
+                self._projection = Projection.from_request(self.get_serializer_class(), self.request)
+            else:
+                self._projection = Projection(self.get_serializer_class())
+        return self._projection
+
+    def get_queryset(self):
+        queryset = self.scope(super().get_queryset())
+        # Rows about to be saved keep every column
+        defer = self.request.method in SAFE_METHODS
+        return self.get_projection().apply(queryset, keep=self.cursor_ordering, defer=defer)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context['projection'] = self.get_projection()
+        if self.request.user.user_type in ('DOCTOR', 'NURSE'):
+            context['doctor'] = self.get_acting_doctor()
+        elif self.request.user.user_type == 'PATIENT':
+            context['patient'] = self.request.user.get_role_specific_profile()
+        return context
+
+    def perform_create(self, serializer):
+        doctor = self.get_acting_doctor()
+        if doctor is None:
+            raise PermissionDenied("You have no doctor profile.")
+        serializer.save(doctor=doctor)
+
+class AppointmentViewSet(ScopedViewSet):
+    """Patients book appointments; the treating doctor or nurse updates status and notes"""
+    queryset = Appointment.objects.all()
+    serializer_class = AppointmentSerializer
+    cursor_ordering = ('-appointment_date', '-appointment_time', '-id')
+    create_roles = ['PATIENT']
+    write_roles = ['DOCTOR', 'NURSE']
+
+    def get_serializer_class(self):
+        if self.action in ('update', 'partial_update'):
+            return AppointmentUpdateSerializer
+        return AppointmentSerializer
+
+    def perform_create(self, serializer):
+        serializer.save()
+
+class MedicalRecordViewSet(ScopedViewSet):
+    queryset = MedicalRecord.objects.all()
+    serializer_class = MedicalRecordSerializer
+    cursor_ordering = ('-date_created', '-id')
+
+class PrescriptionViewSet(ScopedViewSet):
+    queryset = Prescription.objects.all()
+    serializer_class = PrescriptionSerializer
+    cursor_ordering = ('-date_prescribed', '-id')
+
+    @action(detail=True, methods=['post'], url_path='items/batch')
+    def items_batch(self, request, pk=None):
+        """Add, update and delete several items at once; answers with the updated prescription"""
+        prescription = self.get_object()
+        try:
+            apply_item_batch(prescription, request.data)
+        except ItemBatchError as e:
+            raise ValidationError({'errors': e.errors})
+        return Response(self.get_serializer(self.get_object()).data)
+
+class BillViewSet(ScopedViewSet):
+    queryset = Bill.objects.all()
+    serializer_class = BillSerializer
+    cursor_ordering = ('-created_at', '-id')
+    doctor_lookups = ('appointment__doctor', 'prescription__doctor')
+
+    def perform_create(self, serializer):
+        serializer.save()
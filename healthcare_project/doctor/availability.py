@@ -0,0 +1,204 @@
+# doctor/availability.py
+
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from patient.models import Appointment
+from .models import DoctorSchedule, DoctorAvailableTimeSlot, DoctorLeave
+
+# Length of one bookable slot, in minutes
+SLOT_MINUTES = getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+# Working hours assumed for doctors who have not set up a schedule yet
+DEFAULT_WORKING_HOURS = getattr(settings, 'DEFAULT_WORKING_HOURS', ('09:00', '17:00'))
+
+# Appointment statuses that occupy a slot
+BOOKED_STATUSES = Appointment.ACTIVE_STATUSES
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+def _time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+def earliest_minute(now):
+    """First minute of the day at or after ``now`` that a slot may start."""
+    return _minutes(now) + (1 if now.second or now.microsecond else 0)
+
+def merge_intervals(intervals):
+    """Sort ``(start, end)`` minute intervals and merge the overlapping ones."""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+def subtract_intervals(intervals, removed):
+    """Return the parts of merged ``intervals`` not covered by merged ``removed``."""
+    result = []
+    removed = list(removed)
+    for start, end in intervals:
+        for cut_start, cut_end in removed:
+            if cut_end <= start or cut_start >= end:
+                continue
+            if cut_start > start:
+                result.append((start, cut_start))
+            start = max(start, cut_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+class Availability:
+    """
+    Free appointment slots for one doctor over a date range.
+
+    Built from the weekly schedule, date specific slots (which add time when
+    available and block it otherwise), approved leave and existing bookings,
+    all loaded up front so lookups for any date in the range are in memory.
+    """
+
+    def __init__(self, doctor, start_date, end_date, schedules, date_slots, leaves, bookings,
+                 slot_minutes=SLOT_MINUTES, now=None):
+        self.doctor = doctor
+        self.start_date = start_date
+        self.end_date = end_date
+        self.slot_minutes = slot_minutes
+        self.now = now or timezone.localtime()
+
+        self._weekly = {}
+        for schedule in schedules:
+            if schedule.is_available:
+                self._weekly.setdefault(schedule.day_of_week, []).append(
+                    (_minutes(schedule.start_time), _minutes(schedule.end_time))
+                )
+        self._extra = {}
+        self._blocked = {}
+        for slot in date_slots:
+            target = self._extra if slot.is_available else self._blocked
+            target.setdefault(slot.date, []).append((_minutes(slot.start_time), _minutes(slot.end_time)))
+        self._leaves = [(leave.start_date, leave.end_date) for leave in leaves]
+        self._booked = {}
+        for date, start in bookings:
+            self._booked.setdefault(date, []).append((_minutes(start), _minutes(start) + slot_minutes))
+        for date in self._booked:
+            self._booked[date] = merge_intervals(self._booked[date])
+
+        # Doctors without any schedule keep the old behaviour: default hours on
+        # their ``available_days`` (every day when that is blank)
+        self._uses_defaults = not schedules and not self._extra
+        self._default_days = [day.strip() for day in (doctor.available_days or '').split(',') if day.strip()]
+
+    def is_on_leave(self, date):
+        return any(start <= date <= end for start, end in self._leaves)
+
+    def working_hours(self, date):
+        """Merged ``(start, end)`` minute intervals the doctor works on ``date``."""
+        if self.is_on_leave(date):
+            return []
+        day_name = date.strftime('%A')
+        if self._uses_defaults:
+            if self._default_days and day_name not in self._default_days:
+                return []
+            start, end = (datetime.strptime(value, '%H:%M').time() for value in DEFAULT_WORKING_HOURS)
+            hours = [(_minutes(start), _minutes(end))]
+        else:
+            hours = merge_intervals(self._weekly.get(day_name, []) + self._extra.get(date, []))
+        return subtract_intervals(hours, merge_intervals(self._blocked.get(date, [])))
+
+    def _overlaps_booking(self, date, start, end):
+        booked = self._booked.get(date, [])
+        index = bisect_left(booked, (end,))
+        return index > 0 and booked[index - 1][1] > start
+
+    def free_slots(self, date):
+        """Start times of the free slots on ``date``, in order."""
+        if date < self.start_date or date > self.end_date:
+            raise ValueError(f"{date} is outside the loaded range {self.start_date} - {self.end_date}")
+        if date < self.now.date():
+            return []
+        earliest = 0
+        if date == self.now.date():
+            earliest = earliest_minute(self.now)
+        slots = []
+        for start, end in self.working_hours(date):
+            minute = start
+            while minute + self.slot_minutes <= end:
+                if minute >= earliest and not self._overlaps_booking(date, minute, minute + self.slot_minutes):
+                    slots.append(_time(minute))
+                minute += self.slot_minutes
+        return slots
+
+    def is_free(self, date, start_time):
+        return start_time.replace(second=0, microsecond=0) in self.free_slots(date)
+
+    def book(self, date, start_time):
+        """Mark a slot as taken in memory, e.g. while planning several bookings."""
+        start = _minutes(start_time)
+        self._booked[date] = merge_intervals(self._booked.get(date, []) + [(start, start + self.slot_minutes)])
+
+    def dates(self):
+        date = self.start_date
+        while date <= self.end_date:
+            yield date
+            date += timedelta(days=1)
+
+    def as_dict(self):
+        return {
+            'doctor': self.doctor.pk,
+            'slot_minutes': self.slot_minutes,
+            'days': [
+                {
+                    'date': date.isoformat(),
+                    'on_leave': self.is_on_leave(date),
+                    'slots': [slot.strftime('%H:%M') for slot in self.free_slots(date)],
+                }
+                for date in self.dates()
+            ],
+        }
+
+def get_availability(doctor, start_date, end_date=None, now=None):
+    """
+    Load everything needed to answer availability questions for ``doctor``
+    between ``start_date`` and ``end_date`` (inclusive) in four queries.
+    Slots before ``now`` (default: the current time) are never free.
+    """
+    return get_availabilities([doctor], start_date, end_date, now=now)[doctor.pk]
+
+def get_availabilities(doctors, start_date, end_date=None, now=None):
+    """Like ``get_availability`` for many doctors at once, still in four queries; keyed by doctor id."""
+    end_date = end_date or start_date
+    doctors = list(doctors)
+    doctor_ids = [doctor.pk for doctor in doctors]
+    sources = {doctor_id: ([], [], [], []) for doctor_id in doctor_ids}
+
+    for schedule in DoctorSchedule.objects.filter(doctor_id__in=doctor_ids):
+        sources[schedule.doctor_id][0].append(schedule)
+    for slot in DoctorAvailableTimeSlot.objects.filter(
+        doctor_id__in=doctor_ids, date__gte=start_date, date__lte=end_date
+    ):
+        sources[slot.doctor_id][1].append(slot)
+    for leave in DoctorLeave.objects.filter(
+        doctor_id__in=doctor_ids, status='APPROVED', start_date__lte=end_date, end_date__gte=start_date
+    ):
+        sources[leave.doctor_id][2].append(leave)
+    for doctor_id, booked_date, booked_time in Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date__gte=start_date,
+        appointment_date__lte=end_date,
+        status__in=BOOKED_STATUSES,
+    ).values_list('doctor_id', 'appointment_date', 'appointment_time'):
+        sources[doctor_id][3].append((booked_date, booked_time))
+
+    return {
+        doctor.pk: Availability(doctor, start_date, end_date, *sources[doctor.pk], now=now)
+        for doctor in doctors
+    }
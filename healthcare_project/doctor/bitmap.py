@@ -0,0 +1,126 @@
+# doctor/bitmap.py
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import DoctorProfile
+from .availability import SLOT_MINUTES, get_availability, earliest_minute
+from .models import DoctorDayAvailability
+
+# How many days ahead the bitmaps are kept
+HORIZON_DAYS = getattr(settings, 'AVAILABILITY_HORIZON_DAYS', 60)
+
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# The bitmap is stored in a signed 64-bit column
+if SLOTS_PER_DAY >= 64:
+    raise ImproperlyConfigured("APPOINTMENT_SLOT_MINUTES must be at least 23 for the availability bitmap")
+
+def slot_index(value):
+    """Bit index of the slot starting at ``value`` (schedules start on slot boundaries)."""
+    return (value.hour * 60 + value.minute) // SLOT_MINUTES
+
+def slot_time(index):
+    minutes = index * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+def slots_to_bitmap(slots):
+    bitmap = 0
+    for slot in slots:
+        bitmap |= 1 << slot_index(slot)
+    return bitmap
+
+def bitmap_to_slots(bitmap):
+    return [slot_time(index) for index in range(SLOTS_PER_DAY) if bitmap >> index & 1]
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+def refresh_doctor(doctor, start_date=None, end_date=None):
+    """Recompute ``doctor``'s bitmaps for a date range (default: the whole horizon)."""
+    today = timezone.localdate()
+    start_date = max(start_date or today, today)
+    end_date = min(end_date or today + timedelta(days=HORIZON_DAYS), today + timedelta(days=HORIZON_DAYS))
+    if start_date > end_date:
+        return
+
+    # Bitmaps cover whole days; searches mask out the part of today that has passed
+    availability = get_availability(doctor, start_date, end_date, now=_start_of_day(start_date))
+    specialization = doctor.specialization.lower()
+    rows = [
+        DoctorDayAvailability(
+            doctor=doctor, date=date, specialization=specialization,
+            free_slots=slots_to_bitmap(availability.free_slots(date)),
+        )
+        for date in availability.dates()
+    ]
+    DoctorDayAvailability.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['doctor', 'date'],
+        update_fields=['specialization', 'free_slots'],
+    )
+
+def refresh_all(days=None):
+    """Rebuild every doctor's bitmaps and drop the days that have passed; returns the doctor count."""
+    today = timezone.localdate()
+    DoctorDayAvailability.objects.filter(date__lt=today).delete()
+    end_date = today + timedelta(days=days if days is not None else HORIZON_DAYS)
+    count = 0
+    for doctor in DoctorProfile.objects.iterator():
+        refresh_doctor(doctor, today, end_date)
+        count += 1
+    return count
+
+def mark_booked(doctor_id, date, start_time):
+    """Clear the bit of a newly booked slot with a single UPDATE."""
+    mask = 1 << slot_index(start_time)
+    DoctorDayAvailability.objects.filter(doctor_id=doctor_id, date=date).update(
+        free_slots=F('free_slots').bitand(~mask)
+    )
+
+def refresh_day(doctor_id, date):
+    """Recompute one day, e.g. after a cancellation frees a slot."""
+    if not DoctorDayAvailability.objects.filter(doctor_id=doctor_id, date=date).exists():
+        return
+    refresh_doctor(DoctorProfile.objects.get(pk=doctor_id), date, date)
+
+def set_specialization(doctor):
+    DoctorDayAvailability.objects.filter(doctor=doctor).update(specialization=doctor.specialization.lower())
+
+def earliest_slots(specialization=None, start_date=None, days=14, limit=10, now=None):
+    """
+    Return up to ``limit`` ``(doctor_id, date, time)`` tuples for the earliest
+    free slot of each doctor, soonest first, read from the bitmap table only.
+    """
+    now = timezone.localtime(now)
+    start_date = max(start_date or now.date(), now.date())
+    end_date = start_date + timedelta(days=days - 1)
+
+    rows = DoctorDayAvailability.objects.filter(date__gte=start_date, date__lte=end_date).exclude(free_slots=0)
+    if specialization:
+        rows = rows.filter(specialization=specialization.lower())
+
+    # Slots of today that have already started are not offered
+    passed = -(-earliest_minute(now) // SLOT_MINUTES)
+    today_mask = ~((1 << passed) - 1)
+
+    found = {}
+    last_found = None
+    for doctor_id, date, bitmap in rows.order_by('date').values_list('doctor_id', 'date', 'free_slots').iterator():
+        # Rows come by date, so later days cannot beat ``limit`` doctors already found
+        if len(found) >= limit and date > last_found:
+            break
+        if doctor_id in found:
+            continue
+        if date == now.date():
+            bitmap &= today_mask
+        if bitmap:
+            # Lowest set bit is the earliest free slot of the day
+            found[doctor_id] = (date, slot_time((bitmap & -bitmap).bit_length() - 1))
+            last_found = date
+
+    ordered = sorted(found.items(), key=lambda item: (item[1], item[0]))[:limit]
+    return [(doctor_id, date, start) for doctor_id, (date, start) in ordered]
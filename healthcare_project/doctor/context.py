@@ -0,0 +1,107 @@
+# doctor/context.py
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from accounts.cache import LRUCache
+from accounts.models import DoctorProfile
+
+# Per-process cache of the doctor each nurse acts for, as ``(nurse id,
+# doctor id)`` keyed by user id. Only ids are cached, so requests never share
+# model instances. Signals keep it in sync with writes made by this process;
+# the TTL bounds staleness for writes made by other worker processes.
+_nurse_doctors = LRUCache(
+    maxsize=getattr(settings, 'ACTING_CONTEXT_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'ACTING_CONTEXT_CACHE_TTL', 300),
+)
+
+class ActingContext:
+    """The doctor a clinician acts for: themselves, or a nurse's assigned doctor"""
+
+    def __init__(self, user_type=None, doctor_profile=None, nurse_profile=None):
+        self.user_type = user_type
+        self.doctor_profile = doctor_profile
+        self.nurse_profile = nurse_profile
+
+    @property
+    def is_doctor(self):
+        return self.user_type == 'DOCTOR'
+
+    @property
+    def is_nurse(self):
+        return self.user_type == 'NURSE'
+
+def _nurse_doctor(user, nurse_profile):
+    """
+    The doctor ``nurse_profile`` is assigned to, or None, in one query.
+
+    A cached doctor id is loaded by primary key; otherwise the assignment
+    and the doctor are read together and the id is cached.
+    """
+    doctors = DoctorProfile.objects.select_related('user')
+    cached = _nurse_doctors.get(user.pk)
+    if cached is not None and cached[0] == nurse_profile.pk:
+        return doctors.filter(pk=cached[1]).first() if cached[1] is not None else None
+    # Assuming one doctor per nurse, the most recent active assignment wins
+    doctor = doctors.filter(
+        assigned_nurses__nurse=nurse_profile,
+        assigned_nurses__is_active=True
+    ).order_by('-assigned_nurses__start_date').first()
+    _nurse_doctors.set(user.pk, (nurse_profile.pk, doctor.pk if doctor else None))
+    return doctor
+
+def get_acting_context(user):
+    """Return the acting context for ``user``; a nurse's doctor is found through the cached id."""
+    if not user.is_authenticated:
+        return ActingContext()
+
+    # The auth backend already joined the role profile onto the user
+    if user.user_type == 'DOCTOR':
+        return ActingContext(user.user_type, doctor_profile=user.get_role_specific_profile())
+
+    if user.user_type == 'NURSE':
+        nurse_profile = user.get_role_specific_profile()
+        if nurse_profile is None:
+            return ActingContext(user.user_type)
+        return ActingContext(user.user_type, doctor_profile=_nurse_doctor(user, nurse_profile),
+                             nurse_profile=nurse_profile)
+
+    return ActingContext(user.user_type)
+
+def get_acting_doctor(request):
+    """
+    Return the doctor profile the requesting doctor or nurse acts for.
+
+    Raises Http404 when the user has no profile for their role, like the
+    ``get_object_or_404`` lookups it replaces. Returns None for a nurse
+    without an active assignment.
+    """
+    context = getattr(request, 'acting_context', None) or get_acting_context(request.user)
+
+    if context.is_doctor and context.doctor_profile is None:
+        raise Http404("No doctor profile found for this user.")
+    if context.is_nurse and context.nurse_profile is None:
+        raise Http404("No nurse profile found for this user.")
+
+    return context.doctor_profile
+
+# Entries are dropped once the change is committed, so a request running
+# meanwhile cannot cache the old assignment again
+
+def invalidate_user(user_id):
+    """Forget the doctor cached for ``user_id``."""
+    transaction.on_commit(partial(_nurse_doctors.delete, user_id))
+
+def invalidate_doctor(doctor_id):
+    """Forget every nurse's link to the given doctor profile."""
+    transaction.on_commit(partial(_nurse_doctors.delete_where, lambda entry: entry[1] == doctor_id))
+
+def invalidate_nurse(nurse_id):
+    """Forget the doctor cached for the nurse with the given nurse profile."""
+    transaction.on_commit(partial(_nurse_doctors.delete_where, lambda entry: entry[0] == nurse_id))
+
+def clear():
+    _nurse_doctors.clear()
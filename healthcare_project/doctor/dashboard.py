@@ -0,0 +1,62 @@
+# doctor/dashboard.py
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.cache import VersionedCache
+from patient.models import Appointment, MedicalRecord
+from .models import Task
+
+# Snapshots are invalidated by signals; the timeout only bounds staleness of
+# data the signals do not cover, such as patient names
+_doctor_snapshots = VersionedCache('dashboard:doctor', timeout=getattr(settings, 'DASHBOARD_CACHE_TTL', 300))
+_nurse_tasks = VersionedCache('dashboard:nurse', timeout=getattr(settings, 'DASHBOARD_CACHE_TTL', 300))
+
+def _build_doctor_snapshot(doctor, today):
+    return {
+        'today_appointments': list(Appointment.objects.filter(
+            doctor=doctor,
+            appointment_date=today
+        ).for_list().select_related('patient__user').order_by('appointment_time')),
+        # Upcoming appointments (excluding today)
+        'upcoming_appointments': list(Appointment.objects.filter(
+            doctor=doctor,
+            appointment_date__gt=today,
+            status='SCHEDULED'
+        ).for_list().select_related('patient__user').order_by('appointment_date', 'appointment_time')[:5]),
+        'recent_records': list(MedicalRecord.objects.filter(
+            doctor=doctor
+        ).for_list().select_related('patient__user').order_by('-date_created')[:5]),
+        # Tasks created by the doctor
+        'tasks': list(Task.objects.filter(
+            doctor=doctor
+        ).for_list().select_related('assigned_to', 'patient__user').order_by('status', 'priority', 'due_date')[:5]),
+    }
+
+def get_doctor_snapshot(doctor):
+    """Return the (cached) dashboard lists for ``doctor``: today's and upcoming appointments, records, tasks."""
+    today = timezone.localdate()
+    snapshot = _doctor_snapshots.get(doctor.pk)
+    # "Today" and "upcoming" move at midnight
+    if snapshot is None or snapshot['today'] != today:
+        snapshot = dict(_build_doctor_snapshot(doctor, today), today=today)
+        _doctor_snapshots.set(doctor.pk, snapshot)
+    return snapshot
+
+def get_nurse_tasks(user):
+    """Return the (cached) top tasks assigned to a nurse."""
+    return _nurse_tasks.get_or_set(user.pk, lambda: list(Task.objects.filter(
+        assigned_to=user
+    ).for_list().select_related('doctor__user', 'patient__user').order_by('status', 'priority', 'due_date')[:5]))
+
+# Invalidations wait for the commit: a snapshot rebuilt by another request
+# before then would cache the old rows under the new version
+
+def invalidate_doctor(doctor_id):
+    transaction.on_commit(partial(_doctor_snapshots.invalidate, doctor_id))
+
+def invalidate_nurse(user_id):
+    transaction.on_commit(partial(_nurse_tasks.invalidate, user_id))
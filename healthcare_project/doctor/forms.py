@@ -143,7 +143,7 @@ class PatientNoteForm(forms.ModelForm):
 class ReferralForm(forms.ModelForm):
     """Form for creating patient referrals"""
     referred_to_doctor = forms.ModelChoiceField(
-        queryset=DoctorProfile.objects.all(),
+        queryset=DoctorProfile.objects.select_related('user'),
         empty_label="Select Doctor",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -165,7 +165,7 @@ class ReferralForm(forms.ModelForm):
         
         if referring_doctor:
             # Exclude the referring doctor from the list of doctors to refer to
-            self.fields['referred_to_doctor'].queryset = DoctorProfile.objects.exclude(id=referring_doctor.id)
+            self.fields['referred_to_doctor'].queryset = DoctorProfile.objects.select_related('user').exclude(id=referring_doctor.id)
 
 class TaskForm(forms.ModelForm):
     """Form for assigning tasks to staff"""
@@ -175,7 +175,7 @@ class TaskForm(forms.ModelForm):
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     patient = forms.ModelChoiceField(
-        queryset=PatientProfile.objects.all(),
+        queryset=PatientProfile.objects.select_related('user'),
         empty_label="Select Patient (Optional)",
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'})
@@ -207,7 +207,7 @@ class TaskForm(forms.ModelForm):
 class NurseAssignmentForm(forms.ModelForm):
     """Form for assigning nurses to doctors"""
     nurse = forms.ModelChoiceField(
-        queryset=NurseProfile.objects.all(),
+        queryset=NurseProfile.objects.select_related('user'),
         empty_label="Select Nurse",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -326,6 +326,14 @@ class PrescriptionItemForm(forms.ModelForm):
         
         return quantity
 
+class PrescriptionItemChangeForm(forms.Form):
+    """One item added or updated by a batch; medicines and stock are checked for the whole batch at once"""
+    medicine = forms.IntegerField(min_value=1)
+    dosage = forms.CharField(max_length=100)
+    duration = forms.CharField(max_length=100)
+    quantity = forms.IntegerField(min_value=1)
+    instructions = forms.CharField()
+
 class DoctorAvailableTimeSlotForm(forms.ModelForm):
     """Form for setting specific available time slots"""
     date = forms.DateField(
@@ -359,4 +367,16 @@ class DoctorAvailableTimeSlotForm(forms.ModelForm):
         if start_time and end_time and start_time >= end_time:
             raise forms.ValidationError("End time must be later than start time.")
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class ScheduleImportForm(forms.Form):
+    """Form for uploading a CSV of weekly schedules and date slots"""
+    csv_file = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+        help_text="Columns: doctor_email, day_of_week, date, start_time, end_time, is_available"
+    )
+    partial = forms.BooleanField(
+        required=False,
+        help_text="Import the valid rows even if some rows have errors",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
@@ -0,0 +1,118 @@
+# doctor/history.py
+
+from django.conf import settings
+from django.urls import reverse
+
+from accounts.pagination import CursorPaginator
+from accounts.previews import with_previews
+from patient.models import MedicalRecord, Appointment, Prescription
+from .models import PatientNote
+
+# Items shown in each panel on first paint; the rest load page by page
+HISTORY_PREVIEW_SIZE = getattr(settings, 'HISTORY_PREVIEW_SIZE', 5)
+HISTORY_PAGE_SIZE = getattr(settings, 'HISTORY_PAGE_SIZE', 20)
+# Panel counts stop at this many rows and are shown as "1000+"
+HISTORY_COUNT_LIMIT = 1000
+
+def _doctor_name(doctor):
+    return f"Dr. {doctor.user.get_full_name()}"
+
+def _record(record, doctor):
+    return {
+        'id': record.pk,
+        'date': record.date_created.isoformat(),
+        'diagnosis': record.diagnosis_preview,
+        'doctor': _doctor_name(record.doctor),
+        'url': reverse('doctor:medical_record_detail', args=[record.pk]) if record.doctor_id == doctor.pk else None,
+    }
+
+def _prescription(prescription, doctor):
+    return {
+        'id': prescription.pk,
+        'date': prescription.date_prescribed.isoformat(),
+        'is_active': prescription.is_active,
+        'doctor': _doctor_name(prescription.doctor),
+        'url': reverse('doctor:prescription_detail', args=[prescription.pk]) if prescription.doctor_id == doctor.pk else None,
+    }
+
+def _appointment(appointment, doctor):
+    return {
+        'id': appointment.pk,
+        'date': appointment.appointment_date.isoformat(),
+        'time': appointment.appointment_time.strftime('%H:%M'),
+        'status': appointment.status,
+        'reason': appointment.reason_preview,
+        'url': reverse('doctor:appointment_detail', args=[appointment.pk]),
+    }
+
+def _note(note, doctor):
+    return {
+        'id': note.pk,
+        'date': note.created_at.isoformat(),
+        'note': note.note_preview,
+        'is_private': note.is_private,
+    }
+
+class Panel:
+    """One history list of a patient: its rows, keyset ordering and JSON shape"""
+
+    def __init__(self, model, ordering, serialize, related=(), text=(), shared=False):
+        self.model = model
+        self.ordering = ordering
+        self.serialize = serialize
+        self.related = related
+        # Free-text columns sent as previews; the detail pages show them in full
+        self.text = text
+        # Whether the panel may also list rows written by other doctors
+        self.shared = shared
+
+    def queryset(self, patient, doctor, user, all_doctors=False):
+        rows = with_previews(self.model.objects.filter(patient=patient), *self.text).select_related(*self.related)
+        if not (all_doctors and self.shared):
+            rows = rows.filter(doctor=doctor)
+        if self.model is PatientNote and user.user_type != 'DOCTOR':
+            # Nurses can only see non-private notes
+            rows = rows.filter(is_private=False)
+        return rows
+
+PANELS = {
+    'medical_records': Panel(
+        MedicalRecord, ('-date_created', '-id'), _record, ('doctor__user',),
+        text=('diagnosis', 'symptoms', 'treatment', 'notes'), shared=True,
+    ),
+    'prescriptions': Panel(
+        Prescription, ('-date_prescribed', '-id'), _prescription, ('doctor__user',), text=('notes',), shared=True,
+    ),
+    'appointments': Panel(
+        Appointment, ('-appointment_date', '-appointment_time', '-id'), _appointment, text=('reason', 'notes'),
+    ),
+    'patient_notes': Panel(PatientNote, ('-created_at', '-id'), _note, text=('note',)),
+}
+
+def history_page(panel, patient, doctor, user, cursor=None, all_doctors=False, per_page=None, count=False):
+    """One keyset page of a panel, with an approximate total when ``count`` is set."""
+    panel = PANELS[panel]
+    paginator = CursorPaginator(
+        panel.queryset(patient, doctor, user, all_doctors),
+        per_page or HISTORY_PAGE_SIZE,
+        panel.ordering,
+        count_limit=HISTORY_COUNT_LIMIT if count else None,
+    )
+    return paginator.page(cursor)
+
+def history_previews(panels, patient, doctor, user, all_doctors=False):
+    """First paint of several panels: the latest HISTORY_PREVIEW_SIZE rows and a count each."""
+    return {
+        name: history_page(name, patient, doctor, user, all_doctors=all_doctors,
+                           per_page=HISTORY_PREVIEW_SIZE, count=True)
+        for name in panels
+    }
+
+def page_as_dict(panel, page, doctor):
+    return {
+        'panel': panel,
+        'items': [PANELS[panel].serialize(row, doctor) for row in page],
+        'next_cursor': page.next_cursor,
+        'count': page.total,
+        'count_is_exact': page.total_is_exact,
+    }
@@ -0,0 +1,193 @@
+# doctor/importers.py
+
+import csv
+import io
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from django.db import transaction
+
+from accounts.models import DoctorProfile
+from . import bitmap
+from .models import DoctorSchedule, DoctorAvailableTimeSlot
+
+DAYS_OF_WEEK = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Expected CSV header. ``day_of_week`` is used for weekly rows and ``date``
+# (YYYY-MM-DD) for date specific slots; exactly one of them must be filled.
+CSV_COLUMNS = ('doctor_email', 'day_of_week', 'date', 'start_time', 'end_time', 'is_available')
+
+TRUE_VALUES = ('', '1', 'true', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+class IntervalIndex:
+    """
+    ``(start, end)`` intervals sorted by start, with O(log n) overlap checks.
+
+    The intervals may overlap each other (existing rows are not guaranteed
+    not to), so a long interval can overlap a query far past its neighbours.
+    ``_ends`` keeps the running maximum of the ends to find it.
+    """
+
+    def __init__(self, intervals=()):
+        self._intervals = sorted(intervals)
+        self._ends = []
+        self._update_ends(0)
+
+    def _update_ends(self, index):
+        del self._ends[index:]
+        running = self._ends[-1] if self._ends else None
+        for _, end in self._intervals[index:]:
+            running = end if running is None or end > running else running
+            self._ends.append(running)
+
+    def overlapping(self, start, end):
+        """Return an interval overlapping ``[start, end)``, or None."""
+        # Of the intervals starting before ``end``, the first whose running
+        # maximum end passes ``start`` ends after ``start`` itself
+        count = bisect_left(self._intervals, (end,))
+        index = bisect_right(self._ends, start, 0, count)
+        return self._intervals[index] if index < count else None
+
+    def add(self, start, end):
+        index = bisect_right(self._intervals, (start, end))
+        self._intervals.insert(index, (start, end))
+        self._update_ends(index)
+
+class ImportResult:
+    def __init__(self):
+        self.schedules = []
+        self.date_slots = []
+        self.errors = []
+        self.saved = False
+
+    @property
+    def accepted(self):
+        return len(self.schedules) + len(self.date_slots)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+def _parse_time(value):
+    return datetime.strptime(value.strip(), '%H:%M').time()
+
+class ScheduleImporter:
+    """
+    Validate and bulk insert weekly schedules and date slots for many doctors.
+
+    Each doctor's existing intervals are loaded once (three queries for the
+    whole file), every row is checked against them and the rows accepted so
+    far, and all conflicts are reported together. Accepted rows are written
+    with ``bulk_create`` only if the file has no errors, unless ``partial``.
+    ``doctor`` restricts the import to one doctor (rows may omit the email).
+    """
+
+    def __init__(self, doctor=None, partial=False):
+        self.doctor = doctor
+        self.partial = partial
+
+    def read_csv(self, file):
+        """Return ``(line number, row dict)`` pairs from a text or binary CSV file."""
+        if isinstance(file, (bytes, bytearray)):
+            file = io.StringIO(file.decode('utf-8-sig'))
+        elif not isinstance(file, io.TextIOBase):
+            # Uploaded files are binary
+            file = io.StringIO(file.read().decode('utf-8-sig'))
+        reader = csv.DictReader(file)
+        missing = {'start_time', 'end_time'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+        return [(reader.line_num, row) for row in reader]
+
+    def _load_doctors(self, rows):
+        if self.doctor is not None:
+            return {self.doctor.user.email.lower(): self.doctor}
+        emails = {(row.get('doctor_email') or '').strip().lower() for _, row in rows} - {''}
+        doctors = DoctorProfile.objects.select_related('user').filter(user__email__in=emails)
+        return {doctor.user.email.lower(): doctor for doctor in doctors}
+
+    def run(self, file, dry_run=False):
+        result = ImportResult()
+        rows = self.read_csv(file)
+        doctors = self._load_doctors(rows)
+
+        parsed = []
+        for line, row in rows:
+            email = (row.get('doctor_email') or '').strip().lower()
+            if self.doctor is not None:
+                # A doctor importing their own roster may leave the email blank
+                doctor = self.doctor if email in ('', self.doctor.user.email.lower()) else None
+            else:
+                doctor = doctors.get(email)
+            if doctor is None:
+                result.error(line, f"Unknown doctor '{email}'." if email else "Missing doctor_email.")
+                continue
+            try:
+                start, end = _parse_time(row['start_time']), _parse_time(row['end_time'])
+                day_name = (row.get('day_of_week') or '').strip().capitalize()
+                slot_date = date.fromisoformat(row['date'].strip()) if (row.get('date') or '').strip() else None
+            except (ValueError, AttributeError):
+                result.error(line, "Invalid time or date; use HH:MM and YYYY-MM-DD.")
+                continue
+            available = (row.get('is_available') or '').strip().lower()
+            if available not in TRUE_VALUES + FALSE_VALUES:
+                result.error(line, f"Invalid is_available value '{available}'.")
+                continue
+            if bool(day_name) == bool(slot_date):
+                result.error(line, "Fill exactly one of day_of_week and date.")
+                continue
+            if day_name and day_name not in DAYS_OF_WEEK:
+                result.error(line, f"Invalid day of week '{day_name}'.")
+                continue
+            if start >= end:
+                result.error(line, "End time must be after start time.")
+                continue
+            parsed.append((line, doctor, day_name, slot_date, start, end, available in TRUE_VALUES))
+
+        doctor_ids = {doctor.pk for _, doctor, *_ in parsed}
+        dates = [slot_date for *_, slot_date, _, _, _ in parsed if slot_date]
+        existing = {}
+        for schedule in DoctorSchedule.objects.filter(doctor_id__in=doctor_ids):
+            existing.setdefault((schedule.doctor_id, schedule.day_of_week), []).append(
+                (schedule.start_time, schedule.end_time))
+        if dates:
+            for slot in DoctorAvailableTimeSlot.objects.filter(
+                doctor_id__in=doctor_ids, date__gte=min(dates), date__lte=max(dates)
+            ):
+                existing.setdefault((slot.doctor_id, slot.date), []).append((slot.start_time, slot.end_time))
+        indexes = {key: IntervalIndex(intervals) for key, intervals in existing.items()}
+
+        for line, doctor, day_name, slot_date, start, end, available in parsed:
+            key = (doctor.pk, day_name or slot_date)
+            index = indexes.setdefault(key, IntervalIndex())
+            conflict = index.overlapping(start, end)
+            if conflict:
+                result.error(line, (
+                    f"{start:%H:%M}-{end:%H:%M} on {day_name or slot_date} overlaps "
+                    f"{conflict[0]:%H:%M}-{conflict[1]:%H:%M} for {doctor.user.email}."
+                ))
+                continue
+            index.add(start, end)
+            if day_name:
+                result.schedules.append(DoctorSchedule(
+                    doctor=doctor, day_of_week=day_name, start_time=start, end_time=end, is_available=available
+                ))
+            else:
+                result.date_slots.append(DoctorAvailableTimeSlot(
+                    doctor=doctor, date=slot_date, start_time=start, end_time=end, is_available=available
+                ))
+
+        result.errors.sort()
+        if dry_run or (result.errors and not self.partial) or not result.accepted:
+            return result
+
+        with transaction.atomic():
+            DoctorSchedule.objects.bulk_create(result.schedules)
+            DoctorAvailableTimeSlot.objects.bulk_create(result.date_slots)
+        result.saved = True
+
+        # bulk_create sends no signals, so refresh the availability bitmaps here
+        touched = {row.doctor.pk: row.doctor for row in result.schedules + result.date_slots}
+        for doctor in touched.values():
+            bitmap.refresh_doctor(doctor)
+        return result
@@ -0,0 +1,188 @@
+# doctor/leave_impact.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import DoctorProfile
+from admin_panel import rollups
+from patient import summary
+from patient.models import Appointment, ACTIVE_APPOINTMENT_STATUSES
+from . import bitmap, dashboard
+from .availability import get_availabilities
+from .models import DoctorPatient
+
+# How many days after the leave ends the doctor's own free slots are searched
+REBOOK_WINDOW_DAYS = getattr(settings, 'LEAVE_REBOOK_WINDOW_DAYS', 14)
+
+MOVED = 'moved'            # same doctor, first free slot after the leave
+REASSIGNED = 'reassigned'  # same date and time, colleague with the same specialization
+CANCELLED = 'cancelled'    # no replacement slot found
+
+class LeaveImpact:
+    """One appointment affected by a leave and what happens to it"""
+
+    def __init__(self, appointment, action, doctor=None, date=None, time=None):
+        self.appointment = appointment
+        self.original_date = appointment.appointment_date
+        self.original_time = appointment.appointment_time
+        self.action = action
+        self.doctor = doctor
+        self.date = date
+        self.time = time
+
+    def as_dict(self):
+        return {
+            'appointment': self.appointment.pk,
+            'patient': self.appointment.patient.user.get_full_name(),
+            'original_date': self.original_date.isoformat(),
+            'original_time': self.original_time.strftime('%H:%M'),
+            'action': self.action,
+            'doctor': self.doctor.pk if self.doctor else None,
+            'date': self.date.isoformat() if self.date else None,
+            'time': self.time.strftime('%H:%M') if self.time else None,
+        }
+
+class LeaveImpactReport:
+    def __init__(self, leave, impacts, applied=False):
+        self.leave = leave
+        self.impacts = impacts
+        self.applied = applied
+
+    def count(self, action):
+        return sum(1 for impact in self.impacts if impact.action == action)
+
+    @property
+    def summary(self):
+        return {action: self.count(action) for action in (REASSIGNED, MOVED, CANCELLED)}
+
+    def as_dict(self):
+        return {
+            'leave': self.leave.pk,
+            'applied': self.applied,
+            'summary': self.summary,
+            'appointments': [impact.as_dict() for impact in self.impacts],
+        }
+
+def plan_leave_impact(leave, lock=False):
+    """
+    Find every scheduled appointment inside ``leave`` and pick a replacement.
+
+    Each appointment is offered, in order of preference, the same date and
+    time with a colleague of the same specialization, then the doctor's own
+    first free slot within REBOOK_WINDOW_DAYS after the leave, skipping
+    slots where the patient already has another appointment. Availability
+    for all candidate doctors is loaded once and slots are claimed in memory,
+    so the plan never double-books. Nothing is written; ``lock`` locks the
+    affected appointments and must be used inside a transaction.
+    """
+    doctor = leave.doctor
+    today = timezone.localdate()
+    affected = Appointment.objects.filter(
+        doctor=doctor,
+        status='SCHEDULED',
+        appointment_date__gte=max(leave.start_date, today),
+        appointment_date__lte=leave.end_date,
+    ).select_related('patient__user').order_by('appointment_date', 'appointment_time')
+    if lock:
+        affected = affected.select_for_update(of=('self',))
+    affected = list(affected)
+    if not affected:
+        return LeaveImpactReport(leave, [])
+
+    colleagues = list(DoctorProfile.objects.filter(
+        specialization__iexact=doctor.specialization
+    ).exclude(pk=doctor.pk).select_related('user'))
+    window_end = leave.end_date + timedelta(days=REBOOK_WINDOW_DAYS)
+    availabilities = get_availabilities([doctor] + colleagues, affected[0].appointment_date, window_end)
+    own = availabilities[doctor.pk]
+    own_dates = [date for date in own.dates() if date > leave.end_date]
+    # Slots the affected patients already hold with any doctor
+    busy = set(Appointment.objects.filter(
+        patient_id__in={appointment.patient_id for appointment in affected},
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+        appointment_date__gte=affected[0].appointment_date,
+        appointment_date__lte=window_end,
+    ).exclude(pk__in=[appointment.pk for appointment in affected]).values_list(
+        'patient_id', 'appointment_date', 'appointment_time'
+    ))
+
+    impacts = []
+    for appointment in affected:
+        patient_id = appointment.patient_id
+        date, time = appointment.appointment_date, appointment.appointment_time
+        colleague = None
+        if (patient_id, date, time) not in busy:
+            colleague = next((c for c in colleagues if availabilities[c.pk].is_free(date, time)), None)
+        if colleague is not None:
+            availabilities[colleague.pk].book(date, time)
+            busy.add((patient_id, date, time))
+            impacts.append(LeaveImpact(appointment, REASSIGNED, colleague, date, time))
+            continue
+
+        slot = next((
+            (day, start) for day in own_dates for start in own.free_slots(day)
+            if (patient_id, day, start) not in busy
+        ), None)
+        if slot is not None:
+            own.book(*slot)
+            busy.add((patient_id, *slot))
+            impacts.append(LeaveImpact(appointment, MOVED, doctor, *slot))
+        else:
+            impacts.append(LeaveImpact(appointment, CANCELLED))
+
+    return LeaveImpactReport(leave, impacts)
+
+def apply_leave_impact(leave):
+    """
+    Plan and apply the rebooking with bulk updates in one transaction.
+
+    The plan is made again with the affected appointments locked, so a
+    preview shown earlier can never be applied over newer bookings. A slot
+    taken by a concurrent booking after the plan was made still fails the
+    unique constraint and rolls the whole plan back with IntegrityError.
+    """
+    note = f"Rebooked because of Dr. {leave.doctor.user.get_full_name()}'s leave ({leave.start_date} - {leave.end_date})."
+
+    with transaction.atomic():
+        report = plan_leave_impact(leave, lock=True)
+        now = timezone.now()
+        rebooked = []
+        cancelled = []
+        for impact in report.impacts:
+            appointment = impact.appointment
+            appointment.updated_at = now
+            if impact.action == CANCELLED:
+                appointment.status = 'CANCELLED'
+                appointment.notes = f"{appointment.notes}\n{note.replace('Rebooked', 'Cancelled')}".strip()
+                cancelled.append(appointment)
+            else:
+                appointment.doctor = impact.doctor
+                appointment.appointment_date = impact.date
+                appointment.appointment_time = impact.time
+                appointment.notes = f"{appointment.notes}\n{note}".strip()
+                rebooked.append(appointment)
+
+        Appointment.objects.bulk_update(cancelled, ['status', 'notes', 'updated_at'])
+        Appointment.objects.bulk_update(
+            rebooked, ['doctor', 'appointment_date', 'appointment_time', 'notes', 'updated_at']
+        )
+        # bulk_update sends no signals: refresh the derived tables here
+        pairs = {(leave.doctor_id, impact.appointment.patient_id) for impact in report.impacts}
+        pairs |= {(impact.doctor.pk, impact.appointment.patient_id) for impact in report.impacts if impact.doctor}
+        DoctorPatient.objects.refresh_pairs(pairs)
+        # The rebooked rows' new dates are found by the updated_at watermark
+        rollups.mark_dirty(impact.original_date for impact in report.impacts)
+
+    for doctor in {impact.doctor.pk: impact.doctor for impact in report.impacts if impact.doctor}.values():
+        bitmap.refresh_doctor(doctor)
+        dashboard.invalidate_doctor(doctor.pk)
+    bitmap.refresh_doctor(leave.doctor, leave.start_date, leave.end_date)
+    dashboard.invalidate_doctor(leave.doctor_id)
+    for patient_id in {impact.appointment.patient_id for impact in report.impacts}:
+        summary.invalidate(patient_id)
+
+    report.applied = True
+    return report
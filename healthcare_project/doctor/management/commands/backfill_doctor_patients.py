@@ -0,0 +1,16 @@
+# doctor/management/commands/backfill_doctor_patients.py
+
+from django.core.management.base import BaseCommand
+
+from doctor.models import DoctorPatient
+
+class Command(BaseCommand):
+    help = "Rebuild the doctor-patient relationship table from existing appointments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of relationship rows inserted per query")
+
+    def handle(self, *args, **options):
+        total = DoctorPatient.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} doctor-patient relationships"))
@@ -0,0 +1,18 @@
+# doctor/management/commands/build_availability_bitmaps.py
+
+from django.core.management.base import BaseCommand
+
+from doctor import bitmap
+
+class Command(BaseCommand):
+    help = "Precompute every doctor's per-day free slot bitmaps and drop past days"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=bitmap.HORIZON_DAYS,
+                            help="Number of days ahead to compute")
+
+    def handle(self, *args, **options):
+        count = bitmap.refresh_all(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built availability bitmaps for {count} doctors over {options['days']} days"
+        ))
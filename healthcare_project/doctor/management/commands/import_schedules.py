@@ -0,0 +1,37 @@
+# doctor/management/commands/import_schedules.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor.importers import ScheduleImporter, CSV_COLUMNS
+
+class Command(BaseCommand):
+    help = f"Bulk import weekly schedules and date slots from a CSV file with columns: {', '.join(CSV_COLUMNS)}"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="Path to the CSV file")
+        parser.add_argument('--partial', action='store_true',
+                            help="Save the valid rows even if other rows have errors")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate the file without saving anything")
+
+    def handle(self, *args, **options):
+        importer = ScheduleImporter(partial=options['partial'])
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as file:
+                result = importer.run(file, dry_run=options['dry_run'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+
+        if result.saved:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {len(result.schedules)} weekly schedules and {len(result.date_slots)} date slots"
+            ))
+        elif result.errors:
+            raise CommandError(f"{len(result.errors)} rows have errors; nothing was imported")
+        elif not result.accepted:
+            raise CommandError("The file has no rows to import")
+        else:
+            self.stdout.write(f"{result.accepted} rows are valid; nothing was saved")
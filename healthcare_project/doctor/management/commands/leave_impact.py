@@ -0,0 +1,40 @@
+# doctor/management/commands/leave_impact.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from doctor.leave_impact import plan_leave_impact, apply_leave_impact
+from doctor.models import DoctorLeave
+
+class Command(BaseCommand):
+    help = "Report, and optionally apply, the rebooking of appointments affected by an approved leave"
+
+    def add_arguments(self, parser):
+        parser.add_argument('leave_id', type=int)
+        parser.add_argument('--apply', action='store_true',
+                            help="Cancel and rebook the appointments instead of only reporting")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            leave = DoctorLeave.objects.select_related('doctor__user').get(pk=options['leave_id'])
+        except DoctorLeave.DoesNotExist:
+            raise CommandError(f"Leave {options['leave_id']} does not exist")
+        if leave.status != 'APPROVED':
+            raise CommandError(f"Leave {leave.pk} is {leave.get_status_display().lower()}, not approved")
+
+        if options['apply']:
+            try:
+                report = apply_leave_impact(leave)
+            except IntegrityError:
+                raise CommandError("A replacement slot was booked while the plan was applied; nothing was changed")
+        else:
+            report = plan_leave_impact(leave)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), indent=2))
+        summary = ', '.join(f"{count} {action}" for action, count in report.summary.items())
+        verb = "Applied" if report.applied else "Planned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(report.impacts)} appointments: {summary}"))
@@ -0,0 +1,25 @@
+# doctor/management/commands/materialize_slots.py
+
+from django.core.management.base import BaseCommand
+
+from doctor.materialize import materialize_slots, MATERIALIZE_WEEKS
+
+class Command(BaseCommand):
+    help = (
+        "Expand weekly schedule templates into dated time slots for a rolling horizon. "
+        "Idempotent; meant to run daily from cron or another scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=MATERIALIZE_WEEKS,
+                            help="Number of weeks ahead to materialize")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of slots inserted per query")
+
+    def handle(self, *args, **options):
+        result = materialize_slots(weeks=options['weeks'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized {result.created} slots from {result.start_date} to {result.end_date} "
+            f"({result.skipped_leave} skipped for leave, {result.skipped_overlap} for overlaps, "
+            f"{result.removed} removed under leave)"
+        ))
@@ -0,0 +1,107 @@
+# doctor/materialize.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .importers import IntervalIndex
+from .models import DoctorSchedule, DoctorAvailableTimeSlot, DoctorLeave
+
+# Number of weeks ahead that weekly templates are expanded into dated slots
+MATERIALIZE_WEEKS = getattr(settings, 'SLOT_MATERIALIZE_WEEKS', 4)
+
+class MaterializeResult:
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.created = 0
+        self.skipped_leave = 0
+        self.skipped_overlap = 0
+        self.removed = 0
+
+def materialize_slots(weeks=None, doctors=None, batch_size=1000, today=None):
+    """
+    Expand available weekly ``DoctorSchedule`` templates into dated
+    ``DoctorAvailableTimeSlot`` rows from today through ``weeks`` weeks ahead.
+
+    Safe to run repeatedly: existing (doctor, date, start_time) rows are left
+    alone by ``bulk_create(ignore_conflicts=True)``, and a template is skipped
+    on days where it would overlap a manually entered slot. Dates under
+    approved leave are skipped, and generated slots that have since fallen
+    under leave are removed.
+    """
+    today = today or timezone.localdate()
+    end_date = today + timedelta(weeks=weeks if weeks is not None else MATERIALIZE_WEEKS) - timedelta(days=1)
+    result = MaterializeResult(today, end_date)
+
+    templates = DoctorSchedule.objects.filter(is_available=True)
+    leaves = DoctorLeave.objects.filter(status='APPROVED', start_date__lte=end_date, end_date__gte=today)
+    existing = DoctorAvailableTimeSlot.objects.filter(date__gte=today, date__lte=end_date)
+    if doctors is not None:
+        templates = templates.filter(doctor__in=doctors)
+        leaves = leaves.filter(doctor__in=doctors)
+        existing = existing.filter(doctor__in=doctors)
+
+    leave_ranges = {}
+    for leave in leaves:
+        leave_ranges.setdefault(leave.doctor_id, []).append((leave.start_date, leave.end_date))
+
+    # Generated rows are removed once their date falls under approved leave
+    stale = Q()
+    for doctor_id, ranges in leave_ranges.items():
+        for start, end in ranges:
+            stale |= Q(doctor_id=doctor_id, date__gte=start, date__lte=end)
+    if stale:
+        result.removed, _ = existing.filter(stale, source_schedule__isnull=False).delete()
+
+    indexes = {}
+    taken = set()
+    for slot in existing.filter(source_schedule__isnull=True):
+        indexes.setdefault((slot.doctor_id, slot.date), IntervalIndex()).add(slot.start_time, slot.end_time)
+    for doctor_id, slot_date, start_time in existing.filter(source_schedule__isnull=False).values_list(
+        'doctor_id', 'date', 'start_time'
+    ):
+        taken.add((doctor_id, slot_date, start_time))
+
+    templates_by_day = {}
+    for template in templates:
+        templates_by_day.setdefault(template.day_of_week, []).append(template)
+
+    # Rows already present are skipped above, so every row sent is a new one
+    # and ``created`` is counted from the batches rather than the table
+    batch = []
+    slot_date = today
+    while slot_date <= end_date:
+        for template in templates_by_day.get(slot_date.strftime('%A'), []):
+            key = (template.doctor_id, slot_date, template.start_time)
+            if key in taken:
+                continue
+            if any(start <= slot_date <= end for start, end in leave_ranges.get(template.doctor_id, [])):
+                result.skipped_leave += 1
+                continue
+            index = indexes.get((template.doctor_id, slot_date))
+            if index is not None and index.overlapping(template.start_time, template.end_time):
+                result.skipped_overlap += 1
+                continue
+            batch.append(DoctorAvailableTimeSlot(
+                doctor_id=template.doctor_id,
+                date=slot_date,
+                start_time=template.start_time,
+                end_time=template.end_time,
+                source_schedule=template,
+            ))
+            taken.add(key)
+            if len(batch) >= batch_size:
+                DoctorAvailableTimeSlot.objects.bulk_create(batch, ignore_conflicts=True)
+                result.created += len(batch)
+                batch = []
+        slot_date += timedelta(days=1)
+    if batch:
+        DoctorAvailableTimeSlot.objects.bulk_create(batch, ignore_conflicts=True)
+        result.created += len(batch)
+
+    # Generated slots repeat their template, so free slots and availability
+    # bitmaps are unchanged and need no refresh
+    return result
@@ -0,0 +1,15 @@
+# doctor/middleware.py
+
+from django.utils.functional import SimpleLazyObject
+
+from .context import get_acting_context
+
+class ActingDoctorMiddleware:
+    """Attach the lazily resolved acting doctor context as ``request.acting_context``"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.acting_context = SimpleLazyObject(lambda: get_acting_context(request.user))
+        return self.get_response(request)
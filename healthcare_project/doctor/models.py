@@ -1,7 +1,10 @@
 # doctor/models.py
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import Greatest, Least
 from accounts.models import User, DoctorProfile, PatientProfile, NurseProfile
+from accounts.previews import with_previews
 from patient.models import MedicalRecord, Appointment, Prescription
 
 class DoctorSchedule(models.Model):
@@ -44,7 +47,7 @@ class DoctorLeave(models.Model):
 
 class Treatment(models.Model):
     """Model for storing treatments prescribed by doctors"""
-    medical_record = models.OneToOneField(MedicalRecord, on_delete=models.CASCADE, related_name='treatment')
+    medical_record = models.OneToOneField(MedicalRecord, on_delete=models.CASCADE, related_name='treatment_details')
     treatment_plan = models.TextField()
     follow_up_date = models.DateField(null=True, blank=True)
     follow_up_notes = models.TextField(blank=True)
@@ -68,6 +71,102 @@ class PatientNote(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['doctor', 'patient', '-created_at'], name='note_doctor_patient_idx'),
+        ]
+
+class DoctorPatientManager(models.Manager):
+    """Keeps the doctor-patient relationship table in step with appointments"""
+
+    def record_appointment(self, appointment):
+        """Count a newly created appointment towards its doctor-patient pair."""
+        date = appointment.appointment_date
+        updated = self.filter(doctor_id=appointment.doctor_id, patient_id=appointment.patient_id).update(
+            visit_count=F('visit_count') + 1,
+            first_visit=Least('first_visit', date),
+            last_visit=Greatest('last_visit', date),
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    doctor_id=appointment.doctor_id, patient_id=appointment.patient_id,
+                    first_visit=date, last_visit=date, visit_count=1,
+                )
+        except IntegrityError:
+            # A concurrent request created the pair first
+            self.record_appointment(appointment)
+
+    def refresh(self, doctor_id, patient_id):
+        """Recompute one pair from its appointments, dropping it if none remain."""
+        stats = Appointment.objects.filter(doctor_id=doctor_id, patient_id=patient_id).aggregate(
+            first_visit=Min('appointment_date'), last_visit=Max('appointment_date'), visit_count=Count('id')
+        )
+        if not stats['visit_count']:
+            self.filter(doctor_id=doctor_id, patient_id=patient_id).delete()
+            return
+        self.update_or_create(doctor_id=doctor_id, patient_id=patient_id, defaults=stats)
+
+    def refresh_pairs(self, pairs):
+        """Recompute many ``(doctor_id, patient_id)`` pairs with one aggregate query."""
+        pairs = set(pairs)
+        if not pairs:
+            return
+        stats = Appointment.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in pairs},
+            patient_id__in={patient_id for _, patient_id in pairs},
+        ).order_by().values('doctor_id', 'patient_id').annotate(
+            first_visit=Min('appointment_date'), last_visit=Max('appointment_date'), visit_count=Count('id')
+        )
+        rows = [self.model(**row) for row in stats if (row['doctor_id'], row['patient_id']) in pairs]
+        self.bulk_create(
+            rows, update_conflicts=True, unique_fields=['doctor', 'patient'],
+            update_fields=['first_visit', 'last_visit', 'visit_count'],
+        )
+        gone = pairs - {(row.doctor_id, row.patient_id) for row in rows}
+        for doctor_id, patient_id in gone:
+            self.filter(doctor_id=doctor_id, patient_id=patient_id).delete()
+
+    @transaction.atomic
+    def rebuild(self, batch_size=1000):
+        """Rebuild the whole table from appointments; returns the number of pairs."""
+        self.all().delete()
+        pairs = Appointment.objects.order_by().values('doctor_id', 'patient_id').annotate(
+            first_visit=Min('appointment_date'), last_visit=Max('appointment_date'), visit_count=Count('id')
+        )
+        batch = []
+        total = 0
+        for pair in pairs.iterator(chunk_size=batch_size):
+            batch.append(self.model(**pair))
+            if len(batch) >= batch_size:
+                total += len(self.bulk_create(batch))
+                batch = []
+        if batch:
+            total += len(self.bulk_create(batch))
+        return total
+
+class DoctorPatient(models.Model):
+    """Materialized doctor-patient relationship: every pair with at least one appointment"""
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='patient_relationships')
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='doctor_relationships')
+    first_visit = models.DateField()
+    last_visit = models.DateField()
+    visit_count = models.PositiveIntegerField(default=0)
+
+    objects = DoctorPatientManager()
+
+    def __str__(self):
+        return f"Dr. {self.doctor.user.get_full_name()} - {self.patient.user.get_full_name()} ({self.visit_count} visits)"
+
+    class Meta:
+        # The unique index serves both the roster and the "has treated" checks
+        unique_together = ('doctor', 'patient')
+
+class ReferralQuerySet(models.QuerySet):
+    def for_list(self):
+        """Defer the free-text columns in favour of short previews (see accounts.previews)"""
+        return with_previews(self, 'reason', 'notes')
 
 class Referral(models.Model):
     """Model for managing patient referrals to specialists or other doctors"""
@@ -88,12 +187,19 @@ class Referral(models.Model):
     referral_date = models.DateField(auto_now_add=True)
     completion_date = models.DateField(null=True, blank=True)
     
+    objects = ReferralQuerySet.as_manager()
+    
     def __str__(self):
         return f"Referral for {self.patient.user.get_full_name()} from Dr. {self.referring_doctor.user.get_full_name()} to Dr. {self.referred_to_doctor.user.get_full_name()}"
     
     class Meta:
         ordering = ['-referral_date']
 
+class TaskQuerySet(models.QuerySet):
+    def for_list(self):
+        """Defer the free-text column in favour of a short preview (see accounts.previews)"""
+        return with_previews(self, 'description')
+
 class Task(models.Model):
     """Model for assigning tasks to nurses or other staff"""
     STATUS_CHOICES = (
@@ -115,11 +221,17 @@ class Task(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    objects = TaskQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.title} - Assigned to {self.assigned_to.get_full_name()} by Dr. {self.doctor.user.get_full_name()}"
     
     class Meta:
         ordering = ['priority', 'due_date']
+        indexes = [
+            models.Index(fields=['assigned_to', 'status', 'priority', 'due_date'], name='task_assignee_status_idx'),
+            models.Index(fields=['doctor', 'status', 'priority', 'due_date'], name='task_doctor_status_idx'),
+        ]
 
 class NurseAssignment(models.Model):
     """Model for assigning nurses to doctors or departments"""
@@ -144,6 +256,10 @@ class DoctorAvailableTimeSlot(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     is_available = models.BooleanField(default=True)
+    # Weekly template this slot was generated from, if any (see doctor.materialize)
+    source_schedule = models.ForeignKey(
+        DoctorSchedule, on_delete=models.CASCADE, null=True, blank=True, related_name='materialized_slots'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -152,4 +268,27 @@ class DoctorAvailableTimeSlot(models.Model):
     
     class Meta:
         unique_together = ('doctor', 'date', 'start_time')
-        ordering = ['date', 'start_time']
\ No newline at end of file
+        ordering = ['date', 'start_time']
+
+class DoctorDayAvailability(models.Model):
+    """
+    Precomputed free slots of one doctor on one day, one bit per slot.
+
+    Bit ``i`` is set when the slot starting ``i * APPOINTMENT_SLOT_MINUTES``
+    minutes after midnight is free. Maintained by ``doctor.bitmap``.
+    """
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='day_availability')
+    date = models.DateField()
+    # Lower-cased copy of the doctor's specialization, so searches need no join
+    specialization = models.CharField(max_length=100)
+    free_slots = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} ({bin(self.free_slots).count('1')} free slots)"
+
+    class Meta:
+        unique_together = ('doctor', 'date')
+        indexes = [
+            models.Index(fields=['specialization', 'date'], name='day_avail_spec_date_idx'),
+            models.Index(fields=['date'], name='day_avail_date_idx'),
+        ]
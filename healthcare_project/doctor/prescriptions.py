@@ -0,0 +1,123 @@
+# doctor/prescriptions.py
+
+from django.db import transaction
+
+from patient.models import Medicine, Prescription, PrescriptionItem
+from patient.signals import touch_prescription
+from .forms import PrescriptionItemChangeForm
+
+ITEM_FIELDS = ('medicine', 'dosage', 'duration', 'quantity', 'instructions')
+# Adds, updates and deletes accepted in one batch
+MAX_ITEM_CHANGES = 100
+
+class ItemBatchError(Exception):
+    """Raised with every problem found in a batch; none of its changes are applied."""
+
+    def __init__(self, errors):
+        super().__init__("The prescription items were not changed.")
+        self.errors = errors
+
+def _item_data(item):
+    return {
+        'medicine': item.medicine_id, 'dosage': item.dosage, 'duration': item.duration,
+        'quantity': item.quantity, 'instructions': item.instructions,
+    }
+
+def apply_item_changes(prescription, add=(), update=(), delete=()):
+    """
+    Add, update and delete items of ``prescription`` in one transaction,
+    with the prescription row locked while the items are read and written.
+
+    ``add`` is a list of item dicts, ``update`` a list of dicts with the
+    item ``id`` and the fields to change, ``delete`` a list of item ids.
+    Items must belong to the prescription, and every added or updated
+    quantity must be in stock; all medicines are checked with one query.
+    Raises ItemBatchError, changing nothing, if anything is invalid.
+    Returns ``(added, updated, deleted)`` counts.
+    """
+    errors = []
+    if len(add) + len(update) + len(delete) > MAX_ITEM_CHANGES:
+        raise ItemBatchError([{'error': f"At most {MAX_ITEM_CHANGES} changes per batch."}])
+
+    def item_id(value):
+        return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+    with transaction.atomic():
+        update_ids = [item_id(change.get('id')) if isinstance(change, dict) else None for change in update]
+        delete_ids = [item_id(value) for value in delete]
+        # Concurrent batches on one prescription queue here, so the items and
+        # their ids read below are still current when the changes are written
+        if not Prescription.objects.select_for_update().filter(pk=prescription.pk).values_list('pk', flat=True):
+            raise ItemBatchError([{'error': "The prescription no longer exists."}])
+        items = PrescriptionItem.objects.filter(
+            prescription=prescription, pk__in=[pk for pk in update_ids + delete_ids if pk is not None]
+        ).in_bulk()
+
+        # Field checks first, against each item's final values
+        valid = []
+        for op, changes, ids in (('add', add, [None] * len(add)), ('update', update, update_ids)):
+            for index, (change, pk) in enumerate(zip(changes, ids)):
+                if not isinstance(change, dict):
+                    errors.append({'op': op, 'index': index, 'errors': {'__all__': ["Expected an object."]}})
+                    continue
+                if op == 'update' and pk not in items:
+                    errors.append({'op': op, 'index': index, 'errors': {'id': ["Not an item of this prescription."]}})
+                    continue
+                data = {**_item_data(items[pk]), **change} if op == 'update' else change
+                form = PrescriptionItemChangeForm(data)
+                if form.is_valid():
+                    valid.append((op, index, pk, form.cleaned_data))
+                else:
+                    errors.append({'op': op, 'index': index, 'errors': form.errors.get_json_data(escape_html=False)})
+        for index, pk in enumerate(delete_ids):
+            if pk not in items:
+                errors.append({'op': 'delete', 'index': index, 'errors': {'id': ["Not an item of this prescription."]}})
+
+        # Unknown ids are reported above; only count the items they name
+        known_ids = [pk for pk in update_ids + delete_ids if pk in items]
+        if len(set(known_ids)) < len(known_ids):
+            errors.append({'error': "Each item may be updated or deleted only once per batch."})
+
+        medicines = Medicine.objects.only('stock_quantity').in_bulk({data['medicine'] for _, _, _, data in valid})
+        for op, index, pk, data in valid:
+            medicine = medicines.get(data['medicine'])
+            if medicine is None:
+                errors.append({'op': op, 'index': index, 'errors': {'medicine': ["Unknown medicine."]}})
+            elif data['quantity'] > medicine.stock_quantity:
+                errors.append({'op': op, 'index': index, 'errors': {
+                    'quantity': [f"Not enough stock. Available: {medicine.stock_quantity}"],
+                }})
+        if errors:
+            raise ItemBatchError(errors)
+
+        added, updated = [], []
+        for op, index, pk, data in valid:
+            data = dict(data, medicine_id=data['medicine'])
+            del data['medicine']
+            if op == 'add':
+                added.append(PrescriptionItem(prescription=prescription, **data))
+            else:
+                item = items[pk]
+                for field, value in data.items():
+                    setattr(item, field, value)
+                updated.append(item)
+
+        if added:
+            PrescriptionItem.objects.bulk_create(added)
+        if updated:
+            PrescriptionItem.objects.bulk_update(updated, ITEM_FIELDS)
+        if delete_ids:
+            PrescriptionItem.objects.filter(prescription=prescription, pk__in=delete_ids).delete()
+        # bulk_create and bulk_update send no signals
+        touch_prescription(prescription.pk)
+        return len(added), len(updated), len(delete_ids)
+
+def apply_item_batch(prescription, payload):
+    """``apply_item_changes`` for a decoded JSON body ``{"add": [...], "update": [...], "delete": [...]}``"""
+    if not isinstance(payload, dict):
+        raise ItemBatchError([{'error': "Expected an object with 'add', 'update' and 'delete' lists."}])
+    changes = {op: payload.get(op, []) for op in ('add', 'update', 'delete')}
+    wrong = [op for op, value in changes.items() if not isinstance(value, list)]
+    if wrong:
+        raise ItemBatchError([{'error': f"'{op}' must be a list."} for op in wrong])
+    return apply_item_changes(prescription, **changes)
@@ -0,0 +1,128 @@
+# doctor/signals.py
+
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import User, DoctorProfile, NurseProfile
+from patient.models import Appointment, MedicalRecord
+from patient.signals import touch_medical_record
+from . import bitmap, context, dashboard
+from .availability import BOOKED_STATUSES
+from .models import (
+    NurseAssignment, DoctorPatient, DoctorSchedule, DoctorAvailableTimeSlot, DoctorLeave, Task, Treatment
+)
+
+def _doctor_deleted(origin):
+    """True when a delete cascades from a doctor or user, whose derived rows go with them"""
+    return getattr(origin, 'model', type(origin)) in (DoctorProfile, User)
+
+@receiver([post_save, post_delete], sender=NurseAssignment)
+def nurse_assignment_changed(sender, instance, **kwargs):
+    """Re-resolve the nurse's doctor after an assignment is added, ended or removed"""
+    context.invalidate_nurse(instance.nurse_id)
+
+@receiver([post_save, post_delete], sender=DoctorProfile)
+def doctor_profile_changed(sender, instance, **kwargs):
+    context.invalidate_user(instance.user_id)
+    context.invalidate_doctor(instance.pk)
+
+@receiver([post_save, post_delete], sender=NurseProfile)
+def nurse_profile_changed(sender, instance, **kwargs):
+    context.invalidate_user(instance.user_id)
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    context.invalidate_user(instance.pk)
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    # Remember the pair so a reassignment also recounts the one it left;
+    # read without loading, as the API defers columns it does not return
+    instance._loaded_pair = (instance.__dict__.get('doctor_id'), instance.__dict__.get('patient_id'))
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the doctor-patient relationship table current"""
+    if raw:
+        return
+    loaded_pair, instance._loaded_pair = instance._loaded_pair, (instance.doctor_id, instance.patient_id)
+    dashboard.invalidate_doctor(instance.doctor_id)
+    if created:
+        DoctorPatient.objects.record_appointment(instance)
+    else:
+        # A moved date may have been the pair's first or last visit, so
+        # recount rather than widen; a reassigned pair may not exist yet
+        if loaded_pair[0] not in (None, instance.doctor_id):
+            dashboard.invalidate_doctor(loaded_pair[0])
+        DoctorPatient.objects.refresh_pairs(
+            pair for pair in (loaded_pair, instance._loaded_pair) if None not in pair
+        )
+
+    if instance.status in BOOKED_STATUSES:
+        bitmap.mark_booked(instance.doctor_id, instance.appointment_date, instance.appointment_time)
+    else:
+        # Cancelled or finished: the slot may be free again
+        bitmap.refresh_day(instance.doctor_id, instance.appointment_date)
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, origin=None, **kwargs):
+    if _doctor_deleted(origin):
+        return
+    dashboard.invalidate_doctor(instance.doctor_id)
+    DoctorPatient.objects.refresh(instance.doctor_id, instance.patient_id)
+    bitmap.refresh_day(instance.doctor_id, instance.appointment_date)
+
+@receiver(post_save, sender=DoctorProfile)
+def doctor_profile_saved(sender, instance, created, raw=False, **kwargs):
+    """Build a new doctor's availability bitmaps, or follow a specialization change"""
+    if raw:
+        return
+    if created:
+        bitmap.refresh_doctor(instance)
+    else:
+        bitmap.set_specialization(instance)
+
+@receiver([post_save, post_delete], sender=DoctorSchedule)
+def schedule_changed(sender, instance, raw=False, origin=None, created=False, **kwargs):
+    if raw or _doctor_deleted(origin):
+        return
+    if kwargs['signal'] is post_save and not created:
+        # Slots generated from the old times are regenerated by materialize_slots
+        instance.materialized_slots.filter(date__gte=timezone.localdate()).delete()
+    bitmap.refresh_doctor(instance.doctor)
+
+@receiver([post_save, post_delete], sender=DoctorAvailableTimeSlot)
+def date_slot_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Slots generated from a weekly template never change the doctor's hours
+    if raw or _doctor_deleted(origin) or instance.source_schedule_id:
+        return
+    bitmap.refresh_doctor(instance.doctor, instance.date, instance.date)
+
+@receiver([post_save, post_delete], sender=DoctorLeave)
+def leave_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _doctor_deleted(origin):
+        bitmap.refresh_doctor(instance.doctor, instance.start_date, instance.end_date)
+
+@receiver([post_save, post_delete], sender=MedicalRecord)
+def medical_record_changed(sender, instance, **kwargs):
+    dashboard.invalidate_doctor(instance.doctor_id)
+
+@receiver(post_init, sender=Task)
+def task_loaded(sender, instance, **kwargs):
+    # Remember the assignee so a reassignment also refreshes the previous nurse's dashboard
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed(sender, instance, **kwargs):
+    dashboard.invalidate_doctor(instance.doctor_id)
+    dashboard.invalidate_nurse(instance.assigned_to_id)
+    if instance._loaded_assigned_to_id not in (None, instance.assigned_to_id):
+        dashboard.invalidate_nurse(instance._loaded_assigned_to_id)
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+
+@receiver([post_save, post_delete], sender=Treatment)
+def treatment_changed(sender, instance, raw=False, **kwargs):
+    """The treatment plan is shown on its medical record's detail page"""
+    if not raw:
+        touch_medical_record(instance.medical_record_id)
@@ -1,3 +1,781 @@
-from django.test import TestCase
+# doctor/tests.py
 
-# Create your tests here.
+import json
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import Http404
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, NurseProfile, PatientProfile, DoctorProfile
+from accounts.pagination import CursorPaginator
+from patient.models import Appointment, Medicine, Prescription, PrescriptionItem
+from patient.tests import QueryPlanTestCase
+from . import views
+from . import bitmap
+from . import context
+from . import dashboard
+from . import history
+from .availability import get_availability
+from .importers import IntervalIndex, ScheduleImporter
+from .leave_impact import plan_leave_impact, apply_leave_impact
+from .materialize import materialize_slots
+from .models import (
+    Task, NurseAssignment, DoctorPatient, DoctorSchedule, DoctorAvailableTimeSlot, DoctorLeave,
+    DoctorDayAvailability,
+)
+
+class DoctorViewQueryPlanTests(QueryPlanTestCase):
+    """The doctor/nurse dashboard and list pages only read hot tables through indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.nurse_user = User.objects.create(
+            email='nurse@example.com', first_name='Nurse', last_name='One', user_type='NURSE'
+        )
+        nurse = NurseProfile.objects.create(
+            user=cls.nurse_user, qualification='RN', license_number='N1', department='Cardiology'
+        )
+        NurseAssignment.objects.create(doctor=cls.doctors[0], nurse=nurse, start_date=timezone.now().date())
+        for i in range(10):
+            Task.objects.create(
+                doctor=cls.doctors[i % len(cls.doctors)],
+                assigned_to=cls.nurse_user,
+                title=f'Task {i}',
+                description='Check vitals',
+                priority=i % 3,
+                due_date=timezone.now() + timedelta(days=i),
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.doctors[0].user
+
+    def test_dashboard(self):
+        self.assertNoFullScans(views.dashboard, self.get_request(self.user))
+        self.assertNoFullScans(views.dashboard, self.get_request(self.nurse_user))
+
+    def test_dashboard_snapshot_is_cached_until_invalidated(self):
+        doctor = self.doctors[0]
+        first = dashboard.get_doctor_snapshot(doctor)
+        with self.assertNumQueries(0):
+            dashboard.get_doctor_snapshot(doctor)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            appointment = Appointment.objects.create(
+                patient=self.patients[0], doctor=doctor, appointment_date=timezone.localdate(),
+                appointment_time=time(7), reason='Walk-in',
+            )
+        # Invalidated only once the change is committed
+        with self.assertNumQueries(0):
+            dashboard.get_doctor_snapshot(doctor)
+        for callback in callbacks:
+            callback()
+        snapshot = dashboard.get_doctor_snapshot(doctor)
+        self.assertIn(appointment.pk, [a.pk for a in snapshot['today_appointments']])
+        self.assertEqual(len(snapshot['today_appointments']), len(first['today_appointments']) + 1)
+        # Other doctors' snapshots are untouched
+        dashboard.get_doctor_snapshot(self.doctors[1])
+        with self.assertNumQueries(0):
+            dashboard.get_doctor_snapshot(self.doctors[1])
+
+    def test_nurse_tasks_follow_reassignment(self):
+        other = User.objects.create(email='nurse2@example.com', user_type='NURSE')
+        self.assertEqual(len(dashboard.get_nurse_tasks(other)), 0)
+        tasks = dashboard.get_nurse_tasks(self.nurse_user)
+        task = Task.objects.get(pk=tasks[0].pk)
+        task.assigned_to = other
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertEqual([t.pk for t in dashboard.get_nurse_tasks(other)], [task.pk])
+        self.assertNotIn(task.pk, [t.pk for t in dashboard.get_nurse_tasks(self.nurse_user)])
+
+    def test_appointments(self):
+        self.assertNoFullScans(views.appointments, self.get_request(self.user))
+        self.assertNoFullScans(views.appointments, self.get_request(
+            self.user, status='SCHEDULED', patient='Patient', date_from=str(timezone.now().date())
+        ))
+
+    def test_appointments_next_page(self):
+        ordering = ('-appointment_date', '-appointment_time', '-id')
+        paginator = CursorPaginator(Appointment.objects.filter(doctor=self.doctors[0]), 3, ordering)
+        cursor = paginator.page().next_cursor
+        self.assertNoFullScans(views.appointments, self.get_request(self.user, cursor=cursor))
+
+    def test_medical_records(self):
+        self.assertNoFullScans(views.medical_records, self.get_request(self.user))
+        self.assertNoFullScans(views.medical_records, self.get_request(self.nurse_user, patient='Patient'))
+
+    def test_prescriptions(self):
+        self.assertNoFullScans(views.prescriptions, self.get_request(self.user, status='active'))
+
+    def test_patients(self):
+        self.assertNoFullScans(views.patients, self.get_request(self.user))
+        self.assertNoFullScans(views.patients, self.get_request(self.user, search='Patient'))
+
+    def test_tasks(self):
+        self.assertNoFullScans(views.tasks, self.get_request(self.user))
+        self.assertNoFullScans(views.tasks, self.get_request(self.nurse_user))
+
+    def test_patient_detail(self):
+        self.assertNoFullScans(views.patient_detail, self.get_request(self.user), self.patients[0].pk)
+        appointment = Appointment.objects.filter(doctor=self.doctors[0]).first()
+        self.assertNoFullScans(views.appointment_detail, self.get_request(self.user), appointment.pk)
+
+    def test_patient_history_pages(self):
+        patient = self.patients[0]
+        seen = []
+        cursor = None
+        with mock.patch.object(history, 'HISTORY_PAGE_SIZE', 8):
+            for expected in (8, 8, 4):
+                params = {'cursor': cursor} if cursor else {}
+                self.assertNoFullScans(views.patient_history, self.get_request(self.user, **params), patient.pk, 'appointments')
+                response = views.patient_history(self.get_request(self.user, **params), patient.pk, 'appointments')
+                payload = json.loads(response.content)
+                self.assertEqual(len(payload['items']), expected)
+                self.assertEqual(payload['count'], None if cursor else 20)
+                seen += [item['id'] for item in payload['items']]
+                cursor = payload['next_cursor']
+        self.assertIsNone(cursor)
+        expected_ids = list(Appointment.objects.filter(patient=patient, doctor=self.doctors[0]).order_by(
+            '-appointment_date', '-appointment_time', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(seen, expected_ids)
+
+    def test_list_templates_render_previews_within_budget(self):
+        # Real templates, not a mocked render: a deferred field read in a row
+        # costs one query per row and overruns the view's budget. Session and
+        # user lookups account for two queries of each request.
+        self.client.force_login(self.user)
+        appointment = Appointment.objects.filter(doctor=self.doctors[0]).first()
+        pages = [
+            (reverse('doctor:appointments'), 4),
+            (reverse('doctor:medical_records'), 4),
+            (reverse('doctor:appointment_detail', args=[appointment.pk]), 7),
+        ]
+        with self.settings(QUERY_BUDGET_ENFORCE=True):
+            for url, expected in pages:
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Flu')
+
+    def test_nurse_pages_fit_the_budget_with_a_cold_context(self):
+        # A nurse's first request resolves the assigned doctor: one query,
+        # like the warm path's load by id
+        self.client.force_login(self.nurse_user)
+        appointment = Appointment.objects.filter(doctor=self.doctors[0]).first()
+        pages = [
+            (reverse('doctor:appointment_detail', args=[appointment.pk]), 8),
+            (reverse('doctor:patient_history', args=[self.patients[0].pk, 'appointments']), 7),
+        ]
+        with self.settings(QUERY_BUDGET_ENFORCE=True):
+            for url, expected in pages:
+                for _ in ('cold', 'warm'):
+                    with self.assertNumQueries(expected):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                context.clear()
+
+    def test_cached_dashboard_rows_render_without_queries(self):
+        snapshot = dashboard.get_doctor_snapshot(self.doctors[0])
+        snapshot = dashboard.get_doctor_snapshot(self.doctors[0])
+        with self.assertNumQueries(0):
+            for appointment in snapshot['today_appointments']:
+                appointment.reason_preview, appointment.patient.user.get_full_name()
+            for record in snapshot['recent_records']:
+                record.diagnosis_preview, record.patient.user.get_full_name()
+            for task in snapshot['tasks']:
+                task.description_preview
+        self.assertTrue(snapshot['recent_records'])
+
+    def test_patient_history_requires_relationship(self):
+        stranger = PatientProfile.objects.create(user=User.objects.create(email='new@example.com', user_type='PATIENT'))
+        response = views.patient_history(self.get_request(self.user), stranger.pk, 'medical_records')
+        self.assertEqual(response.status_code, 403)
+
+class DoctorPatientTests(TestCase):
+    """The doctor-patient relationship table follows appointment writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='doc@example.com', user_type='DOCTOR')
+        cls.doctor = DoctorProfile.objects.create(
+            user=user, specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create(email='pat@example.com', user_type='PATIENT')
+        )
+        cls.today = timezone.now().date()
+
+    def book(self, days, hour=9):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, reason='Checkup',
+            appointment_date=self.today + timedelta(days=days), appointment_time=time(hour),
+        )
+
+    def relationship(self):
+        return DoctorPatient.objects.get(doctor=self.doctor, patient=self.patient)
+
+    def test_appointments_update_relationship(self):
+        self.book(0)
+        later = self.book(5)
+        self.book(-3)
+        relationship = self.relationship()
+        self.assertEqual(relationship.visit_count, 3)
+        self.assertEqual(relationship.first_visit, self.today - timedelta(days=3))
+        self.assertEqual(relationship.last_visit, self.today + timedelta(days=5))
+
+        later.delete()
+        relationship = self.relationship()
+        self.assertEqual(relationship.visit_count, 2)
+        self.assertEqual(relationship.last_visit, self.today)
+
+        Appointment.objects.filter(doctor=self.doctor).delete()
+        self.book(1).delete()
+        self.assertFalse(DoctorPatient.objects.exists())
+
+    def test_rescheduling_and_reassigning_recount_the_pairs(self):
+        first = self.book(0)
+        self.book(3)
+        first.appointment_date = self.today + timedelta(days=7)
+        first.save()
+        relationship = self.relationship()
+        self.assertEqual(relationship.first_visit, self.today + timedelta(days=3))
+        self.assertEqual(relationship.last_visit, self.today + timedelta(days=7))
+
+        colleague = DoctorProfile.objects.create(
+            user=User.objects.create(email='colleague@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D2'
+        )
+        first = Appointment.objects.get(pk=first.pk)
+        first.doctor = colleague
+        first.save()
+        relationship = self.relationship()
+        self.assertEqual(relationship.visit_count, 1)
+        self.assertEqual(relationship.last_visit, self.today + timedelta(days=3))
+        moved = DoctorPatient.objects.get(doctor=colleague, patient=self.patient)
+        self.assertEqual((moved.visit_count, moved.first_visit), (1, self.today + timedelta(days=7)))
+
+    def test_backfill_command(self):
+        self.book(0)
+        self.book(2, hour=10)
+        DoctorPatient.objects.all().delete()
+
+        out = StringIO()
+        call_command('backfill_doctor_patients', stdout=out)
+        self.assertIn('Rebuilt 1 doctor-patient relationships', out.getvalue())
+        relationship = self.relationship()
+        self.assertEqual(relationship.visit_count, 2)
+        self.assertEqual(relationship.last_visit, self.today + timedelta(days=2))
+
+class AvailabilityTests(TestCase):
+    """Free slots combine the weekly schedule, date slots, leave and bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='doc@example.com', user_type='DOCTOR')
+        cls.doctor = DoctorProfile.objects.create(
+            user=user, specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patient_user = User.objects.create(email='pat@example.com', user_type='PATIENT')
+        cls.patient = PatientProfile.objects.create(user=cls.patient_user)
+        today = timezone.localdate()
+        cls.monday = today + timedelta(days=7 - today.weekday())
+        DoctorSchedule.objects.create(
+            doctor=cls.doctor, day_of_week='Monday', start_time=time(9), end_time=time(11)
+        )
+
+    def test_schedule_minus_bookings_and_blocked_slots(self):
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, reason='Checkup',
+            appointment_date=self.monday, appointment_time=time(9, 30),
+        )
+        DoctorAvailableTimeSlot.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(10, 30), end_time=time(11), is_available=False
+        )
+        DoctorAvailableTimeSlot.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=time(14), end_time=time(15)
+        )
+        availability = get_availability(self.doctor, self.monday)
+        self.assertEqual(
+            availability.free_slots(self.monday), [time(9), time(10), time(14), time(14, 30)]
+        )
+        self.assertFalse(availability.is_free(self.monday, time(9, 30)))
+
+    def test_leave_and_days_off(self):
+        DoctorLeave.objects.create(
+            doctor=self.doctor, start_date=self.monday, end_date=self.monday, reason='Conference', status='APPROVED'
+        )
+        with self.assertNumQueries(4):
+            availability = get_availability(self.doctor, self.monday, self.monday + timedelta(days=13))
+        self.assertEqual(availability.free_slots(self.monday), [])
+        self.assertEqual(availability.free_slots(self.monday + timedelta(days=1)), [])
+        self.assertEqual(len(availability.free_slots(self.monday + timedelta(days=7))), 4)
+
+    def test_json_endpoint(self):
+        self.client.force_login(self.patient_user)
+        url = reverse('patient:doctor_availability', args=[self.doctor.pk])
+        response = self.client.get(url, {'start': self.monday.isoformat(), 'days': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'], [
+            {'date': self.monday.isoformat(), 'on_leave': False, 'slots': ['09:00', '09:30', '10:00', '10:30']},
+            {'date': (self.monday + timedelta(days=1)).isoformat(), 'on_leave': False, 'slots': []},
+        ])
+        self.assertEqual(self.client.get(url, {'days': 100}).status_code, 400)
+
+class AvailabilityBitmapTests(TestCase):
+    """Earliest-slot search reads per-day bitmaps kept current by signals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient_user = User.objects.create(email='pat@example.com', user_type='PATIENT')
+        cls.patient = PatientProfile.objects.create(user=cls.patient_user)
+        today = timezone.localdate()
+        cls.monday = today + timedelta(days=7 - today.weekday())
+        cls.doctors = []
+        for i, (specialization, start) in enumerate([('Cardiology', 10), ('Cardiology', 9), ('Dermatology', 8)]):
+            user = User.objects.create(email=f'doc{i}@example.com', first_name='Doc', last_name=str(i), user_type='DOCTOR')
+            doctor = DoctorProfile.objects.create(
+                user=user, specialization=specialization, qualification='MD', license_number=f'D{i}'
+            )
+            DoctorSchedule.objects.create(
+                doctor=doctor, day_of_week='Monday', start_time=time(start), end_time=time(start + 1)
+            )
+            cls.doctors.append(doctor)
+
+    def earliest(self, specialization='Cardiology'):
+        return bitmap.earliest_slots(specialization, start_date=self.monday, days=7)
+
+    def test_earliest_by_specialization(self):
+        self.assertEqual(self.earliest(), [
+            (self.doctors[1].pk, self.monday, time(9)),
+            (self.doctors[0].pk, self.monday, time(10)),
+        ])
+        self.assertEqual(self.earliest('dermatology'), [(self.doctors[2].pk, self.monday, time(8))])
+
+    def test_booking_and_cancellation(self):
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctors[1], reason='Checkup',
+            appointment_date=self.monday, appointment_time=time(9),
+        )
+        self.assertEqual(self.earliest()[0], (self.doctors[1].pk, self.monday, time(9, 30)))
+
+        appointment.status = 'CANCELLED'
+        appointment.save()
+        self.assertEqual(self.earliest()[0], (self.doctors[1].pk, self.monday, time(9)))
+
+    def test_build_command(self):
+        DoctorDayAvailability.objects.all().delete()
+        out = StringIO()
+        call_command('build_availability_bitmaps', '--days', '14', stdout=out)
+        self.assertIn('for 3 doctors', out.getvalue())
+        self.assertEqual(
+            bitmap.bitmap_to_slots(DoctorDayAvailability.objects.get(doctor=self.doctors[0], date=self.monday).free_slots),
+            [time(10), time(10, 30)]
+        )
+
+    def test_json_endpoint(self):
+        self.client.force_login(self.patient_user)
+        response = self.client.get(reverse('patient:earliest_available'), {'specialization': 'cardiology'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [slot['doctor'] for slot in response.json()['slots']], [self.doctors[1].pk, self.doctors[0].pk]
+        )
+
+class ScheduleImportTests(TestCase):
+    """Bulk schedule import checks every row against existing and accepted intervals"""
+
+    CSV = (
+        "doctor_email,day_of_week,date,start_time,end_time,is_available\n"
+        "a@example.com,Monday,,09:00,12:00,\n"
+        "a@example.com,monday,,11:00,13:00,\n"      # overlaps the row above
+        "a@example.com,Tuesday,,08:00,10:00,yes\n"  # overlaps the existing schedule
+        "b@example.com,,2030-01-07,14:00,15:00,no\n"
+        "c@example.com,Monday,,09:00,10:00,\n"      # unknown doctor
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for email in ('a@example.com', 'b@example.com'):
+            cls.doctors.append(DoctorProfile.objects.create(
+                user=User.objects.create(email=email, user_type='DOCTOR'),
+                specialization='Cardiology', qualification='MD', license_number=email
+            ))
+        DoctorSchedule.objects.create(
+            doctor=cls.doctors[0], day_of_week='Tuesday', start_time=time(9), end_time=time(17)
+        )
+
+    def test_reports_all_conflicts_and_saves_nothing(self):
+        with self.assertNumQueries(3):
+            result = ScheduleImporter().run(self.CSV.encode())
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 6])
+        self.assertFalse(result.saved)
+        self.assertEqual(DoctorSchedule.objects.count(), 1)
+
+    def test_partial_import(self):
+        result = ScheduleImporter(partial=True).run(self.CSV.encode())
+        self.assertTrue(result.saved)
+        self.assertEqual(DoctorSchedule.objects.filter(doctor=self.doctors[0], day_of_week='Monday').count(), 1)
+        slot = DoctorAvailableTimeSlot.objects.get(doctor=self.doctors[1])
+        self.assertFalse(slot.is_available)
+
+    def test_doctor_import_is_limited_to_own_rows(self):
+        result = ScheduleImporter(doctor=self.doctors[1], partial=True).run(self.CSV.encode())
+        self.assertEqual(len(result.errors), 4)
+        self.assertEqual(len(result.date_slots), 1)
+
+    def test_overlap_past_the_neighbouring_intervals(self):
+        index = IntervalIndex([(time(8), time(17)), (time(9), time(10))])
+        self.assertEqual(index.overlapping(time(12), time(13)), (time(8), time(17)))
+        self.assertIsNone(index.overlapping(time(17), time(18)))
+        index.add(time(18), time(20))
+        index.add(time(6), time(7))
+        self.assertEqual(index.overlapping(time(19), time(21)), (time(18), time(20)))
+        self.assertIsNone(index.overlapping(time(7), time(8)))
+
+    def test_file_without_rows_is_not_reported_as_row_errors(self):
+        self.client.force_login(self.doctors[0].user)
+        upload = SimpleUploadedFile('roster.csv', b"start_time,end_time\n", content_type='text/csv')
+        response = self.client.post(reverse('doctor:import_schedule'), {'csv_file': upload})
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)], ["The file has no rows to import"]
+        )
+
+    def test_import_page_reports_row_errors(self):
+        self.client.force_login(self.doctors[0].user)
+        self.assertEqual(self.client.get(reverse('doctor:import_schedule')).status_code, 200)
+        upload = SimpleUploadedFile('roster.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('doctor:import_schedule'), {'csv_file': upload})
+        self.assertContains(response, 'Nothing was imported.')
+        for line, _ in response.context['result'].errors:
+            self.assertContains(response, f'<td>{line}</td>')
+
+class MaterializeSlotsTests(TestCase):
+    """Weekly templates expand into dated slots, skipping leave and manual slots"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        today = timezone.localdate()
+        cls.monday = today + timedelta(days=7 - today.weekday())
+        cls.template = DoctorSchedule.objects.create(
+            doctor=cls.doctor, day_of_week='Monday', start_time=time(9), end_time=time(12)
+        )
+        DoctorSchedule.objects.create(
+            doctor=cls.doctor, day_of_week='Tuesday', start_time=time(9), end_time=time(12), is_available=False
+        )
+
+    def generated_dates(self):
+        return list(DoctorAvailableTimeSlot.objects.filter(source_schedule=self.template)
+                    .order_by('date').values_list('date', flat=True))
+
+    def test_idempotent_expansion(self):
+        DoctorLeave.objects.create(
+            doctor=self.doctor, start_date=self.monday, end_date=self.monday, reason='Off', status='APPROVED'
+        )
+        DoctorAvailableTimeSlot.objects.create(
+            doctor=self.doctor, date=self.monday + timedelta(weeks=1), start_time=time(11), end_time=time(13)
+        )
+        result = materialize_slots(weeks=3, today=self.monday)
+        self.assertEqual((result.created, result.skipped_leave, result.skipped_overlap), (1, 1, 1))
+        self.assertEqual(self.generated_dates(), [self.monday + timedelta(weeks=2)])
+
+        result = materialize_slots(weeks=3, today=self.monday)
+        self.assertEqual(result.created, 0)
+
+    def test_created_counts_only_the_inserted_rows(self):
+        DoctorSchedule.objects.create(doctor=self.doctor, day_of_week='Wednesday', start_time=time(9), end_time=time(10))
+        # Counted from the batches sent, not from the whole table, which other writers also change
+        with mock.patch.object(DoctorAvailableTimeSlot.objects, 'count', side_effect=AssertionError):
+            result = materialize_slots(weeks=3, batch_size=2, today=self.monday)
+        self.assertEqual(result.created, 6)
+        self.assertEqual(DoctorAvailableTimeSlot.objects.count(), 6)
+
+    def test_leave_removes_generated_slots_and_edits_regenerate(self):
+        materialize_slots(weeks=2, today=self.monday)
+        self.assertEqual(len(self.generated_dates()), 2)
+
+        DoctorLeave.objects.create(
+            doctor=self.doctor, start_date=self.monday, end_date=self.monday, reason='Off', status='APPROVED'
+        )
+        self.assertEqual(materialize_slots(weeks=2, today=self.monday).removed, 1)
+
+        self.template.end_time = time(11)
+        self.template.save()
+        self.assertEqual(self.generated_dates(), [])
+        materialize_slots(weeks=2, today=self.monday)
+        self.assertEqual(
+            list(DoctorAvailableTimeSlot.objects.filter(source_schedule=self.template).values_list('end_time', flat=True)),
+            [time(11)]
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('materialize_slots', '--weeks', '2', stdout=out)
+        self.assertIn('Materialized 2 slots', out.getvalue())
+
+class LeaveImpactTests(TestCase):
+    """Appointments inside an approved leave go to a colleague, a later slot, or are cancelled"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = []
+        for i, end in enumerate((11, 9)):
+            doctor = DoctorProfile.objects.create(
+                user=User.objects.create(email=f'doc{i}@example.com', user_type='DOCTOR'),
+                specialization='Cardiology', qualification='MD', license_number=f'D{i}'
+            )
+            DoctorSchedule.objects.create(
+                doctor=doctor, day_of_week='Monday', start_time=time(8 + i), end_time=time(end, 30 * i)
+            )
+            cls.doctors.append(doctor)
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create(email='pat@example.com', user_type='PATIENT')
+        )
+        today = timezone.localdate()
+        cls.monday = today + timedelta(days=7 - today.weekday())
+
+    def setUp(self):
+        self.appointments = [
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctors[0], reason='Checkup',
+                appointment_date=self.monday, appointment_time=start,
+            )
+            for start in (time(9), time(9, 30), time(10))
+        ]
+        self.leave = DoctorLeave.objects.create(
+            doctor=self.doctors[0], start_date=self.monday, end_date=self.monday, reason='Off', status='APPROVED'
+        )
+
+    def test_plan_and_apply(self):
+        report = plan_leave_impact(self.leave)
+        next_monday = self.monday + timedelta(weeks=1)
+        self.assertEqual(
+            [(impact.action, impact.doctor, impact.date, impact.time) for impact in report.impacts],
+            [
+                ('reassigned', self.doctors[1], self.monday, time(9)),
+                ('moved', self.doctors[0], next_monday, time(8)),
+                ('moved', self.doctors[0], next_monday, time(8, 30)),
+            ]
+        )
+
+        apply_leave_impact(self.leave)
+        self.appointments[0].refresh_from_db()
+        self.assertEqual(self.appointments[0].doctor, self.doctors[1])
+        self.assertTrue(DoctorPatient.objects.filter(doctor=self.doctors[1], patient=self.patient).exists())
+        self.assertFalse(Appointment.objects.filter(
+            doctor=self.doctors[0], appointment_date=self.monday, status='SCHEDULED'
+        ).exists())
+        self.assertEqual(plan_leave_impact(self.leave).impacts, [])
+
+    def test_cancels_without_replacement(self):
+        with mock.patch('doctor.leave_impact.REBOOK_WINDOW_DAYS', 0):
+            report = apply_leave_impact(self.leave)
+        self.assertEqual(report.summary, {'reassigned': 1, 'moved': 0, 'cancelled': 2})
+        self.assertEqual(Appointment.objects.filter(status='CANCELLED').count(), 2)
+
+    def test_skips_slots_where_the_patient_is_busy(self):
+        next_monday = self.monday + timedelta(weeks=1)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctors[1], reason='Checkup',
+            appointment_date=next_monday, appointment_time=time(9),
+        )
+        report = plan_leave_impact(self.leave)
+        self.assertEqual(
+            [(impact.date, impact.time) for impact in report.impacts[1:]],
+            [(next_monday, time(8)), (next_monday, time(8, 30))]
+        )
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctors[1], reason='Checkup',
+            appointment_date=next_monday, appointment_time=time(8),
+        )
+        report = plan_leave_impact(self.leave)
+        self.assertEqual(
+            [(impact.date, impact.time) for impact in report.impacts[1:]],
+            [(next_monday, time(8, 30)), (next_monday, time(9, 30))]
+        )
+
+    def test_apply_plans_again_with_current_bookings(self):
+        preview = plan_leave_impact(self.leave)
+        self.assertEqual(preview.summary['reassigned'], 1)
+        # The colleague's slot is taken after the preview was shown
+        Appointment.objects.create(
+            patient=PatientProfile.objects.create(
+                user=User.objects.create(email='other@example.com', user_type='PATIENT')
+            ),
+            doctor=self.doctors[1], reason='Checkup', appointment_date=self.monday, appointment_time=time(9),
+        )
+        report = apply_leave_impact(self.leave)
+        self.assertEqual(report.summary, {'reassigned': 0, 'moved': 3, 'cancelled': 0})
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctors[1], appointment_date=self.monday).count(), 1)
+
+    def test_impact_page_shows_the_plan(self):
+        self.client.force_login(User.objects.create(email='admin@example.com', user_type='ADMIN'))
+        url = reverse('doctor:leave_impact', args=[self.leave.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'Reassigned', count=1)
+        self.assertContains(response, 'Moved', count=2)
+        self.assertContains(response, '1 reassigned to a colleague')
+
+        response = self.client.post(url, follow=True)
+        self.assertContains(response, 'No Affected Appointments')
+
+class PrescriptionItemBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create(email='doc@example.com', user_type='DOCTOR')
+        cls.doctor = DoctorProfile.objects.create(
+            user=cls.doctor_user, specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create(email='pat@example.com', user_type='PATIENT')
+        )
+        cls.medicines = [
+            Medicine.objects.create(name=f'Medicine {i}', description='', manufacturer='Acme',
+                                    unit_price=1, stock_quantity=10)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        self.prescription = Prescription.objects.create(patient=self.patient, doctor=self.doctor)
+        self.client.force_login(self.doctor_user)
+
+    def item(self, medicine, quantity=2):
+        return {'medicine': medicine.pk, 'dosage': '1 tablet', 'duration': '5 days', 'quantity': quantity,
+                'instructions': 'After meals'}
+
+    def post(self, payload):
+        return self.client.post(reverse('doctor:prescription_items_batch', args=[self.prescription.pk]),
+                                json.dumps(payload), content_type='application/json')
+
+    def test_ten_medicines_in_one_request(self):
+        existing = PrescriptionItem.objects.create(prescription=self.prescription, **{
+            **self.item(self.medicines[0]), 'medicine': self.medicines[0],
+        })
+        removed = PrescriptionItem.objects.create(prescription=self.prescription, **{
+            **self.item(self.medicines[1]), 'medicine': self.medicines[1],
+        })
+        payload = {
+            'add': [self.item(medicine) for medicine in self.medicines[2:]],
+            'update': [{'id': existing.pk, 'quantity': 5}],
+            'delete': [removed.pk],
+        }
+        # Session, user, prescription, its row lock, touched items and medicines; one INSERT
+        # and one UPDATE however many items are added or changed; the delete
+        # and its timestamp touches; the final touch; the items sent back
+        with self.assertNumQueries(17):
+            response = self.post(payload)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual((data['added'], data['updated'], data['deleted']), (8, 1, 1))
+        self.assertEqual(len(data['items']), 9)
+        existing.refresh_from_db()
+        self.assertEqual((existing.quantity, existing.dosage), (5, '1 tablet'))
+
+    def test_invalid_batch_changes_nothing(self):
+        other = Prescription.objects.create(patient=self.patient, doctor=self.doctor)
+        foreign = PrescriptionItem.objects.create(prescription=other, **{
+            **self.item(self.medicines[0]), 'medicine': self.medicines[0],
+        })
+        response = self.post({
+            'add': [self.item(self.medicines[0]), self.item(self.medicines[1], quantity=11)],
+            'delete': [foreign.pk],
+        })
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([(error['op'], error['index'], list(error['errors'])) for error in errors],
+                         [('delete', 0, ['id']), ('add', 1, ['quantity'])])
+        self.assertFalse(self.prescription.items.exists())
+        self.assertTrue(PrescriptionItem.objects.filter(pk=foreign.pk).exists())
+
+    def test_unknown_ids_are_not_reported_as_duplicates(self):
+        item = PrescriptionItem.objects.create(prescription=self.prescription, **{
+            **self.item(self.medicines[0]), 'medicine': self.medicines[0],
+        })
+        response = self.post({'update': [{'id': 'x', 'quantity': 3}], 'delete': [None, item.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['op'], error['index']) for error in response.json()['errors']],
+                         [('update', 0), ('delete', 0)])
+
+        response = self.post({'update': [{'id': item.pk, 'quantity': 3}], 'delete': [item.pk]})
+        self.assertEqual(response.json()['errors'], [{'error': "Each item may be updated or deleted only once per batch."}])
+
+class ActingContextTests(TestCase):
+    """Doctors act for themselves and nurses for their assigned doctor; only ids are cached"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create(email=f'doc{i}@example.com', user_type='DOCTOR'),
+                specialization='Cardiology', qualification='MD', license_number=f'D{i}'
+            )
+            for i in range(2)
+        ]
+        cls.nurse = NurseProfile.objects.create(
+            user=User.objects.create(email='nurse@example.com', user_type='NURSE'),
+            qualification='RN', license_number='N1', department='Cardiology'
+        )
+        cls.assignment = NurseAssignment.objects.create(
+            doctor=cls.doctors[0], nurse=cls.nurse, start_date=timezone.localdate()
+        )
+
+    def setUp(self):
+        context.clear()
+
+    def load(self, user):
+        return User.objects.with_profiles().get(pk=user.pk)
+
+    def test_doctor_acts_for_themselves(self):
+        user = self.load(self.doctors[0].user)
+        with self.assertNumQueries(0):
+            acting = context.get_acting_context(user)
+        self.assertTrue(acting.is_doctor)
+        self.assertEqual(acting.doctor_profile, self.doctors[0])
+
+    def test_nurse_acts_for_the_assigned_doctor(self):
+        user = self.load(self.nurse.user)
+        with self.assertNumQueries(1):
+            first = context.get_acting_context(user)
+        self.assertEqual(first.doctor_profile, self.doctors[0])
+        # The cached doctor id skips the assignment join; the profile is loaded fresh
+        with self.assertNumQueries(1):
+            second = context.get_acting_context(user)
+        self.assertEqual(second.doctor_profile, self.doctors[0])
+        self.assertIsNot(second.doctor_profile, first.doctor_profile)
+
+    def test_assignment_changes_invalidate(self):
+        user = self.load(self.nurse.user)
+        context.get_acting_context(user)
+
+        self.assignment.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.save()
+        self.assertIsNone(context.get_acting_context(user).doctor_profile)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NurseAssignment.objects.create(doctor=self.doctors[1], nurse=self.nurse, start_date=timezone.localdate())
+        self.assertEqual(context.get_acting_context(user).doctor_profile, self.doctors[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctors[1].delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(context.get_acting_context(user).doctor_profile)
+
+    def test_missing_profile_is_404(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.create(email='nurse2@example.com', user_type='NURSE')
+        with self.assertRaises(Http404):
+            context.get_acting_doctor(request)
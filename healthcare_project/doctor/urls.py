@@ -25,24 +25,28 @@ urlpatterns = [
     path('prescriptions/create-for-patient/<int:patient_id>/', views.create_prescription, name='create_prescription_for_patient'),
     path('prescriptions/<int:pk>/', views.prescription_detail, name='prescription_detail'),
     path('prescriptions/<int:pk>/edit/', views.edit_prescription, name='edit_prescription'),
+    path('prescriptions/<int:pk>/items/batch/', views.prescription_items_batch, name='prescription_items_batch'),
     path('prescriptions/<int:prescription_id>/generate-bill/', views.generate_bill, name='generate_bill'),
     path('prescription-items/<int:pk>/delete/', views.delete_prescription_item, name='delete_prescription_item'),
     
     # Patients
     path('patients/', views.patients, name='patients'),
     path('patients/<int:pk>/', views.patient_detail, name='patient_detail'),
+    path('patients/<int:pk>/history/<str:panel>/', views.patient_history, name='patient_history'),
     path('patients/<int:patient_id>/create-referral/', views.create_referral, name='create_referral'),
     
     # Schedule
     path('schedule/', views.schedule, name='schedule'),
     path('schedule/<int:pk>/delete/', views.delete_schedule, name='delete_schedule'),
     path('schedule/add-date-slot/', views.add_date_slot, name='add_date_slot'),
+    path('schedule/import/', views.import_schedule, name='import_schedule'),
     path('schedule/date-slot/<int:pk>/delete/', views.delete_date_slot, name='delete_date_slot'),
     
     # Leave
     path('leaves/', views.leaves, name='leaves'),
     path('leaves/request/', views.request_leave, name='request_leave'),
     path('leaves/<int:pk>/cancel/', views.cancel_leave, name='cancel_leave'),
+    path('leaves/<int:pk>/impact/', views.leave_impact, name='leave_impact'),
     
     # Tasks
     path('tasks/', views.tasks, name='tasks'),
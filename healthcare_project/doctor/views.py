@@ -1,31 +1,55 @@
 # doctor/views.py
 
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F
 from django.core.paginator import Paginator
 
-from accounts.models import User, DoctorProfile, PatientProfile, NurseProfile
+from accounts.decorators import query_budget, conditional_detail
+from accounts.pagination import CursorPaginator
+from accounts.models import User, PatientProfile
 from patient.models import (
     MedicalRecord, Appointment, Prescription, 
     PrescriptionItem, Medicine, Bill
 )
 from .models import (
     DoctorSchedule, DoctorLeave, Treatment, 
-    PatientNote, Referral, Task, NurseAssignment,
-    DoctorAvailableTimeSlot
+    Referral, Task, NurseAssignment,
+    DoctorAvailableTimeSlot, DoctorPatient
 )
 from .forms import (
     DoctorScheduleForm, DoctorLeaveForm, MedicalRecordForm, 
     TreatmentForm, PatientNoteForm, ReferralForm,
     TaskForm, NurseAssignmentForm, AppointmentUpdateForm,
-    PrescriptionForm, PrescriptionItemForm, DoctorAvailableTimeSlotForm
+    PrescriptionForm, PrescriptionItemForm, DoctorAvailableTimeSlotForm,
+    ScheduleImportForm
 )
+from . import dashboard as dashboard_snapshot
+from .context import get_acting_context, get_acting_doctor
+from .history import PANELS, history_page, history_previews, page_as_dict
+from .importers import ScheduleImporter
+from .leave_impact import plan_leave_impact, apply_leave_impact
+from .prescriptions import ItemBatchError, apply_item_batch
+
+def doctor_object_modified(queryset, field):
+    """``conditional_detail`` timestamp of one of the acting doctor's objects"""
+    def last_modified(request, pk):
+        if request.user.user_type not in ['DOCTOR', 'NURSE']:
+            return None
+        doctor_profile = get_acting_doctor(request)
+        if doctor_profile is None:
+            return None
+        return queryset.filter(pk=pk, doctor=doctor_profile).values_list(field, flat=True).first()
+    return last_modified
 
 @login_required
+@query_budget(6)
 def dashboard(request):
     """Doctor dashboard view"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
@@ -33,81 +57,40 @@ def dashboard(request):
         return redirect('accounts:home')
     
     # Get doctor profile or associated doctor for nurse
+    doctor_profile = get_acting_doctor(request)
     if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
         context = {'is_doctor': True, 'profile': doctor_profile}
     else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        # Get the doctor this nurse is assigned to (assuming one doctor per nurse for simplicity)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
+        nurse_profile = get_acting_context(request.user).nurse_profile
+        if doctor_profile:
             context = {'is_doctor': False, 'is_nurse': True, 'nurse_profile': nurse_profile, 'doctor_profile': doctor_profile}
         else:
             messages.warning(request, "You're not currently assigned to any doctor.")
             context = {'is_doctor': False, 'is_nurse': True, 'nurse_profile': nurse_profile}
             return render(request, 'doctor/dashboard.html', context)
     
-    # Today's appointments
-    today = timezone.now().date()
-    today_appointments = Appointment.objects.filter(
-        doctor=doctor_profile,
-        appointment_date=today
-    ).order_by('appointment_time')
+    # Today's and upcoming appointments, recent records and tasks, cached per doctor
+    context.update(dashboard_snapshot.get_doctor_snapshot(doctor_profile))
     
-    # Upcoming appointments (excluding today)
-    upcoming_appointments = Appointment.objects.filter(
-        doctor=doctor_profile,
-        appointment_date__gt=today,
-        status='SCHEDULED'
-    ).order_by('appointment_date', 'appointment_time')[:5]
-    
-    # Recent medical records
-    recent_records = MedicalRecord.objects.filter(
-        doctor=doctor_profile
-    ).order_by('-date_created')[:5]
-    
-    # Tasks (for both doctors and nurses)
-    if request.user.user_type == 'DOCTOR':
-        # Tasks created by the doctor
-        tasks = Task.objects.filter(
-            doctor=doctor_profile
-        ).order_by('status', 'priority', 'due_date')[:5]
-    else:  # Nurse
-        # Tasks assigned to the nurse
-        tasks = Task.objects.filter(
-            assigned_to=request.user
-        ).order_by('status', 'priority', 'due_date')[:5]
-    
-    # Add to context
-    context.update({
-        'today_appointments': today_appointments,
-        'upcoming_appointments': upcoming_appointments,
-        'recent_records': recent_records,
-        'tasks': tasks,
-        'today': today,
-    })
+    # Tasks assigned to the nurse instead of the ones the doctor created
+    if request.user.user_type == 'NURSE':
+        context['tasks'] = dashboard_snapshot.get_nurse_tasks(request.user)
     
     return render(request, 'doctor/dashboard.html', context)
 
 @login_required
+@query_budget(6)
 def appointments(request):
     """View for managing doctor's appointments"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Handle filters
     status_filter = request.GET.get('status', '')
@@ -116,7 +99,9 @@ def appointments(request):
     patient_filter = request.GET.get('patient', '')
     
     # Base queryset
-    appointments = Appointment.objects.filter(doctor=doctor_profile).order_by('-appointment_date', '-appointment_time')
+    appointments = Appointment.objects.filter(
+        doctor=doctor_profile
+    ).for_list().select_related('patient__user').order_by('-appointment_date', '-appointment_time')
     
     # Apply filters
     if status_filter:
@@ -135,9 +120,12 @@ def appointments(request):
         )
     
     # Pagination
-    paginator = Paginator(appointments, 10)  # Show 10 appointments per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        appointments, 10,  # Show 10 appointments per page
+        ordering=('-appointment_date', '-appointment_time', '-id'),
+        count_limit=1000
+    )
+    page_obj = paginator.page(request.GET.get('cursor'))
     
     context = {
         'appointments': page_obj,
@@ -152,51 +140,49 @@ def appointments(request):
     return render(request, 'doctor/appointments.html', context)
 
 @login_required
+@query_budget(6)
 def appointment_detail(request, pk):
     """View for appointment details and update"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Get appointment
-    appointment = get_object_or_404(Appointment, pk=pk, doctor=doctor_profile)
+    appointment = get_object_or_404(
+        Appointment.objects.select_related('patient__user'), pk=pk, doctor=doctor_profile
+    )
     
     if request.method == 'POST':
         form = AppointmentUpdateForm(request.POST, instance=appointment)
         if form.is_valid():
-            form.save()
-            messages.success(request, "Appointment updated successfully")
-            return redirect('doctor:appointment_detail', pk=pk)
+            try:
+                with transaction.atomic():
+                    form.save()
+            except IntegrityError:
+                # Reactivating a cancelled appointment whose slot was rebooked
+                form.add_error(None, "This time slot is already held by another appointment.")
+            else:
+                messages.success(request, "Appointment updated successfully")
+                return redirect('doctor:appointment_detail', pk=pk)
     else:
         form = AppointmentUpdateForm(instance=appointment)
     
-    # Get patient's medical records
-    medical_records = MedicalRecord.objects.filter(
-        patient=appointment.patient
-    ).order_by('-date_created')
-    
-    # Get patient's prescriptions
-    prescriptions = Prescription.objects.filter(
-        patient=appointment.patient
-    ).order_by('-date_prescribed')
+    # Latest records and prescriptions from all doctors; older ones load from patient_history
+    history = history_previews(
+        ['medical_records', 'prescriptions'], appointment.patient, doctor_profile, request.user, all_doctors=True
+    )
     
     context = {
         'appointment': appointment,
         'form': form,
-        'medical_records': medical_records,
-        'prescriptions': prescriptions,
+        'medical_records': history['medical_records'],
+        'prescriptions': history['prescriptions'],
         'is_doctor': request.user.user_type == 'DOCTOR',
         'is_nurse': request.user.user_type == 'NURSE',
     }
@@ -210,7 +196,7 @@ def create_medical_record(request, appointment_id):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     appointment = get_object_or_404(Appointment, pk=appointment_id, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -248,23 +234,18 @@ def create_medical_record(request, appointment_id):
     return render(request, 'doctor/create_medical_record.html', context)
 
 @login_required
+@query_budget(6)
 def medical_records(request):
     """View for doctor's medical records"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Handle filters
     patient_filter = request.GET.get('patient', '')
@@ -272,7 +253,9 @@ def medical_records(request):
     date_to = request.GET.get('date_to', '')
     
     # Base queryset
-    records = MedicalRecord.objects.filter(doctor=doctor_profile).order_by('-date_created')
+    records = MedicalRecord.objects.filter(
+        doctor=doctor_profile
+    ).for_list().select_related('patient__user').order_by('-date_created')
     
     # Apply filters
     if patient_filter:
@@ -288,9 +271,12 @@ def medical_records(request):
         records = records.filter(date_created__date__lte=date_to)
     
     # Pagination
-    paginator = Paginator(records, 10)  # Show 10 records per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        records, 10,  # Show 10 records per page
+        ordering=('-date_created', '-id'),
+        count_limit=1000
+    )
+    page_obj = paginator.page(request.GET.get('cursor'))
     
     context = {
         'records': page_obj,
@@ -304,23 +290,18 @@ def medical_records(request):
     return render(request, 'doctor/medical_records.html', context)
 
 @login_required
+@conditional_detail(doctor_object_modified(MedicalRecord.objects, 'date_updated'))
 def medical_record_detail(request, pk):
     """View for medical record details"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Get medical record
     record = get_object_or_404(MedicalRecord, pk=pk, doctor=doctor_profile)
@@ -354,7 +335,7 @@ def edit_medical_record(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     record = get_object_or_404(MedicalRecord, pk=pk, doctor=doctor_profile)
     
     try:
@@ -401,7 +382,7 @@ def create_prescription(request, record_id=None, patient_id=None):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     # Determine patient and medical record based on provided IDs
     if record_id:
@@ -444,7 +425,7 @@ def edit_prescription(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     prescription = get_object_or_404(Prescription, pk=pk, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -480,23 +461,18 @@ def edit_prescription(request, pk):
     return render(request, 'doctor/edit_prescription.html', context)
 
 @login_required
+@conditional_detail(doctor_object_modified(Prescription.objects, 'updated_at'))
 def prescription_detail(request, pk):
     """View for prescription details"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Get prescription
     prescription = get_object_or_404(Prescription, pk=pk, doctor=doctor_profile)
@@ -521,23 +497,18 @@ def prescription_detail(request, pk):
     return render(request, 'doctor/prescription_detail.html', context)
 
 @login_required
+@query_budget(8)
 def prescriptions(request):
     """View for doctor's prescriptions"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Handle filters
     patient_filter = request.GET.get('patient', '')
@@ -546,7 +517,9 @@ def prescriptions(request):
     date_to = request.GET.get('date_to', '')
     
     # Base queryset
-    prescriptions = Prescription.objects.filter(doctor=doctor_profile).order_by('-date_prescribed')
+    prescriptions = Prescription.objects.filter(
+        doctor=doctor_profile
+    ).select_related('patient__user').prefetch_related('items__medicine').order_by('-date_prescribed')
     
     # Apply filters
     if patient_filter:
@@ -568,9 +541,12 @@ def prescriptions(request):
         prescriptions = prescriptions.filter(date_prescribed__lte=date_to)
     
     # Pagination
-    paginator = Paginator(prescriptions, 10)  # Show 10 prescriptions per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        prescriptions, 10,  # Show 10 prescriptions per page
+        ordering=('-date_prescribed', '-id'),
+        count_limit=1000
+    )
+    page_obj = paginator.page(request.GET.get('cursor'))
     
     context = {
         'prescriptions': page_obj,
@@ -585,30 +561,30 @@ def prescriptions(request):
     return render(request, 'doctor/prescriptions.html', context)
 
 @login_required
+@query_budget(6)
 def patients(request):
     """View for managing patients"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Search filter
     search = request.GET.get('search', '')
     
-    # Get all unique patients who have had appointments with this doctor
-    patient_ids = Appointment.objects.filter(doctor=doctor_profile).values_list('patient_id', flat=True).distinct()
-    patients = PatientProfile.objects.filter(id__in=patient_ids)
+    # Get all patients who have had appointments with this doctor
+    patients = PatientProfile.objects.filter(
+        doctor_relationships__doctor=doctor_profile
+    ).annotate(
+        first_visit=F('doctor_relationships__first_visit'),
+        last_visit=F('doctor_relationships__last_visit'),
+        visit_count=F('doctor_relationships__visit_count'),
+    ).select_related('user').order_by('user__last_name', 'user__first_name')
     
     # Apply search filter if provided
     if search:
@@ -633,51 +609,28 @@ def patients(request):
     return render(request, 'doctor/patients.html', context)
 
 @login_required
+@query_budget(11)
 def patient_detail(request, pk):
     """View for patient details"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
         messages.error(request, "Access denied. Doctor or Nurse access only.")
         return redirect('accounts:home')
     
-    # Get doctor profile
-    if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
-    else:  # Nurse
-        nurse_profile = get_object_or_404(NurseProfile, user=request.user)
-        assignment = NurseAssignment.objects.filter(nurse=nurse_profile, is_active=True).first()
-        if assignment:
-            doctor_profile = assignment.doctor
-        else:
-            messages.warning(request, "You're not currently assigned to any doctor.")
-            return redirect('doctor:dashboard')
+    # Get doctor profile (the assigned doctor for nurses)
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        messages.warning(request, "You're not currently assigned to any doctor.")
+        return redirect('doctor:dashboard')
     
     # Get patient
     patient = get_object_or_404(PatientProfile, pk=pk)
     
     # Check if this doctor has treated this patient before
-    has_treated = Appointment.objects.filter(doctor=doctor_profile, patient=patient).exists()
+    has_treated = DoctorPatient.objects.filter(doctor=doctor_profile, patient=patient).exists()
     if not has_treated:
         messages.error(request, "You don't have permission to view this patient's details.")
         return redirect('doctor:patients')
     
-    # Get patient's medical records with this doctor
-    medical_records = MedicalRecord.objects.filter(
-        doctor=doctor_profile,
-        patient=patient
-    ).order_by('-date_created')
-    
-    # Get patient's appointments with this doctor
-    appointments = Appointment.objects.filter(
-        doctor=doctor_profile,
-        patient=patient
-    ).order_by('-appointment_date', '-appointment_time')
-    
-    # Get patient's prescriptions from this doctor
-    prescriptions = Prescription.objects.filter(
-        doctor=doctor_profile,
-        patient=patient
-    ).order_by('-date_prescribed')
-    
     # Patient notes (if doctor)
     if request.user.user_type == 'DOCTOR':
         if request.method == 'POST':
@@ -691,25 +644,18 @@ def patient_detail(request, pk):
                 return redirect('doctor:patient_detail', pk=pk)
         else:
             note_form = PatientNoteForm()
-        
-        patient_notes = PatientNote.objects.filter(
-            doctor=doctor_profile,
-            patient=patient
-        ).order_by('-created_at')
     else:
         note_form = None
-        patient_notes = PatientNote.objects.filter(
-            doctor=doctor_profile,
-            patient=patient,
-            is_private=False  # Nurses can only see non-private notes
-        ).order_by('-created_at')
+    
+    # Latest rows of each panel with this doctor; older ones load from patient_history
+    history = history_previews(PANELS, patient, doctor_profile, request.user)
     
     context = {
         'patient': patient,
-        'medical_records': medical_records,
-        'appointments': appointments,
-        'prescriptions': prescriptions,
-        'patient_notes': patient_notes,
+        'medical_records': history['medical_records'],
+        'appointments': history['appointments'],
+        'prescriptions': history['prescriptions'],
+        'patient_notes': history['patient_notes'],
         'note_form': note_form,
         'is_doctor': request.user.user_type == 'DOCTOR',
         'is_nurse': request.user.user_type == 'NURSE',
@@ -717,6 +663,31 @@ def patient_detail(request, pk):
     
     return render(request, 'doctor/patient_detail.html', context)
 
+@login_required
+@query_budget(5)
+def patient_history(request, pk, panel):
+    """One page of a patient history panel as JSON, loaded on demand by the detail pages"""
+    if request.user.user_type not in ['DOCTOR', 'NURSE']:
+        return JsonResponse({'error': "Doctor or Nurse access only."}, status=403)
+    if panel not in PANELS:
+        raise Http404("Unknown history panel.")
+    
+    doctor_profile = get_acting_doctor(request)
+    if doctor_profile is None:
+        return JsonResponse({'error': "You're not currently assigned to any doctor."}, status=403)
+    
+    patient = get_object_or_404(PatientProfile, pk=pk)
+    if not DoctorPatient.objects.filter(doctor=doctor_profile, patient=patient).exists():
+        return JsonResponse({'error': "You don't have permission to view this patient's details."}, status=403)
+    
+    # Counting is only worth it when a panel is first opened
+    cursor = request.GET.get('cursor')
+    page = history_page(
+        panel, patient, doctor_profile, request.user,
+        cursor=cursor, all_doctors=request.GET.get('scope') == 'all', count=not cursor
+    )
+    return JsonResponse(page_as_dict(panel, page, doctor_profile))
+
 @login_required
 def schedule(request):
     """View for managing doctor's schedule"""
@@ -724,7 +695,7 @@ def schedule(request):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     if request.method == 'POST':
         form = DoctorScheduleForm(request.POST)
@@ -775,7 +746,7 @@ def delete_schedule(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     schedule = get_object_or_404(DoctorSchedule, pk=pk, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -792,7 +763,7 @@ def add_date_slot(request):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     if request.method == 'POST':
         form = DoctorAvailableTimeSlotForm(request.POST)
@@ -810,10 +781,13 @@ def add_date_slot(request):
                 (Q(start_time__gte=slot.start_time) & Q(end_time__lte=slot.end_time))
             )
             
-            if overlapping.exists():
+            if overlapping.filter(source_schedule__isnull=True).exists():
                 messages.error(request, "This time slot overlaps with an existing one.")
             else:
-                slot.save()
+                # A manual slot replaces the slots generated from the weekly schedule
+                with transaction.atomic():
+                    overlapping.delete()
+                    slot.save()
                 messages.success(request, "Time slot added successfully")
                 return redirect('doctor:schedule')
     else:
@@ -828,7 +802,7 @@ def delete_date_slot(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     slot = get_object_or_404(DoctorAvailableTimeSlot, pk=pk, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -838,6 +812,47 @@ def delete_date_slot(request, pk):
     
     return render(request, 'doctor/delete_date_slot.html', {'slot': slot})
 
+@login_required
+def import_schedule(request):
+    """View for bulk importing schedules and date slots from a CSV file"""
+    if request.user.user_type not in ['DOCTOR', 'ADMIN']:
+        messages.error(request, "Access denied. Doctor or Administrator access only.")
+        return redirect('accounts:home')
+    
+    # Doctors import their own roster; administrators any doctor's
+    doctor_profile = get_acting_doctor(request) if request.user.user_type == 'DOCTOR' else None
+    result = None
+    
+    if request.method == 'POST':
+        form = ScheduleImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            importer = ScheduleImporter(doctor=doctor_profile, partial=form.cleaned_data['partial'])
+            try:
+                result = importer.run(form.cleaned_data['csv_file'])
+            except (ValueError, UnicodeDecodeError) as e:
+                form.add_error('csv_file', f"Could not read the file: {e}")
+            else:
+                if result.saved:
+                    messages.success(
+                        request,
+                        f"Imported {len(result.schedules)} weekly schedules and {len(result.date_slots)} date slots"
+                    )
+                    if not result.errors:
+                        return redirect('doctor:schedule' if doctor_profile else 'doctor:import_schedule')
+                elif result.errors:
+                    messages.error(request, f"{len(result.errors)} rows have errors; nothing was imported")
+                else:
+                    messages.error(request, "The file has no rows to import")
+    else:
+        form = ScheduleImportForm()
+    
+    context = {
+        'form': form,
+        'result': result,
+    }
+    
+    return render(request, 'doctor/import_schedule.html', context)
+
 @login_required
 def request_leave(request):
     """View for requesting leave/time off"""
@@ -845,7 +860,7 @@ def request_leave(request):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     if request.method == 'POST':
         form = DoctorLeaveForm(request.POST)
@@ -872,7 +887,7 @@ def leaves(request):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     # Get all leave requests for the doctor
     leaves = DoctorLeave.objects.filter(doctor=doctor_profile).order_by('-start_date')
@@ -890,7 +905,7 @@ def cancel_leave(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     leave = get_object_or_404(DoctorLeave, pk=pk, doctor=doctor_profile)
     
     if leave.status != 'PENDING':
@@ -905,6 +920,43 @@ def cancel_leave(request, pk):
     return render(request, 'doctor/cancel_leave.html', {'leave': leave})
 
 @login_required
+def leave_impact(request, pk):
+    """View for reviewing and applying the rebooking of appointments affected by an approved leave"""
+    if request.user.user_type != 'ADMIN':
+        messages.error(request, "Access denied. Administrator access only.")
+        return redirect('accounts:home')
+    
+    leave = get_object_or_404(DoctorLeave.objects.select_related('doctor__user'), pk=pk)
+    if leave.status != 'APPROVED':
+        messages.error(request, "Only approved leaves affect appointments.")
+        return redirect('accounts:home')
+    
+    if request.method == 'POST':
+        try:
+            summary = apply_leave_impact(leave).summary
+        except IntegrityError:
+            messages.error(
+                request,
+                "A replacement slot was booked while the plan was applied. "
+                "Nothing was changed, please review the plan again."
+            )
+        else:
+            messages.success(
+                request,
+                f"{summary['reassigned']} appointments reassigned, {summary['moved']} moved "
+                f"and {summary['cancelled']} cancelled"
+            )
+        return redirect('doctor:leave_impact', pk=pk)
+    
+    context = {
+        'leave': leave,
+        'report': plan_leave_impact(leave),
+    }
+    
+    return render(request, 'doctor/leave_impact.html', context)
+
+@login_required
+@query_budget(6)
 def tasks(request):
     """View for managing tasks"""
     if request.user.user_type not in ['DOCTOR', 'NURSE']:
@@ -912,7 +964,7 @@ def tasks(request):
         return redirect('accounts:home')
     
     if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+        doctor_profile = get_acting_doctor(request)
         
         if request.method == 'POST':
             form = TaskForm(request.POST)
@@ -927,7 +979,9 @@ def tasks(request):
             form = TaskForm()
         
         # Get all tasks created by the doctor
-        tasks = Task.objects.filter(doctor=doctor_profile).order_by('status', 'priority', 'due_date')
+        tasks = Task.objects.filter(
+            doctor=doctor_profile
+        ).for_list().select_related('assigned_to', 'patient__user').order_by('status', 'priority', 'due_date')
         
         context = {
             'is_doctor': True,
@@ -936,7 +990,9 @@ def tasks(request):
         }
     else:  # Nurse
         # Get all tasks assigned to the nurse
-        tasks = Task.objects.filter(assigned_to=request.user).order_by('status', 'priority', 'due_date')
+        tasks = Task.objects.filter(
+            assigned_to=request.user
+        ).for_list().select_related('doctor__user', 'patient__user').order_by('status', 'priority', 'due_date')
         
         context = {
             'is_nurse': True,
@@ -956,7 +1012,7 @@ def task_detail(request, pk):
     task = get_object_or_404(Task, pk=pk)
     
     if request.user.user_type == 'DOCTOR':
-        doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+        doctor_profile = get_acting_doctor(request)
         if task.doctor != doctor_profile:
             messages.error(request, "You don't have permission to view this task.")
             return redirect('doctor:tasks')
@@ -1001,7 +1057,7 @@ def delete_task(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     task = get_object_or_404(Task, pk=pk, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -1012,13 +1068,14 @@ def delete_task(request, pk):
     return render(request, 'doctor/delete_task.html', {'task': task})
 
 @login_required
+@query_budget(6)
 def manage_nurses(request):
     """View for managing nurse assignments"""
     if request.user.user_type != 'DOCTOR':
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     if request.method == 'POST':
         form = NurseAssignmentForm(request.POST)
@@ -1032,7 +1089,9 @@ def manage_nurses(request):
         form = NurseAssignmentForm()
     
     # Get all nurse assignments for the doctor
-    assignments = NurseAssignment.objects.filter(doctor=doctor_profile).order_by('-is_active', '-start_date')
+    assignments = NurseAssignment.objects.filter(
+        doctor=doctor_profile
+    ).select_related('nurse__user').order_by('-is_active', '-start_date')
     
     context = {
         'form': form,
@@ -1048,7 +1107,7 @@ def remove_nurse(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     assignment = get_object_or_404(NurseAssignment, pk=pk, doctor=doctor_profile)
     
     if request.method == 'POST':
@@ -1067,11 +1126,11 @@ def create_referral(request, patient_id):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     patient = get_object_or_404(PatientProfile, pk=patient_id)
     
     # Check if this doctor has treated this patient before
-    has_treated = Appointment.objects.filter(doctor=doctor_profile, patient=patient).exists()
+    has_treated = DoctorPatient.objects.filter(doctor=doctor_profile, patient=patient).exists()
     if not has_treated:
         messages.error(request, "You don't have permission to create a referral for this patient.")
         return redirect('doctor:patients')
@@ -1096,19 +1155,24 @@ def create_referral(request, patient_id):
     return render(request, 'doctor/create_referral.html', context)
 
 @login_required
+@query_budget(6)
 def referrals(request):
     """View for managing referrals"""
     if request.user.user_type != 'DOCTOR':
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     
     # Get referrals made by this doctor
-    outgoing_referrals = Referral.objects.filter(referring_doctor=doctor_profile).order_by('-referral_date')
+    outgoing_referrals = Referral.objects.filter(
+        referring_doctor=doctor_profile
+    ).for_list().select_related('patient__user', 'referred_to_doctor__user').order_by('-referral_date')
     
     # Get referrals made to this doctor
-    incoming_referrals = Referral.objects.filter(referred_to_doctor=doctor_profile).order_by('-referral_date')
+    incoming_referrals = Referral.objects.filter(
+        referred_to_doctor=doctor_profile
+    ).for_list().select_related('patient__user', 'referring_doctor__user').order_by('-referral_date')
     
     context = {
         'outgoing_referrals': outgoing_referrals,
@@ -1124,7 +1188,7 @@ def referral_detail(request, pk):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     referral = get_object_or_404(
         Referral.objects.filter(
             Q(referring_doctor=doctor_profile) | Q(referred_to_doctor=doctor_profile),
@@ -1169,7 +1233,7 @@ def generate_bill(request, prescription_id):
         messages.error(request, "Access denied. Doctor access only.")
         return redirect('accounts:home')
     
-    doctor_profile = get_object_or_404(DoctorProfile, user=request.user)
+    doctor_profile = get_acting_doctor(request)
     prescription = get_object_or_404(Prescription, pk=prescription_id, doctor=doctor_profile)
     
     # Check if bill already exists
@@ -1280,4 +1344,39 @@ def delete_prescription_item(request, pk):
         messages.success(request, "Medicine removed from prescription")
         return redirect('doctor:edit_prescription', pk=prescription_id)
     
-    return render(request, 'doctor/delete_prescription_item.html', {'item': item})
\ No newline at end of file
+    return render(request, 'doctor/delete_prescription_item.html', {'item': item})
+
+@login_required
+def prescription_items_batch(request, pk):
+    """Add, update and remove several medicines of a prescription in one JSON request"""
+    if request.user.user_type != 'DOCTOR':
+        return JsonResponse({'error': "Doctor access only."}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': "POST the changes as JSON."}, status=405)
+    
+    doctor_profile = get_acting_doctor(request)
+    prescription = get_object_or_404(Prescription, pk=pk, doctor=doctor_profile)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': "Invalid JSON."}, status=400)
+    try:
+        added, updated, deleted = apply_item_batch(prescription, payload)
+    except ItemBatchError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+    
+    items = prescription.items.select_related('medicine').order_by('id')
+    return JsonResponse({
+        'added': added,
+        'updated': updated,
+        'deleted': deleted,
+        'items': [
+            {
+                'id': item.pk, 'medicine': item.medicine_id, 'medicine_name': item.medicine.name,
+                'dosage': item.dosage, 'duration': item.duration, 'quantity': item.quantity,
+                'instructions': item.instructions,
+            }
+            for item in items
+        ],
+    })
\ No newline at end of file
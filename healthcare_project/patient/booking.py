@@ -0,0 +1,56 @@
+# patient/booking.py
+
+import time
+
+from django.conf import settings
+from django.db import transaction, IntegrityError, OperationalError
+
+from .models import Appointment, ACTIVE_APPOINTMENT_STATUSES
+
+# Attempts made when the database is briefly locked by a concurrent writer
+BOOKING_ATTEMPTS = getattr(settings, 'BOOKING_ATTEMPTS', 5)
+BOOKING_RETRY_DELAY = getattr(settings, 'BOOKING_RETRY_DELAY', 0.05)
+
+class SlotTaken(Exception):
+    """Raised when another active appointment already holds the requested slot."""
+
+def _slot_is_held(doctor, appointment_date, appointment_time):
+    """True when an active appointment holds the slot, i.e. ``appt_unique_active_slot`` refused the insert"""
+    return Appointment.objects.filter(
+        doctor=doctor,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+    ).exists()
+
+def book_appointment(patient, doctor, appointment_date, appointment_time, reason, **fields):
+    """
+    Atomically book a slot and return the new appointment.
+
+    The insert is guarded by the conditional unique constraint on active
+    appointments, so of several concurrent bookings for one slot exactly one
+    succeeds and the others raise SlotTaken. Lock contention is retried with
+    a short backoff before giving up.
+    """
+    for attempt in range(BOOKING_ATTEMPTS):
+        try:
+            try:
+                with transaction.atomic():
+                    return Appointment.objects.create(
+                        patient=patient,
+                        doctor=doctor,
+                        appointment_date=appointment_date,
+                        appointment_time=appointment_time,
+                        reason=reason,
+                        status='SCHEDULED',
+                        **fields
+                    )
+            except IntegrityError:
+                # Any other integrity error is a bug, not a lost race
+                if not _slot_is_held(doctor, appointment_date, appointment_time):
+                    raise
+                raise SlotTaken("This time slot has just been booked by someone else.")
+        except OperationalError:
+            if attempt == BOOKING_ATTEMPTS - 1:
+                raise
+            time.sleep(BOOKING_RETRY_DELAY * (attempt + 1))
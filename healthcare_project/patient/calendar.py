@@ -0,0 +1,100 @@
+# patient/calendar.py
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from doctor.availability import SLOT_MINUTES
+from .models import Appointment
+
+# Appointments older than this many days are left out of the feeds
+CALENDAR_HISTORY_DAYS = getattr(settings, 'CALENDAR_HISTORY_DAYS', 90)
+CALENDAR_CHUNK_SIZE = 500
+
+FEED_FIELDS = (
+    'id', 'appointment_date', 'appointment_time', 'status', 'reason', 'updated_at',
+    'doctor__user__first_name', 'doctor__user__last_name', 'doctor__specialization',
+    'patient__user__first_name', 'patient__user__last_name',
+)
+
+def feed_queryset(user):
+    """Appointments shown in ``user``'s feed, or None if their role has no feed."""
+    profile = user.get_role_specific_profile()
+    if profile is None or user.user_type not in ('DOCTOR', 'PATIENT'):
+        return None
+    since = timezone.localdate() - timedelta(days=CALENDAR_HISTORY_DAYS)
+    appointments = Appointment.objects.filter(appointment_date__gte=since)
+    if user.user_type == 'DOCTOR':
+        return appointments.filter(doctor=profile)
+    return appointments.filter(patient=profile)
+
+def feed_version(appointments):
+    """
+    ETag of a feed, from one aggregate over ``updated_at``.
+
+    There is deliberately no Last-Modified: the newest ``updated_at`` does not
+    move when an appointment is deleted or leaves the feed, so a client
+    polling with If-Modified-Since would keep a stale copy. The count in the
+    ETag does change.
+    """
+    stats = appointments.order_by().aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    stamp = stats['last_modified'].timestamp() if stats['last_modified'] else 0
+    return f'"{stats["count"]}-{stamp}"'
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def _fold(line):
+    """Fold a content line to 75 octets as RFC 5545 requires."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _event(row, user, host):
+    start = timezone.make_aware(datetime.combine(row['appointment_date'], row['appointment_time']))
+    end = start + timedelta(minutes=SLOT_MINUTES)
+    doctor = f"Dr. {row['doctor__user__first_name']} {row['doctor__user__last_name']}".strip()
+    patient = f"{row['patient__user__first_name']} {row['patient__user__last_name']}".strip()
+    summary = f"Appointment with {patient}" if user.user_type == 'DOCTOR' else f"Appointment with {doctor}"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:appointment-{row['id']}@{host}",
+        f"DTSTAMP:{_utc(row['updated_at'])}",
+        f"LAST-MODIFIED:{_utc(row['updated_at'])}",
+        f"DTSTART:{_utc(start)}",
+        f"DTEND:{_utc(end)}",
+        f"SUMMARY:{_escape(summary)}",
+        f"DESCRIPTION:{_escape(row['reason'])}",
+        f"CATEGORIES:{_escape(row['doctor__specialization'])}",
+        f"STATUS:{'CANCELLED' if row['status'] == 'CANCELLED' else 'CONFIRMED'}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+def stream_calendar(user, appointments, host):
+    """Yield an iCalendar document for ``appointments`` one event at a time."""
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//Healthcare//Appointments//EN')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold(f"X-WR-CALNAME:{_escape(user.get_full_name() or user.email)} - Appointments")
+    rows = appointments.order_by('appointment_date', 'appointment_time').values(*FEED_FIELDS)
+    for row in rows.iterator(chunk_size=CALENDAR_CHUNK_SIZE):
+        yield _event(row, user, host)
+    yield _fold('END:VCALENDAR')
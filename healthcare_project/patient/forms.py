@@ -7,11 +7,12 @@ from .models import (
     PrescriptionItem, Bill, Insurance, InsuranceClaim
 )
 from accounts.models import DoctorProfile
+from doctor.availability import get_availability
 
 class AppointmentForm(forms.ModelForm):
     """Form for booking appointments"""
     doctor = forms.ModelChoiceField(
-        queryset=DoctorProfile.objects.all(),
+        queryset=DoctorProfile.objects.select_related('user'),
         empty_label="Select Doctor",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -31,6 +32,11 @@ class AppointmentForm(forms.ModelForm):
     class Meta:
         model = Appointment
         fields = ['doctor', 'appointment_date', 'appointment_time', 'reason']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Free start times for the chosen doctor and date, filled in by clean()
+        self.available_slots = []
         
     def clean_appointment_date(self):
         date = self.cleaned_data.get('appointment_date')
@@ -45,19 +51,23 @@ class AppointmentForm(forms.ModelForm):
         time = cleaned_data.get('appointment_time')
         
         if doctor and date and time:
-            # Check if doctor is available on this day
-            day_name = date.strftime('%A')
-            if doctor.available_days and day_name not in doctor.available_days:
-                raise forms.ValidationError(f"Doctor is not available on {day_name}s.")
+            availability = get_availability(doctor, date)
+            self.available_slots = availability.free_slots(date)
+            
+            # Check if doctor works on this day
+            if availability.is_on_leave(date):
+                raise forms.ValidationError(f"Doctor is on leave on {date:%B %d, %Y}.")
+            if not availability.working_hours(date):
+                raise forms.ValidationError(f"Doctor is not available on {date:%A}s.")
             
-            # Check if the slot is already booked
-            if Appointment.objects.filter(
-                doctor=doctor,
-                appointment_date=date,
-                appointment_time=time,
-                status='SCHEDULED'
-            ).exists():
-                raise forms.ValidationError("This time slot is already booked. Please select another time.")
+            # Check if the slot is free
+            if not availability.is_free(date, time):
+                if not self.available_slots:
+                    raise forms.ValidationError("There are no free time slots left on this day. Please select another date.")
+                suggestions = ', '.join(slot.strftime('%H:%M') for slot in self.available_slots[:5])
+                raise forms.ValidationError(
+                    f"This time slot is not available. Free times on this day include: {suggestions}."
+                )
         
         return cleaned_data
 
@@ -2,6 +2,12 @@
 
 from django.db import models
 from accounts.models import User, PatientProfile, DoctorProfile
+from accounts.previews import with_previews
+
+class MedicalRecordQuerySet(models.QuerySet):
+    def for_list(self):
+        """Defer the free-text columns in favour of short previews (see accounts.previews)"""
+        return with_previews(self, 'diagnosis', 'symptoms', 'treatment', 'notes')
 
 class MedicalRecord(models.Model):
     """Model for storing patient's medical records"""
@@ -14,11 +20,28 @@ class MedicalRecord(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
     
+    objects = MedicalRecordQuerySet.as_manager()
+    
     def __str__(self):
         return f"Medical Record for {self.patient.user.get_full_name()} - {self.date_created.strftime('%Y-%m-%d')}"
     
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['doctor', '-date_created'], name='record_doctor_created_idx'),
+            models.Index(fields=['patient', '-date_created'], name='record_patient_created_idx'),
+            # Change scans of the operational rollups (see admin_panel.rollups)
+            models.Index(fields=['date_updated'], name='record_updated_idx'),
+            models.Index(fields=['date_created'], name='record_created_idx'),
+        ]
+
+# Appointment statuses that occupy the doctor's time slot
+ACTIVE_APPOINTMENT_STATUSES = ('SCHEDULED',)
+
+class AppointmentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Defer the free-text columns in favour of short previews (see accounts.previews)"""
+        return with_previews(self, 'reason', 'notes')
 
 class Appointment(models.Model):
     """Model for scheduling appointments between patients and doctors"""
@@ -28,6 +51,7 @@ class Appointment(models.Model):
         ('CANCELLED', 'Cancelled'),
         ('NO_SHOW', 'No Show'),
     )
+    ACTIVE_STATUSES = ACTIVE_APPOINTMENT_STATUSES
     
     patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='appointments')
     doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='appointments')
@@ -39,12 +63,33 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AppointmentQuerySet.as_manager()
+    
     def __str__(self):
         return f"Appointment: {self.patient.user.get_full_name()} with Dr. {self.doctor.user.get_full_name()} on {self.appointment_date} at {self.appointment_time}"
     
     class Meta:
         ordering = ['appointment_date', 'appointment_time']
-        unique_together = ('doctor', 'appointment_date', 'appointment_time')
+        constraints = [
+            # Only active appointments hold a slot, so cancelled slots can be rebooked
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                name='appt_unique_active_slot',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_date_time_idx'),
+            models.Index(fields=['patient', 'status', 'appointment_date', 'appointment_time'], name='appt_patient_status_date_idx'),
+            # A patient's history with one doctor (see doctor.history)
+            models.Index(fields=['patient', 'doctor', '-appointment_date', '-appointment_time'], name='appt_patient_doctor_date_idx'),
+            # Covering indexes for the calendar feeds' change checks (see patient.calendar)
+            models.Index(fields=['doctor', 'appointment_date', 'updated_at'], name='appt_doctor_feed_idx'),
+            models.Index(fields=['patient', 'appointment_date', 'updated_at'], name='appt_patient_feed_idx'),
+            # Change scans and day recomputes of the operational rollups (see admin_panel.rollups)
+            models.Index(fields=['updated_at'], name='appt_updated_idx'),
+            models.Index(fields=['appointment_date'], name='appt_date_idx'),
+        ]
 
 class Prescription(models.Model):
     """Model for storing prescriptions"""
@@ -63,6 +108,16 @@ class Prescription(models.Model):
     
     class Meta:
         ordering = ['-date_prescribed']
+        indexes = [
+            models.Index(fields=['patient', '-date_prescribed'], name='rx_patient_date_idx'),
+            # Boolean filters compile to a bare column test, which only a partial index can serve
+            models.Index(
+                fields=['patient', '-date_prescribed'],
+                condition=models.Q(is_active=True),
+                name='rx_patient_active_date_idx',
+            ),
+            models.Index(fields=['doctor', '-date_prescribed'], name='rx_doctor_date_idx'),
+        ]
 
 class Medicine(models.Model):
     """Model for storing medicine information"""
@@ -130,6 +185,13 @@ class Bill(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'status', 'due_date'], name='bill_patient_status_due_idx'),
+            models.Index(fields=['patient', '-created_at'], name='bill_patient_created_idx'),
+            models.Index(fields=['updated_at'], name='bill_updated_idx'),
+            models.Index(fields=['created_at'], name='bill_created_idx'),
+            models.Index(fields=['status', 'payment_date'], name='bill_status_paid_idx'),
+        ]
 
 class Insurance(models.Model):
     """Model for storing insurance information"""
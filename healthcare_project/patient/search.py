@@ -0,0 +1,145 @@
+# patient/search.py
+
+import re
+
+from django.conf import settings
+from django.db import connection, OperationalError
+from django.db.models import Case, Count, Q, When
+
+from accounts.cache import LRUCache
+from accounts.models import User, DoctorProfile
+
+# FTS5 shadow table of the doctor directory; rowid is the DoctorProfile id
+SEARCH_TABLE = 'patient_doctor_search'
+
+# Cap on ranked matches returned by a free-text search
+SEARCH_RESULT_LIMIT = getattr(settings, 'DOCTOR_SEARCH_RESULT_LIMIT', 200)
+
+# Name matches rank above specialization matches
+_RANK = f'bm25({SEARCH_TABLE}, 10.0, 10.0, 5.0)'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Specialization facet counts change only when a doctor profile does; signals
+# clear this cache and the TTL bounds staleness across worker processes.
+_facets = LRUCache(maxsize=1, ttl=getattr(settings, 'DOCTOR_SEARCH_FACET_TTL', 300))
+
+def search_available():
+    """True when the database supports the FTS5 search index."""
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, '_doctor_search_fts5'):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                connection._doctor_search_fts5 = bool(cursor.fetchone()[0])
+        except OperationalError:
+            connection._doctor_search_fts5 = False
+    return connection._doctor_search_fts5
+
+def ensure_index():
+    """Create the search table if it does not exist yet."""
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "first_name, last_name, specialization, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+def _reindex(where='', params=()):
+    """Replace the index rows of the doctor profiles matching ``where``."""
+    if not search_available():
+        return
+    doctors = DoctorProfile._meta.db_table
+    users = User._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM {doctors} d {where})", params
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, first_name, last_name, specialization) "
+            f"SELECT d.id, u.first_name, u.last_name, d.specialization "
+            f"FROM {doctors} d INNER JOIN {users} u ON u.id = d.user_id {where}",
+            params
+        )
+
+def rebuild_index():
+    """Rebuild the whole search table from the doctor profiles."""
+    if not search_available():
+        return
+    ensure_index()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    _reindex()
+
+def index_doctor(doctor_id):
+    _reindex('WHERE d.id = %s', [doctor_id])
+
+def index_user(user_id):
+    _reindex('WHERE d.user_id = %s', [user_id])
+
+def remove_doctor(doctor_id):
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [doctor_id])
+
+def build_match(query):
+    """
+    Turn free text into an FTS5 query where every word must match as a prefix.
+
+    Words are quoted so FTS5 operators typed by the user are taken literally.
+    Returns None when the text has no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def _ranked_ids(match):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY {_RANK} LIMIT %s",
+            [match, SEARCH_RESULT_LIMIT]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def search_doctors(query='', specialization=''):
+    """Return doctor profiles matching ``query``, best matches first."""
+    doctors = DoctorProfile.objects.select_related('user')
+    if specialization:
+        doctors = doctors.filter(specialization__icontains=specialization)
+
+    match = build_match(query)
+    if match is None:
+        return doctors.order_by('user__last_name', 'user__first_name')
+
+    if not search_available():
+        return doctors.filter(
+            Q(user__first_name__icontains=query) |
+            Q(user__last_name__icontains=query) |
+            Q(specialization__icontains=query)
+        ).order_by('user__last_name', 'user__first_name')
+
+    ids = _ranked_ids(match)
+    if not ids:
+        return doctors.none()
+    rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+    return doctors.filter(pk__in=ids).order_by(rank)
+
+def specialization_facets():
+    """Return ``[(specialization, doctor count), ...]`` sorted by name, cached."""
+    facets = _facets.get('facets')
+    if facets is None:
+        facets = [
+            (row['specialization'], row['count'])
+            for row in DoctorProfile.objects.values('specialization')
+            .annotate(count=Count('id')).order_by('specialization')
+        ]
+        _facets.set('facets', facets)
+    return facets
+
+def invalidate_facets():
+    _facets.clear()
@@ -0,0 +1,70 @@
+# patient/signals.py
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import User, DoctorProfile
+from . import search, summary
+from .models import Appointment, Prescription, PrescriptionItem, MedicalRecord, Bill, InsuranceClaim
+
+@receiver(post_save, sender=DoctorProfile)
+def doctor_profile_saved(sender, instance, **kwargs):
+    search.index_doctor(instance.pk)
+    search.invalidate_facets()
+
+@receiver(post_delete, sender=DoctorProfile)
+def doctor_profile_deleted(sender, instance, **kwargs):
+    search.remove_doctor(instance.pk)
+    search.invalidate_facets()
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    """Pick up doctor name changes"""
+    if instance.user_type == 'DOCTOR':
+        search.index_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=Prescription)
+@receiver([post_save, post_delete], sender=MedicalRecord)
+@receiver([post_save, post_delete], sender=Bill)
+def patient_data_changed(sender, instance, **kwargs):
+    summary.invalidate(instance.patient_id)
+
+def touch_medical_record(record_id):
+    """Bump a record's change timestamp so cached copies of its detail page go stale"""
+    MedicalRecord.objects.filter(pk=record_id).update(date_updated=timezone.now())
+
+def touch_prescription(prescription_id):
+    """Bump a prescription's, and its record's, change timestamp"""
+    now = timezone.now()
+    Prescription.objects.filter(pk=prescription_id).update(updated_at=now)
+    MedicalRecord.objects.filter(prescriptions=prescription_id).update(date_updated=now)
+
+# Detail pages answer conditional GETs from their object's own timestamp
+# (see accounts.decorators.conditional_detail); rows shown alongside it
+# touch that timestamp when they change
+
+@receiver([post_save, post_delete], sender=PrescriptionItem)
+def prescription_item_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_prescription(instance.prescription_id)
+
+@receiver([post_save, post_delete], sender=Prescription)
+def prescription_changed(sender, instance, raw=False, **kwargs):
+    if not raw and instance.medical_record_id:
+        touch_medical_record(instance.medical_record_id)
+
+@receiver([post_save, post_delete], sender=Bill)
+def bill_changed(sender, instance, raw=False, **kwargs):
+    if not raw and instance.prescription_id:
+        touch_prescription(instance.prescription_id)
+
+@receiver([post_save, post_delete], sender=InsuranceClaim)
+def insurance_claim_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Bill.objects.filter(pk=instance.bill_id).update(updated_at=timezone.now())
+
+def rebuild_search_index(sender, **kwargs):
+    """Create and fill the doctor search table after ``migrate``"""
+    search.rebuild_index()
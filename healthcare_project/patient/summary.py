@@ -0,0 +1,112 @@
+# patient/summary.py
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, DateField, DateTimeField, DecimalField, F, TextField, TimeField, Value
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from accounts.cache import VersionedCache
+from accounts.previews import PREVIEW_LENGTH
+from .models import Appointment, Prescription, MedicalRecord, Bill
+
+SUMMARY_LIMIT = 5
+
+# Summaries are invalidated by signals; the timeout only bounds staleness of
+# data the signals do not cover, such as doctor names
+_summaries = VersionedCache('summary:patient', timeout=getattr(settings, 'PATIENT_SUMMARY_CACHE_TTL', 300))
+
+SECTIONS = {
+    'appointment': 'upcoming_appointments',
+    'prescription': 'recent_prescriptions',
+    'record': 'recent_medical_records',
+    'bill': 'pending_bills',
+}
+
+def _null(field):
+    return Value(None, output_field=field)
+
+def _row(queryset, kind, day, title, state, at=None, created=None, total=None, doctor='doctor'):
+    """Project one section onto the shared column layout of the summary query."""
+    if doctor == 'doctor':
+        first, last, specialization = F('doctor__user__first_name'), F('doctor__user__last_name'), F('doctor__specialization')
+    else:
+        first, last, specialization = (
+            Coalesce(f'appointment__doctor__{name}', f'prescription__doctor__{name}')
+            for name in ('user__first_name', 'user__last_name', 'specialization')
+        )
+    # Parts of a compound query cannot carry Meta.ordering either
+    return queryset.order_by().values(
+        kind=Value(kind, output_field=CharField()),
+        ref=F('id'),
+        day=F(day) if day else _null(DateField()),
+        at=F(at) if at else _null(TimeField()),
+        created=F(created) if created else _null(DateTimeField()),
+        # Free text is cut short in the database, like list pages do (see accounts.previews)
+        title=Substr(title, 1, PREVIEW_LENGTH + 1) if title else _null(TextField()),
+        state=F(state) if state else _null(CharField()),
+        total=F(total) if total else _null(DecimalField(max_digits=10, decimal_places=2)),
+        doctor_first=first,
+        doctor_last=last,
+        specialization=specialization,
+    )
+
+def _top(queryset, *ordering):
+    # Compound queries cannot slice their parts, so each part keeps its
+    # first rows through a LIMIT subquery on the primary key instead
+    return queryset.model.objects.filter(pk__in=queryset.order_by(*ordering).values('pk')[:SUMMARY_LIMIT])
+
+def _build_summary(patient, today):
+    appointments = _top(Appointment.objects.filter(
+        patient=patient, appointment_date__gte=today, status='SCHEDULED'
+    ), 'appointment_date', 'appointment_time')
+    prescriptions = _top(Prescription.objects.filter(
+        patient=patient, is_active=True
+    ), '-date_prescribed', '-id')
+    records = _top(MedicalRecord.objects.filter(patient=patient), '-date_created')
+    bills = _top(Bill.objects.filter(patient=patient, status='PENDING'), 'due_date')
+
+    rows = _row(appointments, 'appointment', 'appointment_date', 'reason', 'status', at='appointment_time').union(
+        _row(prescriptions, 'prescription', 'date_prescribed', 'notes', None, created='created_at'),
+        _row(records, 'record', None, 'diagnosis', None, created='date_created'),
+        _row(bills, 'bill', 'due_date', 'description', 'status', total='total_amount', doctor='bill'),
+        all=True,
+    )
+
+    summary = {section: [] for section in SECTIONS.values()}
+    for row in rows:
+        kind = row.pop('kind')
+        first, last, specialization = row.pop('doctor_first'), row.pop('doctor_last'), row.pop('specialization')
+        item = {'id': row.pop('ref')}
+        item.update((key, value) for key, value in row.items() if value is not None)
+        if first is not None:
+            item['doctor'] = f"Dr. {first} {last}".strip()
+            item['specialization'] = specialization
+        summary[SECTIONS[kind]].append(item)
+
+    summary['upcoming_appointments'].sort(key=lambda item: (item['day'], item['at']))
+    summary['recent_prescriptions'].sort(key=lambda item: (item['day'], item['id']), reverse=True)
+    summary['recent_medical_records'].sort(key=lambda item: item['created'], reverse=True)
+    summary['pending_bills'].sort(key=lambda item: item['day'])
+    return summary
+
+def get_patient_summary(patient):
+    """
+    Return the (cached) dashboard lists for ``patient`` as plain dicts:
+    upcoming appointments, active prescriptions, recent records and pending
+    bills, with doctor names already joined in. A miss costs one UNION ALL
+    query.
+    """
+    today = timezone.localdate()
+    summary = _summaries.get(patient.pk)
+    # "Upcoming" moves at midnight
+    if summary is None or summary['today'] != today:
+        summary = dict(_build_summary(patient, today), today=today)
+        _summaries.set(patient.pk, summary)
+    return summary
+
+def invalidate(patient_id):
+    # After the commit, so a summary rebuilt meanwhile cannot cache the old rows
+    transaction.on_commit(partial(_summaries.invalidate, patient_id))
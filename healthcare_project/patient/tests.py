@@ -1,3 +1,449 @@
-from django.test import TestCase
+# patient/tests.py
 
-# Create your tests here.
+import json
+import threading
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db import connection, connections, IntegrityError
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.formats import localize
+
+from accounts.models import User, PatientProfile, DoctorProfile, CalendarToken
+from accounts.previews import PREVIEW_LENGTH
+from . import search, summary, views
+from .booking import book_appointment, SlotTaken
+from .models import MedicalRecord, Appointment, Prescription, PrescriptionItem, Medicine, Bill
+
+# Tables expected to grow large; reading any of them with a full scan fails the test
+HOT_TABLES = (
+    'patient_appointment',
+    'patient_medicalrecord',
+    'patient_prescription',
+    'patient_bill',
+    'doctor_task',
+    'doctor_doctorpatient',
+)
+
+def evaluating_render(request, template_name, context=None, *args, **kwargs):
+    """Stand-in for ``render`` that runs the context's queries without a template"""
+    for value in (context or {}).values():
+        if isinstance(value, (QuerySet, Page)):
+            list(value)
+    return HttpResponse()
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryPlanTestCase(TestCase):
+    """Base class that checks the SQL a view runs against EXPLAIN QUERY PLAN and its query budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.factory = RequestFactory()
+        cls.doctors = []
+        cls.patients = []
+        for i in range(3):
+            user = User.objects.create(
+                email=f'doctor{i}@example.com', first_name='Doctor', last_name=str(i), user_type='DOCTOR'
+            )
+            cls.doctors.append(DoctorProfile.objects.create(
+                user=user, specialization='Cardiology', qualification='MD', license_number=f'LIC{i}'
+            ))
+        for i in range(5):
+            user = User.objects.create(
+                email=f'patient{i}@example.com', first_name='Patient', last_name=str(i), user_type='PATIENT'
+            )
+            cls.patients.append(PatientProfile.objects.create(user=user))
+
+        today = timezone.now().date()
+        for day in range(-10, 10):
+            for i, patient in enumerate(cls.patients):
+                doctor = cls.doctors[i % len(cls.doctors)]
+                Appointment.objects.create(
+                    patient=patient,
+                    doctor=doctor,
+                    appointment_date=today + timedelta(days=day),
+                    appointment_time=time(9 + i),
+                    reason='Checkup',
+                    status='SCHEDULED' if day >= 0 else 'COMPLETED',
+                )
+                if day % 5 == 0:
+                    record = MedicalRecord.objects.create(
+                        patient=patient, doctor=doctor, diagnosis='Flu', symptoms='Fever', treatment='Rest'
+                    )
+                    prescription = Prescription.objects.create(
+                        patient=patient, doctor=doctor, medical_record=record
+                    )
+                    Bill.objects.create(
+                        patient=patient, prescription=prescription, amount=100, total_amount=100,
+                        due_date=today + timedelta(days=day)
+                    )
+
+    def setUp(self):
+        # Cached snapshots would otherwise let a view skip the queries under test
+        cache.clear()
+
+    def get_request(self, user, path='/', **params):
+        request = self.factory.get(path, params)
+        request.user = user
+        return request
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, view, request, *args, **kwargs):
+        """Run ``view`` and fail if any of its queries scans a hot table end to end"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are SQLite specific')
+
+        with mock.patch(f'{view.__module__}.render', side_effect=evaluating_render):
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, *args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(table in sql for table in HOT_TABLES):
+                continue
+            checked += 1
+            for detail in self.explain(sql):
+                words = detail.split()
+                if words[0] == 'SCAN' and words[1].strip('"') in HOT_TABLES:
+                    self.fail(f'Full scan of {words[1]} ({detail}) in query:\n{sql}')
+        self.assertGreater(checked, 0, 'The view did not query any hot table')
+
+class PatientViewQueryPlanTests(QueryPlanTestCase):
+    """The patient dashboard and list pages only read hot tables through indexes"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.patients[0].user
+
+    def test_dashboard(self):
+        self.assertNoFullScans(views.dashboard, self.get_request(self.user))
+
+    def test_dashboard_template_renders_the_summary(self):
+        self.client.force_login(self.user)
+        with self.settings(QUERY_BUDGET_ENFORCE=True):
+            response = self.client.get(reverse('patient:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        appointment = Appointment.objects.filter(
+            patient=self.patients[0], status='SCHEDULED'
+        ).order_by('appointment_date', 'appointment_time').first()
+        self.assertContains(response, f'<td>{localize(appointment.appointment_date)}</td>', html=True)
+        self.assertContains(response, f'<td>{localize(appointment.appointment_time)}</td>', html=True)
+        self.assertContains(response, '<td>Dr. Doctor 0</td>', html=True)
+        self.assertNotContains(response, 'Dr. </')
+        self.assertContains(response, 'Flu')
+        self.assertContains(response, '<td>$100.00</td>', html=True)
+
+    def test_summary_is_one_query_and_cached(self):
+        patient = self.patients[0]
+        with self.assertNumQueries(1):
+            first = summary.get_patient_summary(patient)
+        with self.assertNumQueries(0):
+            summary.get_patient_summary(patient)
+
+        upcoming = first['upcoming_appointments']
+        self.assertEqual(len(upcoming), 5)
+        self.assertEqual(upcoming, sorted(upcoming, key=lambda item: (item['day'], item['at'])))
+        self.assertTrue(upcoming[0]['doctor'].startswith('Dr. Doctor'))
+        self.assertEqual(len(first['recent_medical_records']), 4)
+        self.assertEqual(len(first['pending_bills']), 4)
+        self.assertEqual(first['pending_bills'][0]['doctor'], upcoming[0]['doctor'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Bill.objects.filter(patient=patient).first().delete()
+        # Still cached until the delete is committed
+        self.assertEqual(len(summary.get_patient_summary(patient)['pending_bills']), 4)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(summary.get_patient_summary(patient)['pending_bills']), 3)
+
+    def test_summary_json(self):
+        response = views.dashboard_summary(self.get_request(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b': ', response.content)
+        payload = json.loads(response.content)
+        self.assertEqual(set(payload), set(summary.SECTIONS.values()))
+        self.assertNotIn('total', payload['upcoming_appointments'][0])
+        self.assertEqual(Decimal(payload['pending_bills'][0]['total']), 100)
+
+    def test_appointments(self):
+        self.assertNoFullScans(views.appointments, self.get_request(self.user))
+
+    def test_appointments_template_renders_previews_within_budget(self):
+        # Real template: reading the deferred ``reason`` would cost a query per
+        # row. Session, user and the booking form's doctor choices are fixed.
+        self.client.force_login(self.user)
+        with self.settings(QUERY_BUDGET_ENFORCE=True):
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('patient:appointments'))
+        self.assertContains(response, 'Checkup')
+
+    def test_medical_records(self):
+        self.assertNoFullScans(views.medical_records, self.get_request(self.user))
+
+    def test_prescriptions(self):
+        self.assertNoFullScans(views.prescriptions, self.get_request(self.user))
+        self.assertNoFullScans(views.prescriptions, self.get_request(self.user, status='active'))
+
+    def test_bills(self):
+        self.assertNoFullScans(views.bills, self.get_request(self.user))
+        self.assertNoFullScans(views.bills, self.get_request(self.user, status='pending'))
+
+class DoctorSearchTests(TestCase):
+    """The doctor directory search index follows profile and name changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = {}
+        for first, last, specialization in [
+            ('Anna', 'Cardin', 'Dermatology'),
+            ('Bruno', 'Smith', 'Cardiology'),
+            ('Carla', 'Jones', 'Cardiology'),
+        ]:
+            user = User.objects.create(
+                email=f'{first.lower()}@example.com', first_name=first, last_name=last, user_type='DOCTOR'
+            )
+            cls.doctors[first] = DoctorProfile.objects.create(
+                user=user, specialization=specialization, qualification='MD', license_number=first
+            )
+
+    def setUp(self):
+        if not search.search_available():
+            self.skipTest('SQLite FTS5 is not available')
+        # Rolled back test data never reaches the facet cache's signals
+        search.invalidate_facets()
+
+    def test_prefix_match_ranks_names_first(self):
+        results = list(search.search_doctors('card'))
+        self.assertEqual(results[0], self.doctors['Anna'])
+        self.assertEqual(set(results), set(self.doctors.values()))
+
+    def test_every_word_must_match(self):
+        self.assertEqual(list(search.search_doctors('car jon')), [self.doctors['Carla']])
+        self.assertEqual(list(search.search_doctors('"OR*')), [])
+
+    def test_index_follows_updates(self):
+        user = self.doctors['Bruno'].user
+        user.last_name = 'Walker'
+        user.save()
+        self.assertEqual(list(search.search_doctors('walk')), [self.doctors['Bruno']])
+
+        self.doctors['Bruno'].delete()
+        self.assertEqual(list(search.search_doctors('walk')), [])
+
+    def test_specialization_facets(self):
+        self.assertEqual(search.specialization_facets(), [('Cardiology', 2), ('Dermatology', 1)])
+        self.doctors['Anna'].specialization = 'Cardiology'
+        self.doctors['Anna'].save()
+        self.assertEqual(search.specialization_facets(), [('Cardiology', 3)])
+
+class BookingTests(TestCase):
+    """Booking holds a slot only while the appointment is active"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patients = [
+            PatientProfile.objects.create(user=User.objects.create(email=f'pat{i}@example.com', user_type='PATIENT'))
+            for i in range(2)
+        ]
+        cls.slot = (timezone.localdate() + timedelta(days=1), time(9))
+
+    def test_taken_slot_raises(self):
+        book_appointment(self.patients[0], self.doctor, *self.slot, reason='Checkup')
+        with self.assertRaises(SlotTaken):
+            book_appointment(self.patients[1], self.doctor, *self.slot, reason='Checkup')
+
+    def test_other_integrity_errors_are_not_slot_taken(self):
+        with self.assertRaises(IntegrityError):
+            book_appointment(self.patients[0], self.doctor, *self.slot, reason=None)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        appointment = book_appointment(self.patients[0], self.doctor, *self.slot, reason='Checkup')
+        appointment.status = 'CANCELLED'
+        appointment.save()
+        book_appointment(self.patients[1], self.doctor, *self.slot, reason='Checkup')
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor, status='SCHEDULED').count(), 1)
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel bookings of one slot: exactly one wins, the rest get SlotTaken"""
+
+    THREADS = 8
+
+    def test_parallel_bookings(self):
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        patients = [
+            PatientProfile.objects.create(user=User.objects.create(email=f'pat{i}@example.com', user_type='PATIENT'))
+            for i in range(self.THREADS)
+        ]
+        slot = (timezone.localdate() + timedelta(days=1), time(9))
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+
+        def book(patient):
+            try:
+                barrier.wait()
+                book_appointment(patient, doctor, *slot, reason='Checkup')
+                outcomes.append('booked')
+            except SlotTaken:
+                outcomes.append('taken')
+            except Exception as e:
+                outcomes.append(repr(e))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['booked'] + ['taken'] * (self.THREADS - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor, status='SCHEDULED').count(), 1)
+
+class AppointmentCalendarTests(TestCase):
+    """The token authenticated .ics feed streams events and answers polls with 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', first_name='Ann', last_name='Lee', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create(email='pat@example.com', first_name='Bob', last_name='Ray', user_type='PATIENT')
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, reason='Chest pain; follow-up, week 2',
+            appointment_date=timezone.localdate() + timedelta(days=1), appointment_time=time(9),
+        )
+        cls.token = CalendarToken.objects.create(user=cls.patient.user)
+        cls.url = reverse('patient:appointment_calendar', args=[cls.token.token])
+
+    def test_feed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:appointment-{self.appointment.pk}@testserver\r\n', body)
+        self.assertIn('SUMMARY:Appointment with Dr. Ann Lee\r\n', body)
+        self.assertIn('DESCRIPTION:Chest pain\\; follow-up\\, week 2\r\n', body)
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.appointment.status = 'CANCELLED'
+        self.appointment.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', b''.join(response.streaming_content).decode())
+
+    def test_deleted_appointments_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.appointment.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', b''.join(response.streaming_content).decode())
+
+    def test_unknown_token(self):
+        url = reverse('patient:appointment_calendar', args=['not-a-token'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_feed_page_shows_and_regenerates_the_link(self):
+        self.client.force_login(self.patient.user)
+        response = self.client.get(reverse('accounts:calendar_feed'))
+        self.assertContains(response, f'http://testserver{self.url}')
+
+        response = self.client.post(reverse('accounts:calendar_feed'), follow=True)
+        self.token.refresh_from_db()
+        self.assertNotContains(response, self.url)
+        self.assertContains(response, reverse('patient:appointment_calendar', args=[self.token.token]))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+class ConditionalDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        cls.patient = PatientProfile.objects.create(user=User.objects.create(email='pat@example.com', user_type='PATIENT'))
+        cls.record = MedicalRecord.objects.create(
+            patient=cls.patient, doctor=doctor, diagnosis='Flu', symptoms='Fever', treatment='Rest'
+        )
+        cls.prescription = Prescription.objects.create(patient=cls.patient, doctor=doctor, medical_record=cls.record)
+        cls.medicine = Medicine.objects.create(
+            name='Paracetamol', description='', manufacturer='Acme', unit_price=2, stock_quantity=10
+        )
+
+    def get(self, view, pk, **headers):
+        request = RequestFactory().get('/', headers=headers)
+        request.user = self.patient.user
+        with mock.patch('patient.views.render', return_value=HttpResponse()):
+            return view(request, pk)
+
+    def test_unchanged_prescription_is_not_modified(self):
+        etag = self.get(views.prescription_detail, self.prescription.pk)['ETag']
+        with self.assertNumQueries(1):
+            response = self.get(views.prescription_detail, self.prescription.pk, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_item_change_bumps_prescription_and_record(self):
+        prescription_etag = self.get(views.prescription_detail, self.prescription.pk)['ETag']
+        record_etag = self.get(views.medical_record_detail, self.record.pk)['ETag']
+        PrescriptionItem.objects.create(
+            prescription=self.prescription, medicine=self.medicine, dosage='1 tablet', duration='3 days',
+            quantity=6, instructions='After meals'
+        )
+        response = self.get(views.prescription_detail, self.prescription.pk, if_none_match=prescription_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], prescription_etag)
+        response = self.get(views.medical_record_detail, self.record.pk, if_none_match=record_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_patients_objects_are_not_answered(self):
+        other = PatientProfile.objects.create(user=User.objects.create(email='other@example.com', user_type='PATIENT'))
+        request = RequestFactory().get('/')
+        request.user = other.user
+        with self.assertRaises(Http404):
+            views.prescription_detail(request, self.prescription.pk)
+
+class ListPreviewTests(TestCase):
+    def test_list_rows_carry_previews_instead_of_text(self):
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create(email='doc@example.com', user_type='DOCTOR'),
+            specialization='Cardiology', qualification='MD', license_number='D1'
+        )
+        patient = PatientProfile.objects.create(user=User.objects.create(email='pat@example.com', user_type='PATIENT'))
+        record = MedicalRecord.objects.create(
+            patient=patient, doctor=doctor, diagnosis='Flu', symptoms='Fever', treatment='Rest', notes='x' * 5000
+        )
+
+        row = MedicalRecord.objects.for_list().get(pk=record.pk)
+        self.assertEqual(row.get_deferred_fields(), {'diagnosis', 'symptoms', 'treatment', 'notes'})
+        self.assertEqual(row.diagnosis_preview, 'Flu')
+        self.assertEqual(len(row.notes_preview), PREVIEW_LENGTH + 1)
@@ -8,6 +8,7 @@ app_name = 'patient'
 urlpatterns = [
     # Dashboard
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('summary/', views.dashboard_summary, name='summary'),
     
     # Appointments
     path('appointments/', views.appointments, name='appointments'),
@@ -30,6 +31,11 @@ urlpatterns = [
     path('insurance/', views.insurance, name='insurance'),
     path('insurance/claim/<int:bill_id>/', views.submit_insurance_claim, name='submit_insurance_claim'),
     
+    # Calendar feed (doctors and patients)
+    path('calendar/<str:token>.ics', views.appointment_calendar, name='appointment_calendar'),
+    
     # Doctor Search
     path('doctors/', views.search_doctors, name='search_doctors'),
+    path('doctors/earliest/', views.earliest_available, name='earliest_available'),
+    path('doctors/<int:doctor_id>/availability/', views.doctor_availability, name='doctor_availability'),
 ]
\ No newline at end of file
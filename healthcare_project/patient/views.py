@@ -1,14 +1,21 @@
 # patient/views.py
 
+from datetime import date, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q
-from django.core.paginator import Paginator
+from django.utils.cache import get_conditional_response
 
-from accounts.models import User, DoctorProfile, PatientProfile
+from accounts.decorators import query_budget, conditional_detail
+from accounts.pagination import CursorPaginator
+from accounts.models import User, DoctorProfile, CalendarToken
+from doctor import bitmap
+from doctor.availability import get_availability
+from . import calendar, search, summary
+from .booking import book_appointment, SlotTaken
 from .models import (
     MedicalRecord, Appointment, Prescription, 
     PrescriptionItem, Bill, Insurance, InsuranceClaim
@@ -18,81 +25,90 @@ from .forms import (
     InsuranceForm, BillPaymentForm
 )
 
+def patient_object_modified(queryset, field):
+    """``conditional_detail`` timestamp of one of the requesting patient's objects"""
+    def last_modified(request, pk):
+        if request.user.user_type != 'PATIENT':
+            return None
+        return queryset.filter(
+            pk=pk, patient=request.user.get_role_specific_profile()
+        ).values_list(field, flat=True).first()
+    return last_modified
+
+# Longest date range the availability endpoint computes in one request
+MAX_AVAILABILITY_DAYS = 31
+
+def get_patient_profile(request):
+    """Return the requesting patient's profile, already joined onto request.user by the auth backend"""
+    patient_profile = request.user.get_role_specific_profile()
+    if patient_profile is None:
+        raise Http404("No patient profile found for this user.")
+    return patient_profile
+
 @login_required
+@query_budget(3)
 def dashboard(request):
     """Patient dashboard view"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    # Get patient profile
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
-    
-    # Get recent appointments
-    upcoming_appointments = Appointment.objects.filter(
-        patient=patient_profile,
-        appointment_date__gte=timezone.now().date(),
-        status='SCHEDULED'
-    ).order_by('appointment_date', 'appointment_time')[:5]
-    
-    # Get recent prescriptions
-    recent_prescriptions = Prescription.objects.filter(
-        patient=patient_profile,
-        is_active=True
-    ).order_by('-date_prescribed')[:5]
-    
-    # Get recent medical records
-    recent_medical_records = MedicalRecord.objects.filter(
-        patient=patient_profile
-    ).order_by('-date_created')[:5]
+    patient_profile = get_patient_profile(request)
     
-    # Get pending bills
-    pending_bills = Bill.objects.filter(
-        patient=patient_profile,
-        status='PENDING'
-    ).order_by('due_date')[:5]
-    
-    context = {
-        'patient': patient_profile,
-        'upcoming_appointments': upcoming_appointments,
-        'recent_prescriptions': recent_prescriptions,
-        'recent_medical_records': recent_medical_records,
-        'pending_bills': pending_bills,
-    }
+    # Upcoming appointments, active prescriptions, recent records and pending bills
+    context = {'patient': patient_profile}
+    context.update(summary.get_patient_summary(patient_profile))
     
     return render(request, 'patient/dashboard.html', context)
 
 @login_required
+@query_budget(3)
+def dashboard_summary(request):
+    """Compact JSON version of the dashboard for mobile clients"""
+    if request.user.user_type != 'PATIENT':
+        return JsonResponse({'error': "Patient access only."}, status=403)
+    
+    patient_summary = dict(summary.get_patient_summary(get_patient_profile(request)))
+    patient_summary.pop('today')
+    return JsonResponse(patient_summary, json_dumps_params={'separators': (',', ':')})
+
+@login_required
+@query_budget(6)
 def appointments(request):
     """View for managing patient appointments"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     
     if request.method == 'POST':
         form = AppointmentForm(request.POST)
         if form.is_valid():
-            appointment = form.save(commit=False)
-            appointment.patient = patient_profile
-            appointment.status = 'SCHEDULED'
-            appointment.save()
-            messages.success(request, "Appointment scheduled successfully!")
-            return redirect('patient:appointments')
+            try:
+                book_appointment(patient_profile, **form.cleaned_data)
+            except SlotTaken as e:
+                form.add_error('appointment_time', str(e))
+            else:
+                messages.success(request, "Appointment scheduled successfully!")
+                return redirect('patient:appointments')
     else:
         form = AppointmentForm()
     
     # Get all appointments for the patient
-    all_appointments = Appointment.objects.filter(patient=patient_profile).order_by('-appointment_date')
+    all_appointments = Appointment.objects.filter(
+        patient=patient_profile
+    ).for_list().select_related('doctor__user').order_by('-appointment_date', '-appointment_time')
     
     # Pagination
-    paginator = Paginator(all_appointments, 10)  # Show 10 appointments per page
-    page_number = request.GET.get('page')
-    appointments = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        all_appointments, 10,  # Show 10 appointments per page
+        ordering=('-appointment_date', '-appointment_time', '-id')
+    )
+    appointments = paginator.page(request.GET.get('cursor'))
     
     # Get all available doctors for the form
-    doctors = DoctorProfile.objects.all()
+    doctors = DoctorProfile.objects.select_related('user')
     
     context = {
         'appointments': appointments,
@@ -110,7 +126,7 @@ def appointment_detail(request, pk):
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     appointment = get_object_or_404(Appointment, pk=pk, patient=patient_profile)
     
     context = {
@@ -127,7 +143,7 @@ def cancel_appointment(request, pk):
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     appointment = get_object_or_404(Appointment, pk=pk, patient=patient_profile)
     
     # Check if appointment is upcoming and can be cancelled
@@ -153,21 +169,26 @@ def cancel_appointment(request, pk):
     return render(request, 'patient/cancel_appointment.html', context)
 
 @login_required
+@query_budget(6)
 def medical_records(request):
     """View for patient medical records"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     
     # Get all medical records for the patient
-    all_records = MedicalRecord.objects.filter(patient=patient_profile).order_by('-date_created')
+    all_records = MedicalRecord.objects.filter(
+        patient=patient_profile
+    ).for_list().select_related('doctor__user').order_by('-date_created')
     
     # Pagination
-    paginator = Paginator(all_records, 10)  # Show 10 records per page
-    page_number = request.GET.get('page')
-    records = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        all_records, 10,  # Show 10 records per page
+        ordering=('-date_created', '-id')
+    )
+    records = paginator.page(request.GET.get('cursor'))
     
     context = {
         'records': records,
@@ -177,13 +198,14 @@ def medical_records(request):
     return render(request, 'patient/medical_records.html', context)
 
 @login_required
+@conditional_detail(patient_object_modified(MedicalRecord.objects, 'date_updated'))
 def medical_record_detail(request, pk):
     """View for medical record details"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     record = get_object_or_404(MedicalRecord, pk=pk, patient=patient_profile)
     
     # Get prescriptions associated with this medical record
@@ -198,16 +220,19 @@ def medical_record_detail(request, pk):
     return render(request, 'patient/medical_record_detail.html', context)
 
 @login_required
+@query_budget(8)
 def prescriptions(request):
     """View for patient prescriptions"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     
     # Get all prescriptions for the patient
-    all_prescriptions = Prescription.objects.filter(patient=patient_profile).order_by('-date_prescribed')
+    all_prescriptions = Prescription.objects.filter(
+        patient=patient_profile
+    ).select_related('doctor__user').prefetch_related('items__medicine').order_by('-date_prescribed')
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
@@ -217,9 +242,11 @@ def prescriptions(request):
         all_prescriptions = all_prescriptions.filter(is_active=False)
     
     # Pagination
-    paginator = Paginator(all_prescriptions, 10)  # Show 10 prescriptions per page
-    page_number = request.GET.get('page')
-    prescriptions = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        all_prescriptions, 10,  # Show 10 prescriptions per page
+        ordering=('-date_prescribed', '-id')
+    )
+    prescriptions = paginator.page(request.GET.get('cursor'))
     
     context = {
         'prescriptions': prescriptions,
@@ -230,13 +257,14 @@ def prescriptions(request):
     return render(request, 'patient/prescriptions.html', context)
 
 @login_required
+@conditional_detail(patient_object_modified(Prescription.objects, 'updated_at'))
 def prescription_detail(request, pk):
     """View for prescription details"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     prescription = get_object_or_404(Prescription, pk=pk, patient=patient_profile)
     
     # Get all medicine items in the prescription
@@ -258,16 +286,21 @@ def prescription_detail(request, pk):
     return render(request, 'patient/prescription_detail.html', context)
 
 @login_required
+@query_budget(6)
 def bills(request):
     """View for patient bills"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     
     # Get all bills for the patient
-    all_bills = Bill.objects.filter(patient=patient_profile).order_by('-created_at')
+    all_bills = Bill.objects.filter(
+        patient=patient_profile
+    ).select_related(
+        'patient__user', 'appointment__doctor__user', 'prescription__doctor__user'
+    ).order_by('-created_at')
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
@@ -275,9 +308,11 @@ def bills(request):
         all_bills = all_bills.filter(status=status_filter.upper())
     
     # Pagination
-    paginator = Paginator(all_bills, 10)  # Show 10 bills per page
-    page_number = request.GET.get('page')
-    bills = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        all_bills, 10,  # Show 10 bills per page
+        ordering=('-created_at', '-id')
+    )
+    bills = paginator.page(request.GET.get('cursor'))
     
     context = {
         'bills': bills,
@@ -288,13 +323,14 @@ def bills(request):
     return render(request, 'patient/bills.html', context)
 
 @login_required
+@conditional_detail(patient_object_modified(Bill.objects, 'updated_at'))
 def bill_detail(request, pk):
     """View for bill details and payment"""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     bill = get_object_or_404(Bill, pk=pk, patient=patient_profile)
     
     if request.method == 'POST':
@@ -328,7 +364,7 @@ def insurance(request):
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     
     if request.method == 'POST':
         form = InsuranceForm(request.POST)
@@ -359,7 +395,7 @@ def submit_insurance_claim(request, bill_id):
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    patient_profile = get_object_or_404(PatientProfile, user=request.user)
+    patient_profile = get_patient_profile(request)
     bill = get_object_or_404(Bill, pk=bill_id, patient=patient_profile)
     
     # Check if bill is eligible for insurance claim
@@ -415,35 +451,101 @@ def submit_insurance_claim(request, bill_id):
     return render(request, 'patient/submit_insurance_claim.html', context)
 
 @login_required
+@query_budget(4)
 def search_doctors(request):
     """View for searching doctors by name, specialization, etc."""
     if request.user.user_type != 'PATIENT':
         messages.error(request, "Access denied. Patient access only.")
         return redirect('accounts:home')
     
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     specialization = request.GET.get('specialization', '')
     
-    doctors = DoctorProfile.objects.all()
-    
-    if query:
-        doctors = doctors.filter(
-            Q(user__first_name__icontains=query) | 
-            Q(user__last_name__icontains=query) |
-            Q(specialization__icontains=query)
-        )
-    
-    if specialization:
-        doctors = doctors.filter(specialization__icontains=specialization)
+    doctors = search.search_doctors(query, specialization)
     
-    # Get list of unique specializations for filtering
-    all_specializations = DoctorProfile.objects.values_list('specialization', flat=True).distinct()
+    # Cached specialization facets for filtering
+    specialization_counts = search.specialization_facets()
     
     context = {
         'doctors': doctors,
         'query': query,
         'specialization': specialization,
-        'all_specializations': all_specializations,
+        'all_specializations': [name for name, _ in specialization_counts],
+        'specialization_counts': specialization_counts,
     }
     
-    return render(request, 'patient/search_doctors.html', context)
\ No newline at end of file
+    return render(request, 'patient/search_doctors.html', context)
+
+@login_required
+@query_budget(5)
+def doctor_availability(request, doctor_id):
+    """JSON view listing a doctor's free appointment slots over a date range"""
+    doctor = get_object_or_404(DoctorProfile, pk=doctor_id)
+    
+    try:
+        start_date = date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        return JsonResponse({'error': "Invalid 'start' or 'days' parameter."}, status=400)
+    
+    if not 1 <= days <= MAX_AVAILABILITY_DAYS:
+        return JsonResponse({'error': f"'days' must be between 1 and {MAX_AVAILABILITY_DAYS}."}, status=400)
+    
+    availability = get_availability(doctor, start_date, start_date + timedelta(days=days - 1))
+    return JsonResponse(availability.as_dict())
+
+@login_required
+@query_budget(4)
+def earliest_available(request):
+    """JSON view listing the earliest free slot of each matching doctor"""
+    specialization = request.GET.get('specialization', '').strip()
+    try:
+        days = int(request.GET.get('days', 14))
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return JsonResponse({'error': "Invalid 'days' or 'limit' parameter."}, status=400)
+    
+    if not 1 <= days <= MAX_AVAILABILITY_DAYS or not 1 <= limit <= 50:
+        return JsonResponse({'error': f"'days' must be between 1 and {MAX_AVAILABILITY_DAYS} "
+                                      "and 'limit' between 1 and 50."}, status=400)
+    
+    slots = bitmap.earliest_slots(specialization, days=days, limit=limit)
+    doctors = DoctorProfile.objects.select_related('user').in_bulk([doctor_id for doctor_id, _, _ in slots])
+    
+    return JsonResponse({
+        'specialization': specialization,
+        'slots': [
+            {
+                'doctor': doctor_id,
+                'name': doctors[doctor_id].user.get_full_name(),
+                'specialization': doctors[doctor_id].specialization,
+                'date': day.isoformat(),
+                'time': start.strftime('%H:%M'),
+            }
+            for doctor_id, day, start in slots if doctor_id in doctors
+        ],
+    })
+
+def appointment_calendar(request, token):
+    """iCalendar feed of a doctor's or patient's appointments, authenticated by its token"""
+    calendar_token = get_object_or_404(
+        CalendarToken.objects.select_related('user__doctor_profile', 'user__patient_profile'),
+        token=token
+    )
+    user = calendar_token.user
+    appointments = calendar.feed_queryset(user) if user.is_active else None
+    if appointments is None:
+        raise Http404("No calendar feed for this user.")
+    
+    # Calendar clients poll; answer 304 when nothing changed since their copy
+    etag = calendar.feed_version(appointments)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(
+            calendar.stream_calendar(user, appointments, request.get_host()),
+            content_type='text/calendar; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response